@@ -0,0 +1,216 @@
+# benchmark.py
+# Times the storage and menu operations on seeded synthetic calendars.
+# Run: python benchmark.py [sizes] [results.json] [--compare old.json]
+#      sizes is a comma list such as 10000,100000,1000000 (default 10000,100000)
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional
+from unittest.mock import patch
+
+from commands import run_batch
+from model import Event
+from storage import JSON_File_Storage
+from tracker import CalendarEventTracker
+
+SIZES = (10_000, 100_000)
+SEED = 42
+REPEAT = 3            # timed runs per operation; the fastest counts
+BATCH_COMMANDS = 5000  # commands per run of the batch throughput check
+FIRST_YEAR, LAST_YEAR = 2015, 2025
+
+# A few places and titles cover most events (Zipf-like weights)
+CITIES = ["Home", "Office", "Online", "Bangkok", "Jeddah", "Barcelona", "Dubai", "London",
+          "Gym", "School", "Cafe", "Clinic", "Airport", "Paris", "Tokyo", "Berlin"]
+TITLES = ["Standup", "Team meeting", "Gym", "Lunch", "Python class", "Dentist", "Review",
+          "Planning", "Dinner", "Flight", "Birthday party", "Doctor", "Interview", "Demo"]
+WORDS = ["bring", "laptop", "agenda", "call", "notes", "tickets", "gift", "report", "slides"]
+
+
+def _zipf(count: int) -> List[float]:
+    return [1 / rank for rank in range(1, count + 1)]
+
+
+def synthetic_events(count: int, seed: int = SEED) -> List[Event]:
+    """count reproducible events with realistic skew.
+
+    Recent years are busier than old ones, weekdays busier than weekends,
+    and titles and locations follow a Zipf-like popularity. About a
+    quarter of events have no location and a third have a note.
+    """
+    rng = random.Random(seed)
+    years = list(range(FIRST_YEAR, LAST_YEAR + 1))
+    year_weights = [i + 1 for i in range(len(years))]
+    titles = rng.choices(TITLES, weights=_zipf(len(TITLES)), k=count)
+    cities = rng.choices(CITIES, weights=_zipf(len(CITIES)), k=count)
+    picked_years = rng.choices(years, weights=year_weights, k=count)
+
+    events: List[Event] = []
+    for i in range(count):
+        while True:
+            day = date(picked_years[i], 1, 1).toordinal() + rng.randrange(365)
+            # Keep 3 in 10 weekend days
+            if day % 7 not in (0, 6) or rng.random() < 0.3:
+                break
+        location = cities[i] if rng.random() < 0.75 else ""
+        note = " ".join(rng.sample(WORDS, 3)) if rng.random() < 0.33 else ""
+        events.append(Event(date.fromordinal(day).isoformat(), titles[i], location, note,
+                            id="%016x" % rng.getrandbits(64)))
+    return events
+
+
+def batch_commands(count: int, seed: int = SEED) -> List[str]:
+    """count JSON command lines, mostly reads: 40% searches, 30% week
+    ranges, 20% day lists (all with a limit, as a client paging would
+    send) and 10% adds."""
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        day = date(rng.randint(FIRST_YEAR, LAST_YEAR), rng.randint(1, 12), rng.randint(1, 28))
+        roll = rng.random()
+        if roll < 0.4:
+            cmd = {"op": "search", "keyword": rng.choice(TITLES).split()[0], "limit": 20}
+        elif roll < 0.7:
+            end = date.fromordinal(day.toordinal() + 6)
+            cmd = {"op": "range", "start": day.isoformat(), "end": end.isoformat(), "limit": 20}
+        elif roll < 0.9:
+            cmd = {"op": "list", "date": day.isoformat(), "limit": 20}
+        else:
+            cmd = {"op": "add", "date": day.isoformat(), "title": rng.choice(TITLES)}
+        lines.append(json.dumps(cmd))
+    return lines
+
+
+def _measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Best time of repeat runs, then peak traced memory of one more run."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak}
+
+
+def _quiet(method: Callable, *answers: str) -> Callable[[], object]:
+    """Call a menu method with canned input() answers and no output."""
+    def run():
+        with patch("builtins.input", side_effect=list(answers)):
+            with open(os.devnull, "w") as sink, redirect_stdout(sink):
+                return method()
+    return run
+
+
+def bench_size(count: int, work_dir: str, repeat: int = REPEAT, seed: int = SEED,
+               commands: int = BATCH_COMMANDS) -> List[Dict[str, object]]:
+    """Results for every operation on a calendar of count events."""
+    events = synthetic_events(count, seed)
+    path = os.path.join(work_dir, f"events-{count}.json")
+    csv_path = os.path.join(work_dir, f"export-{count}.csv")
+    storage = JSON_File_Storage(path)
+    results = [("storage.save", _measure(lambda: storage.save(events), repeat))]
+    storage.close()   # writes the cache the loads below read
+    results += [
+        # A fresh storage each time, so nothing is remembered between loads
+        ("storage.load", _measure(lambda: JSON_File_Storage(path).load(), repeat)),
+        ("storage.load_json", _measure(lambda: JSON_File_Storage(path, cache=False).load(),
+                                       repeat)),
+    ]
+
+    app = CalendarEventTracker(JSON_File_Storage(path))
+    month = f"{LAST_YEAR}-06"
+    menu_ops = [
+        ("list_all_events", _quiet(app.list_all_events)),
+        ("list_events_in_range", _quiet(app.list_events_in_range, f"{month}-01", f"{month}-30")),
+        ("search_events", _quiet(app.search_events, "meeting")),
+        ("weekly_view", _quiet(app.weekly_view, f"{month}-02")),
+        ("export_to_csv", _quiet(lambda: app.export_to_csv(csv_path))),
+    ]
+    for name, fn in menu_ops:
+        results.append((name, _measure(fn, repeat)))
+
+    # Throughput of batch mode (the server runs the same commands)
+    lines = batch_commands(commands, seed)
+    batch = _measure(lambda: run_batch(app, lines, io.StringIO()), repeat)
+    batch["ops_per_second"] = len(lines) / batch["seconds"] if batch["seconds"] else 0.0
+    results.append(("batch_commands", batch))
+    return [{"op": name, "events": count, **numbers} for name, numbers in results]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmarks(sizes=SIZES, repeat: int = REPEAT, seed: int = SEED,
+                   commands: int = BATCH_COMMANDS) -> Dict[str, object]:
+    """Benchmark every size; returns the machine-readable report."""
+    results: List[Dict[str, object]] = []
+    with tempfile.TemporaryDirectory(prefix="events-bench-") as work_dir:
+        for count in sizes:
+            results += bench_size(count, work_dir, repeat, seed, commands)
+    return {
+        "commit": _git_commit(),
+        "when": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(old: Dict[str, object], new: Dict[str, object]) -> List[str]:
+    """One line per operation/size in both reports: old -> new time."""
+    before = {(r["op"], r["events"]): r for r in old["results"]}
+    lines = []
+    for r in new["results"]:
+        prev = before.get((r["op"], r["events"]))
+        if prev is None:
+            continue
+        ratio = r["seconds"] / prev["seconds"] if prev["seconds"] else float("inf")
+        flag = "  SLOWER" if ratio > 1.2 else ""
+        lines.append(f"{r['op']:<22} {r['events']:>10,}  {prev['seconds']:9.4f}s -> "
+                     f"{r['seconds']:9.4f}s  x{ratio:.2f}{flag}")
+    return lines
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    old_report = None
+    if "--compare" in args:
+        at = args.index("--compare")
+        with open(args[at + 1], encoding="utf-8") as f:
+            old_report = json.load(f)
+        del args[at:at + 2]
+    sizes = [int(n) for n in args[0].split(",")] if args else SIZES
+    out_name = args[1] if len(args) > 1 else "bench_results.json"
+
+    report = run_benchmarks(sizes)
+    with open(out_name, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    for r in report["results"]:
+        rate = f"  {r['ops_per_second']:10,.0f} ops/s" if "ops_per_second" in r else ""
+        print(f"{r['op']:<22} {r['events']:>10,}  {r['seconds']:9.4f}s  "
+              f"peak {r['peak_bytes'] / 1e6:8.1f} MB{rate}")
+    print(f"Results written to '{out_name}'.")
+    if old_report is not None:
+        print("\n".join(compare(old_report, report)))
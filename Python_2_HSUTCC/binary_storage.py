@@ -0,0 +1,301 @@
+# binary_storage.py
+# Read-optimised binary event file, opened with mmap
+#
+# Layout (little-endian):
+#   header   magic b"EVTB", version, count, where the ordinals start,
+#            then for each field (date, title, location, note, id, repeat,
+#            end_date)
+#            where its offsets table and its string heap start in the file
+#   ordinals count int32 day ordinals (Event.ordinal), one per record
+#   offsets  count + 1 uint32 per field; record i is heap[off[i]:off[i + 1]]
+#   heap     the field's UTF-8 strings back to back
+# repeat is a recurring event's Recurrence as JSON ("" for one-off events);
+# end_date is "" for events that last one day.
+# Records are stored sorted by ordinal, so date lookups bisect the
+# ordinals as plain integers and only decode the records they return.
+# Ordinals and offsets are read in place through memoryview.cast, which
+# assumes a little-endian host.
+import json
+import mmap
+import os
+import struct
+import sys
+from bisect import bisect_left, bisect_right
+from itertools import compress
+from operator import ne
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from model import LAST_DATE, Event, Recurrence, date_ordinal, with_occurrences
+from storage import Event_Storage, JSON_File_Storage, Queryable_Storage
+from decorators import add_count
+
+MAGIC = b"EVTB"
+VERSION = 5  # 2 added the ordinals, 3 the event ids, 4 recurrence rules, 5 end dates
+FIELDS = ("date", "title", "location", "note", "id", "repeat", "end_date")
+HEADER = struct.Struct("<4sIIQ" + "QQ" * len(FIELDS))
+
+
+def _pad(size: int) -> int:
+    """Round up to 8 bytes so every offsets table starts aligned."""
+    return (size + 7) & ~7
+
+
+class _Column:
+    """One field of the file as a lazy sequence of str (decoded on access)."""
+
+    def __init__(self, buf: memoryview, count: int, offsets_pos: int, heap_pos: int):
+        self._buf = buf
+        self._count = count
+        self._offsets = buf[offsets_pos:offsets_pos + 4 * (count + 1)].cast("I")
+        self._heap = heap_pos
+
+    def __len__(self) -> int:
+        return self._count
+
+    def release(self) -> None:
+        self._offsets.release()
+
+    def __getitem__(self, i: int) -> str:
+        start = self._heap + self._offsets[i]
+        end = self._heap + self._offsets[i + 1]
+        return str(self._buf[start:end], "utf-8")
+
+    def non_empty(self) -> List[int]:
+        """Indexes of the records whose string is not empty."""
+        offsets = self._offsets
+        return list(compress(range(self._count), map(ne, offsets[1:], offsets[:-1])))
+
+
+def _repeat(text: str) -> Optional[Recurrence]:
+    return Recurrence.from_dict(json.loads(text)) if text else None
+
+
+class Binary_Storage(Event_Storage, Queryable_Storage):
+    """Storage implementation backed by a memory-mapped binary file.
+
+    Opening the file costs nothing beyond the mmap; queries bisect the
+    date column and decode only the records they hit. The layout is
+    fixed, so save() and append() rewrite the whole file: this backend
+    suits large calendars that are read much more often than edited.
+
+    Recurring events are single records; date queries add the
+    occurrences of the series that started by the end of the window,
+    and the multi-day events that began before it but are still under
+    way (a scan of the few records with an end date, not of the file).
+    """
+
+    def __init__(self, filename: str = "events.bin"):
+        self.filename = filename
+        self._file = None
+        self._map = None
+        self._buf: Optional[memoryview] = None
+        self._columns: Optional[List[_Column]] = None
+        self._ordinals: Optional[memoryview] = None
+        self._series: Optional[List[int]] = None   # records with a repeat rule
+        self._spans: Optional[List[Tuple[int, int]]] = None   # (record, end ordinal)
+
+    def __del__(self):
+        self.close()
+
+    # File handling
+
+    def _open(self) -> Optional[List[_Column]]:
+        """Map the file on first use. Returns None if there is no data."""
+        if self._columns is not None:
+            return self._columns
+        try:
+            self._file = open(self.filename, "rb")
+        except FileNotFoundError:
+            return None
+        if os.fstat(self._file.fileno()).st_size < HEADER.size:
+            self.close()
+            return None
+
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = HEADER.unpack_from(self._map)
+        if header[0] != MAGIC:
+            print("Warning: events file is corrupted. Starting with empty list.")
+            self.close()
+            return None
+        if header[1] != VERSION:
+            print(f"Warning: events file is format version {header[1]}, expected "
+                  f"{VERSION}. Rewrite it with binary_storage.py. Starting with empty list.")
+            self.close()
+            return None
+        count, ordinals_pos = header[2], header[3]
+        self._buf = memoryview(self._map)
+        self._ordinals = self._buf[ordinals_pos:ordinals_pos + 4 * count].cast("i")
+        self._columns = [
+            _Column(self._buf, count, header[4 + 2 * f], header[5 + 2 * f])
+            for f in range(len(FIELDS))
+        ]
+        return self._columns
+
+    def close(self) -> None:
+        """Release the mapping (needed before the file can be replaced)."""
+        # Every view into the map has to go before the map can close
+        for column in self._columns or ():
+            column.release()
+        self._columns = None
+        self._series = None
+        self._spans = None
+        if self._ordinals is not None:
+            self._ordinals.release()
+            self._ordinals = None
+        if self._buf is not None:
+            self._buf.release()
+            self._buf = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _records(self, rows: Iterable[int]) -> List[Event]:
+        events = list(self._decoded(rows))
+        add_count(self, "events_scanned", len(events))
+        return events
+
+    def _decoded(self, rows: Iterable[int]) -> Iterator[Event]:
+        """The events of these records; one with a broken repeat rule
+        is skipped with a warning."""
+        date, title, location, note, ids, repeat, end = self._columns
+        days = self._ordinals
+        for i in rows:
+            try:
+                rule = _repeat(repeat[i])
+            except ValueError as exc:
+                print(f"Warning: skipping bad event {ids[i]!r}: {exc}.")
+                continue
+            yield Event(date[i], title[i], location[i], note[i], days[i], ids[i],
+                        rule, end[i] or None)
+
+    # Event_Storage
+
+    def load(self) -> List[Event]:
+        """Decode every record (in date order) as Event objects."""
+        columns = self._open()
+        if columns is None:
+            return []
+        return self._records(range(len(columns[0])))
+
+    def iter_events(self) -> Iterator[Event]:
+        """Decode records one at a time, in date order."""
+        columns = self._open()
+        if columns is None:
+            return
+        yield from self._decoded(range(len(columns[0])))
+
+    def save(self, events: Iterable[Event]) -> None:
+        """Write all events to a new file and swap it in."""
+        events = list(events)
+        self.close()
+        add_count(self, "bytes_written", write_binary(self.filename, events))
+
+    # Queryable_Storage
+
+    def query(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              keyword: Optional[str] = None) -> List[Event]:
+        columns = self._open()
+        if columns is None:
+            return []
+        days = self._ordinals
+        first = 1 if start_date is None else date_ordinal(start_date)
+        last = date_ordinal(end_date or LAST_DATE)
+        lo = 0 if start_date is None else bisect_left(days, first)
+        hi = len(days) if end_date is None else bisect_right(days, last, lo)
+        rows = range(lo, hi)
+        if start_date is not None:
+            under_way = [i for i, end in self._span_rows() if i < lo and end >= first]
+            if under_way:
+                rows = under_way + list(rows)
+        if keyword is not None:
+            rows = self._matching(rows, keyword)
+        if start_date is None and end_date is None:
+            return self._records(rows)
+        if self._series is None:
+            self._series = columns[FIELDS.index("repeat")].non_empty()
+        if not self._series:
+            return self._records(rows)
+        # Series are expanded instead, including those that began before lo
+        is_series = set(self._series)
+        started = [i for i in self._series if i < hi]
+        if keyword is not None:
+            started = self._matching(started, keyword)
+        one_offs = self._records(i for i in rows if i not in is_series)
+        return list(with_occurrences(one_offs, self._records(started), first, last))
+
+    def _span_rows(self) -> List[Tuple[int, int]]:
+        """(row, end ordinal) of the one-off events that last days."""
+        if self._spans is None:
+            days = self._ordinals
+            _, _, _, _, _, repeat, end = self._columns
+            spans = ((i, date_ordinal(end[i])) for i in end.non_empty() if not repeat[i])
+            self._spans = [(i, last) for i, last in spans if days[i] and last > days[i]]
+        return self._spans
+
+    def _matching(self, rows: Iterable[int], keyword: str) -> List[int]:
+        """The rows whose title or note contains keyword (any case)."""
+        needle = keyword.lower()
+        _, title, _, note, _, _, _ = self._columns
+        rows = list(rows)
+        add_count(self, "events_scanned", len(rows))
+        return [i for i in rows if needle in title[i].lower() or needle in note[i].lower()]
+
+    def append(self, events: Iterable[Event]) -> None:
+        """Add events; the fixed layout means the file is rewritten."""
+        self.save(self.load() + list(events))
+
+
+def write_binary(filename: str, events: Iterable[Event]) -> int:
+    """Write events in the binary layout (date-sorted) via a temp file.
+    Returns the size of the file in bytes."""
+    ordered = sorted(events, key=lambda ev: ev.ordinal)
+    count = len(ordered)
+    ordinals = struct.pack(f"<{count}i", *(ev.ordinal for ev in ordered))
+
+    sections = []  # (offsets bytes, heap bytes) per field
+    for field in FIELDS:
+        if field == "repeat":
+            encoded = [b"" if ev.repeat is None else json.dumps(ev.repeat.to_dict()).encode()
+                       for ev in ordered]
+        else:
+            encoded = [(getattr(ev, field) or "").encode("utf-8") for ev in ordered]
+        offsets = [0] * (count + 1)
+        total = 0
+        for i, raw in enumerate(encoded):
+            total += len(raw)
+            offsets[i + 1] = total
+        sections.append((struct.pack(f"<{count + 1}I", *offsets), b"".join(encoded)))
+
+    positions = [_pad(HEADER.size)]
+    pos = positions[0] + _pad(len(ordinals))
+    for offsets, heap in sections:
+        positions += [pos, pos + _pad(len(offsets))]
+        pos += _pad(len(offsets)) + _pad(len(heap))
+
+    tmp_name = filename + ".tmp"
+    with open(tmp_name, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, count, *positions).ljust(_pad(HEADER.size), b"\0"))
+        f.write(ordinals.ljust(_pad(len(ordinals)), b"\0"))
+        for offsets, heap in sections:
+            f.write(offsets.ljust(_pad(len(offsets)), b"\0"))
+            f.write(heap.ljust(_pad(len(heap)), b"\0"))
+        size = f.tell()
+    os.replace(tmp_name, filename)
+    return size
+
+
+def convert_json(json_filename: str = "events.json", bin_filename: str = "events.bin") -> int:
+    """Convert an events.json file to the binary layout. Returns the count."""
+    events = JSON_File_Storage(json_filename).load()
+    write_binary(bin_filename, events)
+    return len(events)
+
+
+if __name__ == "__main__":
+    # python binary_storage.py [events.json] [events.bin]
+    src = sys.argv[1] if len(sys.argv) > 1 else "events.json"
+    dst = sys.argv[2] if len(sys.argv) > 2 else "events.bin"
+    print(f"Converted {convert_json(src, dst)} events from '{src}' to '{dst}'.")
@@ -0,0 +1,208 @@
+# bulk_import.py
+# Bulk import of events from CSV (export_to_csv columns) or JSON Lines
+import contextlib
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+
+from model import Event
+from tracker import CalendarEventTracker
+from export import CSV_HEADER
+
+CHUNK_SIZE = 50_000
+REPORT_HEADER = ["line", "reason", "record"]
+
+# (line number, raw record) in; (valid rows, rejected rows) out
+Raw_Record = Tuple[int, object]
+Row = Tuple[str, str, str, str]
+Rejected = Tuple[int, str, str]
+
+
+class Import_Report:
+    """Outcome of a bulk import."""
+
+    def __init__(self, imported: int, rejected: List[Rejected],
+                 report_filename: Optional[str] = None):
+        self.imported = imported
+        self.rejected = rejected          # (line, reason, raw record)
+        self.report_filename = report_filename
+
+    def __repr__(self) -> str:
+        return f"Import_Report(imported={self.imported}, rejected={len(self.rejected)})"
+
+
+class _Checker:
+    """Applies the add_event rules to a chunk of parsed records.
+
+    Records are collected first so all their dates can be validated in
+    one CalendarEventTracker.validate_dates pass.
+    """
+
+    def __init__(self):
+        self.rows: List[Tuple[int, Row, str]] = []
+        self.rejected: List[Rejected] = []
+
+    def add(self, line_no: int, fields, raw: str) -> None:
+        row = tuple(str(value or "").strip() for value in fields)
+        self.rows.append((line_no, row, raw))
+
+    def reject(self, line_no: int, reason: str, raw: str) -> None:
+        self.rejected.append((line_no, reason, raw))
+
+    def result(self) -> Tuple[List[Row], List[Rejected]]:
+        valid_dates, _ = CalendarEventTracker.validate_dates([row[0] for _, row, _ in self.rows])
+        valid: List[Row] = []
+        for (line_no, row, raw), date_ok in zip(self.rows, valid_dates):
+            if not date_ok:
+                self.reject(line_no, "invalid date", raw)
+            elif row[1] == "":
+                self.reject(line_no, "empty title", raw)
+            else:
+                valid.append(row)
+        self.rejected.sort()
+        return valid, self.rejected
+
+
+def validate_csv_chunk(records: List[Raw_Record]) -> Tuple[List[Row], List[Rejected]]:
+    """Validate rows already split by csv.reader."""
+    checker = _Checker()
+    for line_no, row in records:
+        raw = ",".join(row)
+        if len(row) < 2 or len(row) > 4:
+            checker.reject(line_no, "expected 2-4 columns", raw)
+            continue
+        checker.add(line_no, (list(row) + ["", ""])[:4], raw)
+    return checker.result()
+
+
+def validate_jsonl_chunk(records: List[Raw_Record]) -> Tuple[List[Row], List[Rejected]]:
+    """Parse and validate JSON Lines (one event object per line)."""
+    checker = _Checker()
+    # One json.loads for the whole chunk when every line looks like a
+    # single object; otherwise (or if that fails) parse line by line
+    parsed = None
+    lines = [line.strip() for _, line in records]
+    if all(line[:1] == "{" and line[-1:] == "}" for line in lines):
+        try:
+            parsed = json.loads("[" + ",".join(lines) + "]")
+        except json.JSONDecodeError:
+            pass
+        if parsed is not None and len(parsed) != len(records):
+            parsed = None
+    for pos, (line_no, line) in enumerate(records):
+        if parsed is not None:
+            data = parsed[pos]
+        else:
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as exc:
+                checker.reject(line_no, f"bad JSON ({exc.msg})", line.rstrip("\n"))
+                continue
+        if not isinstance(data, dict):
+            checker.reject(line_no, "not an object", line.rstrip("\n"))
+            continue
+        fields = (data.get("date"), data.get("title"), data.get("location"), data.get("note"))
+        checker.add(line_no, fields, line.rstrip("\n"))
+    return checker.result()
+
+
+def _csv_records(f) -> Iterator[Raw_Record]:
+    # csv.reader has to run in this process: quoted fields may span lines
+    reader = csv.reader(f)
+    for row in reader:
+        if reader.line_num == 1 and [c.strip().lower() for c in row] == [h.lower() for h in CSV_HEADER]:
+            continue
+        if row:
+            yield reader.line_num, row
+
+
+def _jsonl_records(f) -> Iterator[Raw_Record]:
+    for line_no, line in enumerate(f, start=1):
+        if line.strip():
+            yield line_no, line
+
+
+def _chunks(records: Iterator[Raw_Record], chunk_size: int) -> Iterator[List[Raw_Record]]:
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _pool_map(pool: Executor, fn, chunks: Iterator[List[Raw_Record]], window: int):
+    """Like pool.map, in order, but with at most window chunks in flight
+    (Executor.map would read the whole file up front)."""
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(fn, chunk))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def bulk_import(tracker: CalendarEventTracker, filename: str, fmt: Optional[str] = None,
+                workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE,
+                report_filename: Optional[str] = None) -> Import_Report:
+    """Import events from a .csv or .jsonl file into tracker.
+
+    Chunks of records are validated in a process pool (workers=1 keeps it
+    in this process). Valid rows are added with one save; rejected rows
+    are written to report_filename (default: <filename>.rejected.csv).
+    """
+    if fmt is None:
+        fmt = "csv" if filename.lower().endswith(".csv") else "jsonl"
+    if fmt == "csv":
+        reader, validate = _csv_records, validate_csv_chunk
+    elif fmt == "jsonl":
+        reader, validate = _jsonl_records, validate_jsonl_chunk
+    else:
+        raise ValueError(f"unknown import format: {fmt!r}")
+
+    events: List[Event] = []
+    rejected: List[Rejected] = []
+    with open(filename, "r", newline="" if fmt == "csv" else None, encoding="utf-8") as f:
+        chunks = _chunks(reader(f), chunk_size)
+        workers = workers or os.cpu_count() or 1
+        with contextlib.ExitStack() as stack:
+            if workers == 1:
+                results = map(validate, chunks)
+            else:
+                pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+                results = _pool_map(pool, validate, chunks, window=2 * workers)
+            for valid, bad in results:
+                events += [Event(*row) for row in valid]
+                rejected += bad
+
+    tracker.add_events(events)
+
+    if rejected:
+        report_filename = report_filename or filename + ".rejected.csv"
+        with open(report_filename, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(REPORT_HEADER)
+            writer.writerows(rejected)
+    else:
+        report_filename = None
+    return Import_Report(len(events), rejected, report_filename)
+
+
+if __name__ == "__main__":
+    # python bulk_import.py FILE.csv|FILE.jsonl [events.json]
+    from storage import JSON_File_Storage
+
+    if len(sys.argv) < 2:
+        print("Usage: python bulk_import.py FILE.csv|FILE.jsonl [events.json]")
+        sys.exit(1)
+    target = sys.argv[2] if len(sys.argv) > 2 else "events.json"
+    app = CalendarEventTracker(JSON_File_Storage(target))
+    report = bulk_import(app, sys.argv[1])
+    print(f"Imported {report.imported} events into '{target}'.")
+    if report.rejected:
+        print(f"Rejected {len(report.rejected)} rows; see '{report.report_filename}'.")
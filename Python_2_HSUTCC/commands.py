@@ -0,0 +1,224 @@
+# commands.py
+# Non-interactive tracker commands: JSON in, JSON out (batch mode, server)
+import json
+from typing import Callable, Dict, IO, Iterable, List, Optional
+
+from model import Event, Recurrence
+from tracker import CalendarEventTracker
+from export import export_events_csv
+
+
+class Command_Error(ValueError):
+    """A command that cannot be run (bad op, missing or invalid field)."""
+
+
+def _field(cmd: dict, name: str, default: Optional[str] = None) -> str:
+    value = cmd.get(name, default)
+    if value is None:
+        raise Command_Error(f"missing field: {name}")
+    if not isinstance(value, str):
+        raise Command_Error(f"field must be a string: {name}")
+    return value.strip()
+
+
+def _date(cmd: dict, name: str = "date") -> str:
+    value = _field(cmd, name)
+    if not CalendarEventTracker.is_valid_date(value):
+        raise Command_Error(f"invalid date: {value!r}")
+    return value
+
+
+def _limit(cmd: dict) -> Optional[int]:
+    limit = cmd.get("limit")
+    if limit is not None and not (type(limit) is int and limit >= 0):
+        raise Command_Error("limit must be a non-negative integer")
+    return limit
+
+
+def _listing(events: List[Event], cmd: dict) -> dict:
+    limit = _limit(cmd)
+    shown = events if limit is None else events[:limit]
+    return {"count": len(events), "events": [ev.to_dict() for ev in shown]}
+
+
+def _add(tracker: CalendarEventTracker, cmd: dict) -> dict:
+    date = _date(cmd)
+    title = _field(cmd, "title")
+    if title == "":
+        raise Command_Error("title cannot be empty")
+    repeat = None
+    if cmd.get("repeat") is not None:
+        # {"freq": "weekly", "interval": 2, "count": 10, "until": "2026-06-30"}
+        try:
+            repeat = Recurrence.from_dict(cmd["repeat"])
+        except ValueError as exc:
+            raise Command_Error(str(exc)) from None
+    end_date = None
+    if cmd.get("end_date"):
+        end_date = _date(cmd, "end_date")
+        if end_date < date:
+            raise Command_Error("end_date must be >= date")
+    ev = Event(date, title, _field(cmd, "location", ""), _field(cmd, "note", ""),
+               repeat=repeat, end_date=end_date)
+    tracker.add_events([ev])
+    return {"event": ev.to_dict()}
+
+
+def _list(tracker: CalendarEventTracker, cmd: dict) -> dict:
+    if "date" in cmd:
+        return _listing(tracker.events_on_date(_date(cmd)), cmd)
+    return _listing(tracker.sorted_events(), cmd)
+
+
+def _range(tracker: CalendarEventTracker, cmd: dict) -> dict:
+    start, end = _date(cmd, "start"), _date(cmd, "end")
+    if start > end:
+        raise Command_Error("start must be <= end")
+    return _listing(tracker.events_in_range(start, end), cmd)
+
+
+def _search(tracker: CalendarEventTracker, cmd: dict) -> dict:
+    keyword = _field(cmd, "keyword")
+    if keyword == "":
+        raise Command_Error("keyword cannot be empty")
+    try:
+        # Only the events shown are sorted
+        count, shown = tracker.search_page(keyword, _field(cmd, "mode", "prefix"), _limit(cmd))
+    except ValueError as exc:  # unknown mode
+        raise Command_Error(str(exc)) from None
+    return {"count": count, "events": [ev.to_dict() for ev in shown]}
+
+
+def _delete(tracker: CalendarEventTracker, cmd: dict) -> dict:
+    """Delete the event with this id, or else the first event (in date
+    order) on date with this title."""
+    if "id" in cmd:
+        event_id = _field(cmd, "id")
+        ev = tracker.get_event(event_id)
+        if ev is None or not tracker.delete(event_id):
+            raise Command_Error(f"no event with id {event_id!r}")
+        return {"deleted": ev.to_dict()}
+    date, title = _date(cmd), _field(cmd, "title")
+    # Load first, so the date query is answered from memory
+    tracker.load_all()
+    for ev in tracker.events_on_date(date):
+        if ev.title == title:
+            # By id: an occurrence of a series (a copy) is cancelled in it
+            if not tracker.delete(ev.id):
+                raise Command_Error(f"could not delete {title!r} on {date}")
+            return {"deleted": ev.to_dict()}
+    raise Command_Error(f"no event {title!r} on {date}")
+
+
+def _update(tracker: CalendarEventTracker, cmd: dict) -> dict:
+    """Change any of date/title/location/note/end_date of the event with this id."""
+    event_id = _field(cmd, "id")
+    fields = {name: _field(cmd, name)
+              for name in ("date", "title", "location", "note", "end_date") if name in cmd}
+    try:
+        ev = tracker.update(event_id, **fields)
+    except KeyError:
+        raise Command_Error(f"no event with id {event_id!r}") from None
+    except ValueError as exc:  # invalid date, end before start, empty title
+        raise Command_Error(str(exc)) from None
+    return {"event": ev.to_dict()}
+
+
+def _criteria(cmd: dict) -> dict:
+    """Keyword arguments for delete_where/update_where from a command."""
+    criteria = {name: _field(cmd, field) for field, name in
+                (("start", "start_date"), ("end", "end_date"), ("location", "location"),
+                 ("keyword", "keyword")) if field in cmd}
+    criteria["mode"] = _field(cmd, "mode", "word")
+    return criteria
+
+
+def _delete_where(tracker: CalendarEventTracker, cmd: dict) -> dict:
+    """Delete every event matching start/end/location/keyword (one save)."""
+    try:
+        deleted = tracker.delete_where(**_criteria(cmd))
+    except ValueError as exc:  # no criteria, invalid date, unknown mode
+        raise Command_Error(str(exc)) from None
+    return _listing(deleted, cmd)
+
+
+def _update_where(tracker: CalendarEventTracker, cmd: dict) -> dict:
+    """Set the fields in "set" on every matching event (one save)."""
+    changes = cmd.get("set")
+    if not isinstance(changes, dict) or not changes:
+        raise Command_Error("set must be an object of fields to change")
+    fields = {name: _field(changes, name) for name in changes}
+    try:
+        updated = tracker.update_where(fields, **_criteria(cmd))
+    except ValueError as exc:
+        raise Command_Error(str(exc)) from None
+    return _listing(updated, cmd)
+
+
+def _export(tracker: CalendarEventTracker, cmd: dict) -> dict:
+    filename = _field(cmd, "filename", "events_export.csv")
+    try:
+        count = export_events_csv(tracker.sorted_events(), filename)
+    except (OSError, ValueError) as exc:  # unwritable path, bad file name
+        raise Command_Error(f"cannot export to {filename!r} ({exc})") from None
+    return {"filename": filename, "count": count}
+
+
+COMMANDS: Dict[str, Callable[[CalendarEventTracker, dict], dict]] = {
+    "add": _add,
+    "list": _list,
+    "range": _range,
+    "search": _search,
+    "delete": _delete,
+    "update": _update,
+    "delete_where": _delete_where,
+    "update_where": _update_where,
+    "export": _export,
+}
+
+
+def run_command(tracker: CalendarEventTracker, cmd: dict,
+                commands: Optional[Dict[str, Callable]] = None) -> dict:
+    """Run one command dict, e.g. {"op": "range", "start": ..., "end": ...}.
+
+    Returns {"ok": True, ...result} or {"ok": False, "error": ...}. A
+    command's "ref" (any JSON value) is echoed back so callers can match
+    results to requests. commands limits the ops allowed (default COMMANDS).
+    """
+    result = {"ok": True}
+    try:
+        if not isinstance(cmd, dict):
+            raise Command_Error("command must be a JSON object")
+        if "ref" in cmd:
+            result["ref"] = cmd["ref"]
+        handler = (COMMANDS if commands is None else commands).get(cmd.get("op"))
+        if handler is None:
+            raise Command_Error(f"unknown op: {cmd.get('op')!r}")
+        result.update(handler(tracker, cmd))
+    except Command_Error as exc:
+        result["ok"] = False
+        result["error"] = str(exc)
+    return result
+
+
+def run_batch(tracker: CalendarEventTracker, lines: Iterable[str], out: IO[str]) -> int:
+    """Run JSON Lines commands, writing one JSON result line for each.
+
+    All changes are saved once, when the input ends. Blank lines are
+    skipped; returns the number of commands run.
+    """
+    count = 0
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    with tracker.batch():
+        for line in lines:
+            if not line.strip():
+                continue
+            count += 1
+            try:
+                cmd = json.loads(line)
+            except json.JSONDecodeError as exc:
+                result = {"ok": False, "error": f"bad JSON ({exc.msg})"}
+            else:
+                result = run_command(tracker, cmd)
+            out.write(dumps(result) + "\n")
+    return count
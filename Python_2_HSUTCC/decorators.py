@@ -1,19 +1,269 @@
 # decorators.py
 # decorator functions
 
+import atexit
+import contextlib
 import functools
+import json
+import threading
+import time
+from typing import Dict, List
 
 def autosave(method):
     """
     Decorator for methods that modify the events list.
     After the wrapped method runs, the current calendar is saved
-    via self.save().
+    via self.save(), unless self.defer_save() (see Deferred_Saves)
+    takes the save over. Both run under self._save_lock if it is set.
     """
     @functools.wraps(method)
     def wrapper(self, *args, **kwargs):
-        result = method(self, *args, *kwargs)
-        # Only saves if the method didn't signal False
-        if result is not False:
-            self.save()
+        lock = getattr(self, "_save_lock", None) or contextlib.nullcontext()
+        with lock:
+            result = method(self, *args, **kwargs)
+            # Only saves if the method didn't signal False
+            if result is not False:
+                defer = getattr(self, "defer_save", None)
+                if defer is None or not defer():
+                    self.save()
         return result
     return wrapper
+
+
+def instrumented(method):
+    """
+    Decorator that times a method into self.metrics (a Metrics_Registry),
+    under the name Class.method. While self.metrics is None, the default,
+    it costs one attribute check per call.
+    """
+    op = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        metrics = self.metrics
+        if metrics is None:
+            return method(self, *args, **kwargs)
+        stack = metrics.running()
+        stack.append(op)
+        started = time.perf_counter_ns()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            metrics.record(op, time.perf_counter_ns() - started)
+            stack.pop()
+    wrapper.instrumented = True
+    return wrapper
+
+
+def add_count(owner, counter: str, amount: int) -> None:
+    """Add to a counter (bytes_read, events_scanned, ...) of owner.metrics, if on."""
+    metrics = owner.metrics
+    if metrics is not None:
+        metrics.count(counter, amount)
+
+
+class Metrics_Registry:
+    """
+    What @instrumented methods recorded: per operation, the number of
+    calls, total and slowest time, a latency histogram (power-of-two
+    microsecond buckets) and counters such as bytes_read, bytes_written
+    and events_scanned. Times include nested calls, and so do counters:
+    bytes read by a storage load also count towards the tracker operation
+    that triggered it. Safe to share between threads.
+    """
+    BUCKETS = 32   # the last one collects everything from ~36 minutes up
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ops: Dict[str, list] = {}    # name -> [calls, total_ns, max_ns, histogram, counters]
+        self._totals: Dict[str, int] = {}
+        self._dumper = None
+        self._stop_dump = threading.Event()
+
+    def running(self) -> List[str]:
+        """Names of the instrumented calls under way in this thread, outermost first."""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _op(self, name: str) -> list:
+        op = self._ops.get(name)
+        if op is None:
+            op = self._ops[name] = [0, 0, 0, [0] * self.BUCKETS, {}]
+        return op
+
+    def record(self, name: str, elapsed_ns: int) -> None:
+        bucket = min((elapsed_ns // 1000).bit_length(), self.BUCKETS - 1)
+        with self._lock:
+            op = self._op(name)
+            op[0] += 1
+            op[1] += elapsed_ns
+            op[2] = max(op[2], elapsed_ns)
+            op[3][bucket] += 1
+
+    def count(self, counter: str, amount: int) -> None:
+        """Add amount to counter, for every operation running in this thread."""
+        with self._lock:
+            self._totals[counter] = self._totals.get(counter, 0) + amount
+            for name in dict.fromkeys(self.running()):
+                counters = self._op(name)[4]
+                counters[counter] = counters.get(counter, 0) + amount
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self._ops.clear()
+            self._totals.clear()
+
+    def stats(self) -> dict:
+        """Everything recorded so far, as plain JSON-ready dicts."""
+        with self._lock:
+            ops = {}
+            for name, (calls, total_ns, max_ns, histogram, counters) in sorted(self._ops.items()):
+                ops[name] = {
+                    "calls": calls,
+                    "total_ms": total_ns / 1e6,
+                    "mean_us": total_ns / calls / 1e3 if calls else 0.0,
+                    "max_us": max_ns / 1e3,
+                    # "<N us": calls that took under N microseconds (and
+                    # at least the previous bucket's N)
+                    "histogram": {f"<{1 << b}us": n for b, n in enumerate(histogram) if n},
+                    **counters,
+                }
+            return {"since": self.started, "totals": dict(self._totals), "ops": ops}
+
+    def start_dump(self, filename: str, interval: float = 60.0) -> None:
+        """Append stats() to filename as one JSON line every interval seconds."""
+        self.stop_dump()
+        self._stop_dump.clear()
+        self._dumper = threading.Thread(
+            target=self._dump_loop, args=(filename, interval), name="metrics-dump", daemon=True,
+        )
+        self._dumper.start()
+
+    def stop_dump(self) -> None:
+        """Stop the periodic dump (after writing one last line)."""
+        if self._dumper is None:
+            return
+        self._stop_dump.set()
+        self._dumper.join()
+        self._dumper = None
+
+    def dump(self, filename: str) -> None:
+        with open(filename, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"time": time.time(), **self.stats()}) + "\n")
+
+    def _dump_loop(self, filename: str, interval: float) -> None:
+        while True:
+            stopping = self._stop_dump.wait(interval)
+            try:
+                self.dump(filename)
+            except OSError as exc:
+                print(f"Warning: could not write metrics ({exc}).")
+            if stopping:
+                return
+
+
+class Deferred_Saves:
+    """
+    Mixin for classes with @autosave methods that lets them put off saving.
+    batch() turns the saves inside a with-block into one save at the end;
+    start_write_behind() hands saves to a background thread that writes
+    once a burst of changes has gone quiet. flush() saves anything pending.
+    """
+    _batch_depth = 0
+    _dirty = False
+    _writer = None      # write-behind thread, while running
+    _save_lock = None   # held around mutations and saves (made if unset)
+
+    def defer_save(self) -> bool:
+        """Called by autosave. Returns True if the save was deferred."""
+        if self._batch_depth == 0 and self._writer is None:
+            return False
+        if self._writer is None:
+            self._dirty = True
+            return True
+        with self._wake:
+            self._dirty = True
+            self._last_change = time.monotonic()
+            if self._batch_depth == 0:  # a batch flushes for itself
+                self._wake.notify()
+        return True
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Save once when the outermost batch ends, even if it raised."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
+
+    def flush(self) -> None:
+        """Save now if any change is still waiting to be written."""
+        with self._save_lock or contextlib.nullcontext():
+            if not self._dirty:
+                return
+            self._dirty = False
+            try:
+                self.save()
+            except BaseException:
+                self._dirty = True
+                raise
+
+    def start_write_behind(self, delay: float = 0.5, max_delay: float = 5.0) -> None:
+        """Save in the background, delay seconds after the last change
+        (but no later than max_delay after the first unsaved one)."""
+        if self._writer is not None:
+            return
+        if self._save_lock is None:
+            self._save_lock = threading.RLock()
+        self._wake = threading.Condition()
+        self._stopping = False
+        self._last_change = time.monotonic()
+        self._writer = threading.Thread(
+            target=self._write_behind_loop, args=(delay, max_delay),
+            name="write-behind", daemon=True,
+        )
+        self._writer.start()
+        # Whatever is pending still gets written when the program exits
+        atexit.register(self.stop_write_behind)
+
+    def stop_write_behind(self) -> None:
+        """Stop the background writer and flush what it had not saved yet."""
+        writer = self._writer
+        if writer is None:
+            return
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+        writer.join()
+        self._writer = None
+        atexit.unregister(self.stop_write_behind)
+        self.flush()
+
+    def _write_behind_loop(self, delay: float, max_delay: float) -> None:
+        while True:
+            with self._wake:
+                while (not self._dirty or self._batch_depth) and not self._stopping:
+                    self._wake.wait()
+                first_change = time.monotonic()
+                while not self._stopping:
+                    # Wait until the burst goes quiet, or max_delay runs out
+                    deadline = min(self._last_change + delay, first_change + max_delay)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wake.wait(remaining)
+                if self._stopping:
+                    return  # stop_write_behind() does the final flush
+            try:
+                self.flush()
+            except Exception as exc:
+                print(f"Warning: background save failed ({exc}). Will retry.")
+                time.sleep(delay)
@@ -0,0 +1,99 @@
+# export.py
+# Streaming CSV export with an external merge sort on date
+import contextlib
+import csv
+import heapq
+import os
+import tempfile
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+
+from model import Event
+
+CSV_HEADER = ["Date", "Title", "Location", "note"]
+RUN_SIZE = 200_000            # rows sorted in memory before spilling to disk
+WRITE_BUFFER = 1 << 20        # bytes buffered per output/spill file
+MERGE_FAN_IN = 128            # spill files merged (and open) at once
+
+
+def _sorted_runs(events: Iterator[Event], run_size: int) -> Iterator[List[tuple]]:
+    """Chunks of run_size rows, each sorted by date (stable)."""
+    while True:
+        run = [(ev.date, ev.title, ev.location, ev.note) for ev in islice(events, run_size)]
+        if not run:
+            return
+        run.sort(key=lambda row: row[0])
+        yield run
+
+
+def _read_run(filename: str) -> Iterator[List[str]]:
+    with open(filename, "r", newline="", encoding="utf-8", buffering=WRITE_BUFFER) as f:
+        yield from csv.reader(f)
+
+
+def export_events_csv(events: Iterable[Event], csv_filename: str,
+                      run_size: int = RUN_SIZE, tmp_dir: Optional[str] = None) -> int:
+    """Write events to csv_filename sorted by date; returns the row count.
+
+    Only run_size rows are held at a time: each sorted run is spilled to a
+    temp file and the runs are merged while writing. Events on the same
+    date keep the order the source yielded them in, like sorted() would.
+
+    The rows go to a temp file that replaces csv_filename only when
+    complete, and with no events at all csv_filename is left alone.
+    """
+    runs = _sorted_runs(iter(events), run_size)
+    first_run = next(runs, [])
+    count = len(first_run)
+    if count == 0:
+        return 0
+    with tempfile.TemporaryDirectory(prefix="events-export-", dir=tmp_dir) as spill_dir:
+        spills: List[str] = []
+        for run in runs:
+            if not spills:
+                spills.append(_spill(first_run, spill_dir))
+                first_run = []
+            spills.append(_spill(run, spill_dir))
+            count += len(run)
+
+        # Too many runs to keep open at once: merge them in groups first
+        while len(spills) > MERGE_FAN_IN:
+            groups = [spills[i:i + MERGE_FAN_IN] for i in range(0, len(spills), MERGE_FAN_IN)]
+            spills = [_spill(_merge(group), spill_dir) for group in groups]
+
+        tmp_name = csv_filename + ".tmp"
+        try:
+            with open(tmp_name, "w", newline="", encoding="utf-8",
+                      buffering=WRITE_BUFFER) as f:
+                writer = csv.writer(f)
+                writer.writerow(CSV_HEADER)
+                _write_blocks(writer, _merge(spills) if spills else first_run)
+            os.replace(tmp_name, csv_filename)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_name)
+            raise
+    return count
+
+
+def _merge(spills: List[str]) -> Iterator[List[str]]:
+    # heapq.merge takes equal keys from earlier runs first, which keeps
+    # the result stable across runs
+    return heapq.merge(*(_read_run(name) for name in spills), key=lambda row: row[0])
+
+
+def _write_blocks(writer, rows: Iterable) -> None:
+    """writerows in blocks, so a merged stream is not materialized."""
+    rows = iter(rows)
+    while True:
+        block = list(islice(rows, 10_000))
+        if not block:
+            return
+        writer.writerows(block)
+
+
+def _spill(rows: Iterable, spill_dir: str) -> str:
+    fd, filename = tempfile.mkstemp(suffix=".csv", dir=spill_dir)
+    with open(fd, "w", newline="", encoding="utf-8", buffering=WRITE_BUFFER) as f:
+        _write_blocks(csv.writer(f), rows)
+    return filename
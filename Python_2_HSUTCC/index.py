@@ -0,0 +1,319 @@
+# index.py
+# Keyword and date-span indexes the tracker keeps next to its events list.
+import re
+from bisect import bisect_left, bisect_right
+from heapq import merge, nsmallest
+from operator import attrgetter, itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from model import Event
+
+_WORD = re.compile(r"\w+")
+NGRAM = 3
+SEARCH_MODES = ("word", "prefix", "substring")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words of text."""
+    return _WORD.findall(text.lower())
+
+
+def char_ngrams(text: str) -> Set[str]:
+    """Every NGRAM-long slice of text (already lowercased)."""
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+# A doc's place in search results as one int: (ordinal, seq, key) packed
+# into bit fields, so ordering matches needs no key function and the
+# doc's key can be read back from the low bits
+_KEY_BITS = 40
+_KEY_MASK = (1 << _KEY_BITS) - 1
+
+
+def _date_order(ordinal: int, seq: int, key: int) -> int:
+    return (((ordinal << _KEY_BITS) | seq) << _KEY_BITS) | key
+
+
+class Keyword_Index:
+    """Inverted index over the words of each event's title and note.
+
+    "word" and "prefix" searches are answered from the word postings
+    (a sorted vocabulary makes prefixes a bisect). "substring" keeps the
+    old `needle in title/note` rule; with ngrams=True it narrows the
+    candidates through a trigram index first, otherwise it scans.
+
+    The index is multi-version so one writer and any number of reader
+    threads can share it: every add/remove bumps clock and stamps the
+    document, and search(at=clock) sees the index exactly as it was at
+    that clock. Removed documents stay as tombstones (postings only
+    grow, the vocabulary list is replaced rather than edited) until
+    compacted() copies the live ones into a fresh index.
+    """
+
+    def __init__(self, events: Iterable[Event] = (), ngrams: bool = False):
+        self.use_ngrams = ngrams
+        self.clock = 0
+        self.dead = 0                 # tombstones waiting for compacted()
+        self._seq = 0
+        self._next_key = 0
+        # key -> (insertion seq, event, its words, its grams, born, died)
+        self._docs: Dict[int, Tuple[int, Event, Set[str], Iterable[str], int, Optional[int]]] = {}
+        self._live: Dict[int, int] = {}   # id(event) -> key of its live doc
+        self._live_keys: Set[int] = set()
+        self._order: Dict[int, int] = {}  # key -> _date_order of the doc
+        self._words: Dict[str, Set[int]] = {}
+        self._vocab: List[str] = []   # sorted keys of _words
+        self._grams: Dict[str, Set[int]] = {}
+        self._add_all((ev, None) for ev in events)
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def add(self, ev: Event, seq: Optional[int] = None) -> None:
+        self._add_all([(ev, seq)])
+
+    def _add_all(self, docs: Iterable[Tuple[Event, Optional[int]]]) -> None:
+        """Index (event, seq) pairs, then merge their new words into the
+        vocabulary in one pass: readers get a new sorted list, never an
+        edited one, and a build costs one sort rather than an insert per word."""
+        new_words: List[str] = []
+        for ev, seq in docs:
+            self._add_doc(ev, seq, new_words)
+        if new_words:
+            new_words.sort()
+            self._vocab = list(merge(self._vocab, new_words))
+
+    def _add_doc(self, ev: Event, seq: Optional[int], new_words: List[str]) -> None:
+        if seq is None:
+            seq = self._seq
+            self._seq += 1
+        self.clock += 1
+        key = self._next_key
+        self._next_key += 1
+        title, note = (ev.title or "").lower(), (ev.note or "").lower()
+        words = set(_WORD.findall(title))
+        words.update(_WORD.findall(note))
+        grams = char_ngrams(title) | char_ngrams(note) if self.use_ngrams else ()
+        # The doc goes in before its key shows up in any posting
+        self._docs[key] = (seq, ev, words, grams, self.clock, None)
+        self._order[key] = _date_order(ev.ordinal, seq, key)
+        self._live[id(ev)] = key
+        self._live_keys.add(key)
+        postings = self._words
+        for word in words:
+            posting = postings.get(word)
+            if posting is None:
+                posting = postings[word] = set()
+                new_words.append(word)
+            posting.add(key)
+        for gram in grams:
+            posting = self._grams.get(gram)
+            if posting is None:
+                posting = self._grams[gram] = set()
+            posting.add(key)
+
+    def remove(self, ev: Event) -> bool:
+        """Drop an event. Returns False if it isn't indexed."""
+        key = self._live.pop(id(ev), None)
+        if key is None:
+            return False
+        self._live_keys.discard(key)
+        self.clock += 1
+        self._docs[key] = self._docs[key][:5] + (self.clock,)
+        self.dead += 1
+        return True
+
+    def replace(self, old: Event, new: Event) -> None:
+        """Index new in old's place (same position among equal dates)."""
+        key = self._live.get(id(old))
+        self.remove(old)
+        self.add(new, seq=None if key is None else self._docs[key][0])
+
+    def update(self, ev: Event) -> None:
+        """Re-index an event whose title or note changed (keeps its place)."""
+        self.replace(ev, ev)
+
+    def compacted(self) -> "Keyword_Index":
+        """A new index holding only the live documents, in the same order."""
+        live = sorted((self._docs[key][:2] for key in self._live.values()), key=itemgetter(0))
+        fresh = Keyword_Index(ngrams=self.use_ngrams)
+        fresh._add_all((ev, seq) for seq, ev in live)
+        fresh._seq = self._seq
+        return fresh
+
+    def _with_prefix(self, prefix: str) -> Set[int]:
+        found: Set[int] = set()
+        vocab = self._vocab
+        pos = bisect_left(vocab, prefix)
+        while pos < len(vocab) and vocab[pos].startswith(prefix):
+            found |= self._words[vocab[pos]]
+            pos += 1
+        return found
+
+    @staticmethod
+    def _intersect(postings: List[Set[int]]) -> Set[int]:
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+        return result
+
+    def search(self, keyword: str, mode: str = "prefix",
+               at: Optional[int] = None) -> List[Event]:
+        """Matching events sorted by date (ties keep insertion order).
+
+        word:      every word of keyword is a whole word of title/note
+        prefix:    every word of keyword starts a word of title/note
+        substring: keyword appears anywhere in title or note (any case)
+
+        at is a past clock value to search the index as it was then.
+        """
+        return self.search_page(keyword, mode, at)[1]
+
+    def search_page(self, keyword: str, mode: str = "prefix", at: Optional[int] = None,
+                    limit: Optional[int] = None) -> Tuple[int, List[Event]]:
+        """(number of matches, the first limit of them by date) for
+        search(). Only those limit are sorted, through a heap, and the
+        matches are never turned into docs beyond those."""
+        if at is None:
+            at = self.clock
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"unknown search mode: {mode!r}")
+        if mode == "substring":
+            keys = self._substring(keyword.lower())
+        else:
+            terms = tokenize(keyword)
+            if not terms:
+                return 0, []
+            if mode == "word":
+                postings = [self._words.get(term, set()) for term in terms]
+            else:
+                postings = [self._with_prefix(term) for term in terms]
+            keys = self._intersect(postings)
+
+        live = None
+        if at == self.clock:
+            live = keys & self._live_keys
+            if self.clock != at:   # a writer got in between: check each doc
+                live = None
+        if live is None:
+            docs = self._docs
+            live = [key for key in keys
+                    if docs[key][4] <= at and (docs[key][5] is None or docs[key][5] > at)]
+        orders = list(map(self._order.__getitem__, live))
+        if limit is not None and limit < len(orders):
+            top = nsmallest(limit, orders)
+        else:
+            top = sorted(orders)
+        docs = self._docs
+        return len(orders), [docs[order & _KEY_MASK][1] for order in top]
+
+    def _substring(self, needle: str) -> Set[int]:
+        if self.use_ngrams and len(needle) >= NGRAM:
+            candidates = self._intersect(
+                [self._grams.get(gram, set()) for gram in char_ngrams(needle)]
+            )
+        else:
+            candidates = list(self._docs)  # copied in one step; the writer may add more
+        found = set()
+        for key in candidates:
+            ev = self._docs[key][1]
+            if needle in (ev.title or "").lower() or needle in (ev.note or "").lower():
+                found.add(key)
+        return found
+
+
+class Span_Index:
+    """Multi-day events by start date, for "what is still under way on
+    day first" questions. Never changes: with_changes returns a new one.
+
+    The events are sorted by start and sit at the leaves of a segment
+    tree that keeps the latest end below each node, so under_way skips
+    every subtree that ends before the day it is asked about. That
+    reports k events in O((k + 1) log m) for m multi-day events.
+
+    with_changes patches the leaves in place when each new event
+    replaces one on the same start day (an edit that keeps the start),
+    re-maxing only their paths to the root: a copy of the tree plus
+    O(log m) per event. Anything else (an add, a delete, a moved start)
+    rebuilds the index, in O(m log m).
+    """
+    __slots__ = ("events", "_starts", "_size", "_ends")
+
+    def __init__(self, events: Iterable[Event] = ()):
+        self.events = tuple(sorted(events, key=attrgetter("ordinal")))
+        self._starts = [ev.ordinal for ev in self.events]
+        size = 1
+        while size < len(self.events):
+            size *= 2
+        self._size = size
+        # Heap-ordered tree: node n has children 2n and 2n + 1, leaves from size
+        ends = [0] * (2 * size)
+        ends[size:size + len(self.events)] = [ev.end_ordinal for ev in self.events]
+        for node in range(size - 1, 0, -1):
+            ends[node] = max(ends[2 * node], ends[2 * node + 1])
+        self._ends = ends
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def with_changes(self, removed: Iterable[Event] = (),
+                     added: Iterable[Event] = ()) -> "Span_Index":
+        """A new index without removed (exact objects) and with added,
+        which go after any others starting on the same day."""
+        removed, added = list(removed), list(added)
+        if not removed and not added:
+            return self
+        if len(removed) == len(added):
+            patched = self._replaced(removed, added)
+            if patched is not None:
+                return patched
+        drop = set(map(id, removed))
+        return Span_Index([ev for ev in self.events if id(ev) not in drop] + added)
+
+    def _replaced(self, olds: List[Event], news: List[Event]) -> Optional["Span_Index"]:
+        # Each new takes its old's leaf; None if one moved or isn't here
+        events = list(self.events)
+        ends = self._ends[:]
+        starts = self._starts
+        for old, new in zip(olds, news):
+            day = old.ordinal
+            if new.ordinal != day:
+                return None
+            lo, hi = bisect_left(starts, day), bisect_right(starts, day)
+            pos = next((i for i in range(lo, hi) if events[i] is old), None)
+            if pos is None:
+                return None
+            events[pos] = new
+            node = self._size + pos
+            ends[node] = new.end_ordinal
+            node //= 2
+            while node:
+                ends[node] = max(ends[2 * node], ends[2 * node + 1])
+                node //= 2
+        index = object.__new__(Span_Index)
+        index.events = tuple(events)
+        index._starts = starts   # the starts did not change (never mutated)
+        index._size = self._size
+        index._ends = ends
+        return index
+
+    def under_way(self, first: int) -> Iterator[Event]:
+        """Events that start before day first and end on or after it,
+        by start date."""
+        hi = bisect_left(self._starts, first)
+        ends = self._ends
+        if hi == 0 or ends[1] < first:
+            return
+        events = self.events
+        # (node, first leaf under it, leaves under it); left before right
+        stack = [(1, 0, self._size)]
+        while stack:
+            node, lo, width = stack.pop()
+            if lo >= hi or ends[node] < first:
+                continue
+            if width == 1:
+                yield events[lo]
+                continue
+            half = width // 2
+            stack.append((2 * node + 1, lo + half, half))
+            stack.append((2 * node, lo, half))
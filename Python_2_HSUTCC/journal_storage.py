@@ -0,0 +1,184 @@
+# journal_storage.py
+# Storage backend that appends changes to a log instead of rewriting the file
+import contextlib
+import json
+import os
+import threading
+from itertools import chain
+from typing import Dict, Iterable, List
+
+from model import Event
+from storage import Event_Storage, Saved_Events
+from decorators import add_count
+
+COMPACT_AT_BYTES = 1_000_000
+
+
+class Journal_Storage(Event_Storage):
+    """Snapshot file plus an append-only log of add/edit/delete records.
+
+    The snapshot is a JSON array in the same shape as events.json (each
+    event also carries its "seq" key), so an existing events.json can be
+    opened directly. save() only appends the events that changed since
+    the last save; once the log grows past compact_at bytes it is folded
+    into a new snapshot on a background thread.
+    """
+
+    def __init__(self, filename: str = "events.json",
+                 compact_at: int = COMPACT_AT_BYTES):
+        self.filename = filename
+        self.log_name = filename + ".log"
+        self.compact_at = compact_at
+        self._saved = Saved_Events()
+        self._unreadable: Dict[int, dict] = {}   # seq -> record load() had to skip
+        self._next_seq = 0
+        self._lock = threading.Lock()
+        self._compactor = None
+
+    # Reading
+
+    def load(self) -> List[Event]:
+        """Read the snapshot, replay the log(s) and return the events."""
+        self.wait()
+        rows = self._read_snapshot()
+        for name in (self.log_name + ".old", self.log_name):
+            self._replay(name, rows)
+        for name in (self.filename, self.log_name + ".old", self.log_name):
+            if os.path.exists(name):
+                add_count(self, "bytes_read", os.path.getsize(name))
+
+        self._saved = Saved_Events()
+        self._unreadable = {}
+        events: List[Event] = []
+        ids_missing = False
+        for seq, data in rows.items():
+            try:
+                ev = Event.from_dict(data)
+            except ValueError as exc:
+                # Kept as it is: saves never touch it, compaction copies it
+                print(f"Warning: skipping bad event (seq {seq}): {exc}.")
+                self._unreadable[seq] = data
+                continue
+            ids_missing = ids_missing or "id" not in data
+            self._saved.remember(seq, ev)
+            events.append(ev)
+        self._next_seq = max(rows, default=-1) + 1
+        add_count(self, "events_scanned", len(events))
+
+        # Left over from a compaction that never finished: finish it now
+        if os.path.exists(self.log_name + ".old"):
+            self._write_snapshot(self._snapshot_rows())
+        # Records from before event ids just got new ones, which have to
+        # stick: write them out, folding in the log (or it would be
+        # replayed over them)
+        if ids_missing:
+            if os.path.exists(self.log_name):
+                self.compact()
+            else:
+                self._write_snapshot(self._snapshot_rows())
+        return events
+
+    def _read_snapshot(self) -> Dict[int, dict]:
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            print("Warning: events file is corrupted. Starting with empty list.")
+            return {}
+        rows: Dict[int, dict] = {}
+        for pos, item in enumerate(data):
+            rows[item.pop("seq", pos)] = item
+        return rows
+
+    @staticmethod
+    def _replay(name: str, rows: Dict[int, dict]) -> None:
+        """Apply log records to rows. Re-applying a record is harmless."""
+        try:
+            f = open(name, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line_no, line in enumerate(f, start=1):
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-append is expected
+                    print(f"Warning: skipping bad record at {name}:{line_no}.")
+                    continue
+                if rec["op"] == "delete":
+                    rows.pop(rec["seq"], None)
+                else:  # add / edit
+                    rows[rec["seq"]] = rec["event"]
+
+    # Writing
+
+    def save(self, events: Iterable[Event]) -> None:
+        """Append one record per added, edited or deleted event."""
+        added, changed, removed = self._saved.diff(events)
+        records = []
+        for ev in added:
+            data = ev.to_dict()
+            self._saved.remember(self._next_seq, ev, data)
+            records.append({"op": "add", "seq": self._next_seq, "event": data})
+            self._next_seq += 1
+        for seq, ev in changed:
+            data = ev.to_dict()
+            self._saved.remember(seq, ev, data)
+            records.append({"op": "edit", "seq": seq, "event": data})
+        for seq in removed:
+            self._saved.forget(seq)
+            records.append({"op": "delete", "seq": seq})
+        if not records:
+            return
+
+        payload = "".join(json.dumps(rec) + "\n" for rec in records)
+        with self._lock:
+            with open(self.log_name, "a", encoding="utf-8") as f:
+                start = f.tell()
+                f.write(payload)
+                log_size = f.tell()
+        add_count(self, "bytes_written", log_size - start)
+        if log_size >= self.compact_at:
+            self.compact(background=True)
+
+    def compact(self, background: bool = False) -> None:
+        """Fold the log into a fresh snapshot.
+
+        The live log is renamed to <log>.old first, so saves made while the
+        snapshot is being written go to a new log and are not lost.
+        """
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            if not os.path.exists(self.log_name):
+                return
+            os.replace(self.log_name, self.log_name + ".old")
+            rows = self._snapshot_rows()
+            if not background:
+                self._write_snapshot(rows)
+                return
+            self._compactor = threading.Thread(
+                target=self._write_snapshot, args=(rows,), name="journal-compactor"
+            )
+            self._compactor.start()
+
+    def wait(self) -> None:
+        """Block until a running background compaction has finished."""
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def _snapshot_rows(self) -> List[dict]:
+        rows = chain(self._saved.rows(), self._unreadable.items())
+        return [dict(data, seq=seq) for seq, data in rows]
+
+    def _write_snapshot(self, rows: List[dict]) -> None:
+        tmp_name = self.filename + ".tmp"
+        with open(tmp_name, "w", encoding="utf-8") as f:
+            json.dump(rows, f)
+        os.replace(tmp_name, self.filename)
+        # Only now is it safe to drop the records the snapshot covers
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.log_name + ".old")
@@ -0,0 +1,91 @@
+# load_client.py
+# Load generator for server.py: concurrent clients, reports latency and throughput
+# Run: python load_client.py [HOST:PORT] [clients] [requests per client] [write ratio]
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Dict, List
+
+from server import HOST, PORT, parse_address
+
+WORDS = ["standup", "gym", "lunch", "python", "dentist", "review", "planning", "demo"]
+
+
+def _command(rng: random.Random, write_ratio: float) -> dict:
+    day = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    if rng.random() < write_ratio:
+        return {"op": "add", "date": day, "title": f"{rng.choice(WORDS)} {rng.randint(1, 999)}"}
+    kind = rng.random()
+    if kind < 0.4:
+        return {"op": "list", "date": day, "limit": 20}
+    if kind < 0.7:
+        return {"op": "range", "start": day, "end": day[:8] + "28", "limit": 20}
+    return {"op": "search", "keyword": rng.choice(WORDS), "limit": 20}
+
+
+async def _client(host: str, port: int, requests: int, write_ratio: float,
+                  seed: int, latencies: List[float]) -> int:
+    """Send requests one at a time; returns how many came back not ok."""
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    errors = 0
+    try:
+        for _ in range(requests):
+            line = json.dumps(_command(rng, write_ratio)).encode() + b"\n"
+            started = time.perf_counter()
+            writer.write(line)
+            await writer.drain()
+            reply = await reader.readline()
+            latencies.append(time.perf_counter() - started)
+            if not reply or not json.loads(reply).get("ok"):
+                errors += 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return errors
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+async def run_load(host: str = HOST, port: int = PORT, clients: int = 20,
+                   requests: int = 500, write_ratio: float = 0.1, seed: int = 42) -> Dict[str, float]:
+    """Run clients concurrently, each sending requests commands.
+
+    Returns request count, errors, seconds, throughput (requests/s) and
+    p50/p99 latency in milliseconds.
+    """
+    latencies: List[float] = []
+    started = time.perf_counter()
+    errors = await asyncio.gather(*(
+        _client(host, port, requests, write_ratio, seed + i, latencies) for i in range(clients)
+    ))
+    seconds = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "seconds": seconds,
+        "throughput": len(latencies) / seconds if seconds else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    host, port = parse_address(sys.argv[1:2])
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    requests = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    write_ratio = float(sys.argv[4]) if len(sys.argv) > 4 else 0.1
+    report = asyncio.run(run_load(host, port, clients, requests, write_ratio))
+    print(f"{report['requests']} requests from {clients} clients in {report['seconds']:.2f}s "
+          f"({report['errors']} errors)")
+    print(f"  throughput: {report['throughput']:,.0f} requests/s")
+    print(f"  latency:    p50 {report['p50_ms']:.2f} ms, p99 {report['p99_ms']:.2f} ms")
@@ -7,10 +7,33 @@
 # CSV file for use in Excel or Google sheets. Events are presented as obj, saved via a 
 # plugged storage backend (using abstract classes)
 # uses decorator (wrappers) to auto-save changes to disk.
-from storage import JSON_File_Storage
+#
+# Batch mode (no menu): python main_ev_tracker.py --batch [COMMANDS.jsonl|-]
+# runs JSON Lines commands (see commands.py) and prints one JSON result per line.
+# --metrics FILE (either mode) appends the tracker's stats() to FILE every minute.
+import sys
+
+from model import Event
+from storage import Event_Storage, JSON_File_Storage
 from tracker import CalendarEventTracker
 
 if __name__ == "__main__":
     storage = JSON_File_Storage("events.json")
     app = CalendarEventTracker(storage)
-    app.run()
\ No newline at end of file
+    args = sys.argv[1:]
+    if "--metrics" in args:
+        at = args.index("--metrics")
+        app.enable_metrics(dump_to=args[at + 1])
+        del args[at:at + 2]
+    if args and args[0] == "--batch":
+        from commands import run_batch
+
+        source = args[1] if len(args) > 1 else "-"
+        if source == "-":
+            run_batch(app, sys.stdin, sys.stdout)
+        else:
+            with open(source, "r", encoding="utf-8") as f:
+                run_batch(app, f, sys.stdout)
+    else:
+        app.run()
+    app.disable_metrics()  # writes the last dump
@@ -0,0 +1,52 @@
+# measure_memory.py
+# Bytes per event for the old dict-backed Event vs the slotted, interned one.
+# Run: python measure_memory.py [count]   (default 1,000,000)
+import random
+import sys
+import tracemalloc
+
+from model import Event
+
+CITIES = ["Bangkok", "Jeddah", "Barcelona", "Dubai", "Home", "Office", "Online"]
+TITLES = ["Standup", "Gym", "Lunch", "Python class", "Dentist", "Team meeting"]
+
+
+class Dict_Event:
+    """Event as it was before __slots__/interning (per-instance __dict__)."""
+    def __init__(self, date: str, title: str, location: str = "", note: str = ""):
+        self.date = date
+        self.title = title
+        self.location = location
+        self.note = note
+
+
+def _rows(count: int, seed: int = 42):
+    """Encoded rows, so each decode makes a fresh str like json.load does."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield (
+            f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}".encode(),
+            rng.choice(TITLES).encode(),
+            rng.choice(CITIES).encode(),
+            (b"note %d" % i) if i % 4 == 0 else b"",
+        )
+
+
+def bytes_per_event(cls, count: int) -> float:
+    rows = list(_rows(count))
+    tracemalloc.start()
+    events = [cls(d.decode(), t.decode(), l.decode(), n.decode()) for d, t, l, n in rows]
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del events
+    return used / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    before = bytes_per_event(Dict_Event, count)
+    after = bytes_per_event(Event, count)
+    print(f"{count:,} events")
+    print(f"  before (dict-backed): {before:7.1f} bytes/event")
+    print(f"  after  (slots+intern): {after:7.1f} bytes/event")
+    print(f"  saved: {100 * (1 - after / before):.0f}%")
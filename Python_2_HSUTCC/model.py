@@ -1,30 +1,410 @@
 # models.py
 # event class which is the data model
-from typing import Dict
+import gc
+import os
+import random
+import sys
+from functools import lru_cache
+import heapq
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Days in each month of a non-leap year, and days before each month
+MONTH_DAYS = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+DAYS_BEFORE_MONTH = (0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+LAST_DATE = "9999-12-31"   # the end of an open-ended date range
+
+
+def _intern(value):
+    """sys.intern for str values; anything else is passed through."""
+    return sys.intern(value) if type(value) is str else value
+
+
+@lru_cache(maxsize=1 << 16)
+def date_ordinal(text: str) -> int:
+    """Day number of a YYYY-MM-DD string, same as date.toordinal(); 0 if invalid.
+
+    Hand-written (no strptime) and cached, since calendars repeat dates a lot.
+    """
+    if type(text) is not str or len(text) != 10 or text[4] != "-" or text[7] != "-":
+        return 0
+    year_str, month_str, day_str = text[:4], text[5:7], text[8:]
+    if not (year_str.isdigit() and month_str.isdigit() and day_str.isdigit()):
+        return 0
+    year, month, day = int(year_str), int(month_str), int(day_str)
+    if year < 1 or month < 1 or month > 12:
+        return 0
+    leap = (year % 400 == 0) or (year % 4 == 0 and year % 100 != 0)
+    if day < 1 or day > MONTH_DAYS[month] + (month == 2 and leap):
+        return 0
+    y = year - 1
+    return (y * 365 + y // 4 - y // 100 + y // 400
+            + DAYS_BEFORE_MONTH[month] + (month > 2 and leap) + day)
+
+
+# Event ids come from a private generator, reseeded in forked children
+# (bulk_import's workers) so that no two processes hand out the same ids
+_ids = random.Random()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_ids.seed)
+
+
+def new_event_id() -> str:
+    """A fresh random event id: 16 hex digits (64 bits)."""
+    return "%016x" % _ids.getrandbits(64)
+
+
+def ordinal_date(day: int) -> str:
+    """YYYY-MM-DD of a day number; the inverse of date_ordinal."""
+    from datetime import date
+    return date.fromordinal(day).isoformat()
+
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+OCCURRENCE_MARK = "@"   # an occurrence's id is <series id>@<its date in the series>
+
+
+class Recurrence:
+    """How a recurring event repeats: every interval days, weeks or
+    months from the event's date, at most count times and not after
+    until (both optional). A monthly series skips months too short for
+    its day, like most calendars do.
+
+    exceptions maps the date of an occurrence to None (cancelled) or to
+    the fields it has instead, a new "date" included. Never changed in
+    place: with_exception() returns a new Recurrence, so snapshots that
+    hold the old one keep seeing the old series.
+    """
+    __slots__ = ("freq", "interval", "count", "until", "exceptions", "_key")
+
+    def __init__(self, freq: str, interval: int = 1, count: Optional[int] = None,
+                 until: Optional[str] = None,
+                 exceptions: Optional[Dict[str, Optional[Dict[str, str]]]] = None):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"repeat must be one of {', '.join(FREQUENCIES)}: {freq!r}")
+        if type(interval) is not int or interval < 1:
+            raise ValueError(f"interval must be a positive integer: {interval!r}")
+        if count is not None and (type(count) is not int or count < 1):
+            raise ValueError(f"count must be a positive integer: {count!r}")
+        if until is not None and date_ordinal(until) == 0:
+            raise ValueError(f"invalid until date: {until!r}")
+        if exceptions is not None and not isinstance(exceptions, dict):
+            raise ValueError("exceptions must be an object")
+        for day, fields in (exceptions or {}).items():
+            if date_ordinal(day) == 0 or not (fields is None or isinstance(fields, dict)):
+                raise ValueError(f"invalid exception for {day!r}")
+            for name in ("date", "end_date"):
+                if fields and name in fields and date_ordinal(fields[name]) == 0:
+                    raise ValueError(f"invalid {name} in the exception for {day!r}: "
+                                     f"{fields[name]!r}")
+        self.freq = freq
+        self.interval = interval
+        self.count = count
+        self.until = until
+        self.exceptions = dict(exceptions or {})
+        self._key = None
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Recurrence) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
+
+    def __repr__(self) -> str:
+        return f"Recurrence({self.to_dict()!r})"
+
+    def key(self) -> tuple:
+        """Everything about the rule, as a hashable tuple."""
+        if self._key is None:
+            self._key = (self.freq, self.interval, self.count, self.until, tuple(sorted(
+                (day, None if fields is None else tuple(sorted(fields.items())))
+                for day, fields in self.exceptions.items()
+            )))
+        return self._key
+
+    def to_dict(self) -> dict:
+        data = {"freq": self.freq, "interval": self.interval}
+        if self.count is not None:
+            data["count"] = self.count
+        if self.until is not None:
+            data["until"] = self.until
+        if self.exceptions:
+            data["exceptions"] = {day: None if fields is None else dict(fields)
+                                  for day, fields in self.exceptions.items()}
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Recurrence":
+        """Raises ValueError for a rule that makes no sense."""
+        if not isinstance(data, dict):
+            raise ValueError("repeat must be an object")
+        return cls(data.get("freq"), data.get("interval", 1), data.get("count"),
+                   data.get("until"), data.get("exceptions"))
+
+    def with_exception(self, day: str, fields: Optional[Dict[str, str]]) -> "Recurrence":
+        """A copy where the occurrence on day is cancelled (fields None)
+        or has these fields changed (on top of earlier changes)."""
+        exceptions = dict(self.exceptions)
+        if fields is None:
+            exceptions[day] = None
+        else:
+            exceptions[day] = {**(exceptions.get(day) or {}), **fields}
+        return Recurrence(self.freq, self.interval, self.count, self.until, exceptions)
+
+    def days(self, start: int, first: int, last: int) -> Iterator[int]:
+        """Day numbers of the series that starts on day start, from first
+        to last (inclusive), exceptions not applied. Jumps straight to
+        first where it can, so a far-off window costs no more than a near one."""
+        if self.until is not None:
+            last = min(last, date_ordinal(self.until))
+        count = self.count
+        if self.freq == "monthly":
+            yield from self._monthly_days(start, first, last)
+            return
+        step = self.interval * (7 if self.freq == "weekly" else 1)
+        k = max(0, -((start - first) // step))   # ceil((first - start) / step)
+        day = start + k * step
+        while day <= last and (count is None or k < count):
+            yield day
+            k += 1
+            day += step
+
+    def _monthly_days(self, start: int, first: int, last: int) -> Iterator[int]:
+        from datetime import date
+        begin = date.fromordinal(start)
+        month0 = begin.year * 12 + begin.month - 1
+        k = 0
+        if self.count is None and first > start:
+            # Without a count, skipped months need not be counted: jump ahead
+            there = date.fromordinal(first)
+            k = max(0, (there.year * 12 + there.month - 1 - month0) // self.interval - 1)
+        found = 0
+        while True:
+            year, month = divmod(month0 + k * self.interval, 12)
+            month += 1
+            if year > 9999:
+                return
+            day1 = date_ordinal(f"{year:04d}-{month:02d}-01")
+            if day1 > last:
+                return
+            leap = (year % 400 == 0) or (year % 4 == 0 and year % 100 != 0)
+            if begin.day <= MONTH_DAYS[month] + (month == 2 and leap):
+                found += 1
+                day = day1 + begin.day - 1
+                if day > last:
+                    return
+                if day >= first:
+                    yield day
+                if self.count is not None and found >= self.count:
+                    return
+            k += 1
+
 
 class Event:
-    """Represents a single calendar event."""
-    def __init__(self, date: str, title: str, location: str = "", note: str = ""):
-        self.date = date   # YYYY-MM-DD
-        self.title = title
-        self.location = location
+    """Represents a single calendar event.
+
+    Slotted (no per-instance __dict__). Date, title and location are
+    interned so events sharing a value like "Bangkok" share one string.
+    ordinal is the date as a day number (see date_ordinal), kept in step
+    with date; storage that has it saved can pass it in to skip parsing.
+
+    id identifies the event for good: it is saved with it, survives
+    edits (which make a new Event with the same id) and is what the
+    tracker's delete/update take. New events get a random one.
+
+    repeat (a Recurrence, None for a one-off event) makes the event a
+    series starting on date. It is stored as one record; occurrences()
+    makes the occurrences in a date window when they are asked for.
+
+    end_date is the last day of a multi-day event (a trip, a
+    conference), None for one that lasts a day; end_ordinal is its day
+    number either way.
+    """
+    __slots__ = ("_date", "ordinal", "title", "location", "note", "id", "repeat", "_end_date")
+
+    def __init__(self, date: str, title: str, location: str = "", note: str = "",
+                 ordinal: Optional[int] = None, id: Optional[str] = None,
+                 repeat: Optional[Recurrence] = None, end_date: Optional[str] = None):
+        self.id = id or new_event_id()
+        self.repeat = repeat
+        self._end_date = _intern(end_date) or None
+        if ordinal is None:
+            self.date = date   # YYYY-MM-DD
+        else:
+            self._date = _intern(date)
+            self.ordinal = ordinal
+        self.title = _intern(title)
+        self.location = _intern(location)
         self.note = note
 
+    @property
+    def date(self) -> str:
+        return self._date
+
+    @date.setter
+    def date(self, value: str) -> None:
+        self._date = _intern(value)
+        self.ordinal = date_ordinal(value)
+
+    @property
+    def end_date(self) -> Optional[str]:
+        return self._end_date
+
+    @property
+    def end_ordinal(self) -> int:
+        end = self._end_date
+        # An end that is invalid or before the start leaves a one-day event
+        if end is None or self.ordinal == 0:
+            return self.ordinal
+        return max(self.ordinal, date_ordinal(end))
+
+    def overlaps(self, first: int, last: int) -> bool:
+        """Does the event take place on any day from first to last?"""
+        return self.ordinal <= last and self.end_ordinal >= first
+
     def to_dict(self) -> Dict[str, str]:
         """Convert event to a dict so it can be saved as JSON."""
-        return {
+        data = {
             "date": self.date,
             "title": self.title,
             "location": self.location,
             "note": self.note,
+            "id": self.id,
         }
+        if self._end_date is not None:
+            data["end_date"] = self._end_date
+        if self.repeat is not None:
+            data["repeat"] = self.repeat.to_dict()
+        return data
+
+    # Recurring events
+
+    def occurrences(self, first: int, last: int) -> Iterator["Event"]:
+        """The occurrences that overlap days first to last (inclusive),
+        in date order, made one at a time as they are asked for. A
+        one-off event is its own only occurrence; those of a series are
+        one-off events with the id <series id>@<date>, exceptions applied."""
+        rule = self.repeat
+        if rule is None:
+            if self.overlaps(first, last):
+                yield self
+            return
+        if self.ordinal == 0:
+            return  # a series with an invalid start date never happens
+        exceptions = rule.exceptions
+        # Occurrences moved into the window from anywhere in the series
+        moved = []
+        for date, fields in exceptions.items():
+            if fields and fields.get("date", date) != date:
+                occurrence = self.occurrence(date)
+                if occurrence is not None and occurrence.overlaps(first, last):
+                    moved.append(occurrence)
+        regular = self._regular_occurrences(first, last)
+        if not moved:
+            yield from regular
+            return
+        moved.sort(key=_ordinal)
+        yield from heapq.merge(regular, moved, key=_ordinal)
+
+    def _regular_occurrences(self, first: int, last: int) -> Iterator["Event"]:
+        exceptions = self.repeat.exceptions
+        # A multi-day occurrence that starts before first can still overlap
+        span = self.end_ordinal - self.ordinal
+        for day in self.repeat.days(self.ordinal, first - span, last):
+            date = ordinal_date(day)
+            if date not in exceptions:
+                yield self._occurrence(date, day, None)
+                continue
+            fields = exceptions[date]
+            if fields is not None and fields.get("date", date) == date:
+                occurrence = self._occurrence(date, day, fields)
+                if occurrence.overlaps(first, last):
+                    yield occurrence
+
+    def occurrence(self, date: str) -> Optional["Event"]:
+        """The occurrence the series has on date (its date by the rule,
+        before any move), or None if there is none or it was cancelled."""
+        day = date_ordinal(date)
+        if self.repeat is None or day == 0:
+            return None
+        if next(self.repeat.days(self.ordinal, day, day), None) is None:
+            return None
+        exceptions = self.repeat.exceptions
+        if date in exceptions and exceptions[date] is None:
+            return None
+        return self._occurrence(date, day, exceptions.get(date))
+
+    def _occurrence(self, date: str, day: int, fields: Optional[Dict[str, str]]) -> "Event":
+        ev_id = self.id + OCCURRENCE_MARK + date
+        span = self.end_ordinal - self.ordinal
+        if not fields:
+            end = ordinal_date(day + span) if span else None
+            return Event(date, self.title, self.location, self.note, day, ev_id, end_date=end)
+        new_date = fields.get("date", date)
+        new_day = day if new_date == date else date_ordinal(new_date)
+        end = fields.get("end_date", ordinal_date(new_day + span) if span and new_day else None)
+        return Event(new_date, fields.get("title", self.title),
+                     fields.get("location", self.location), fields.get("note", self.note),
+                     new_day, ev_id, end_date=end)
+
+    @classmethod
+    def from_columns(cls, dates, titles, locations, notes, ordinals, ids,
+                     repeats, end_dates) -> List["Event"]:
+        """Events from parallel columns of already validated values.
+
+        Skips __init__: ordinals are taken as given and strings are not
+        re-interned, so only use it for data this program saved itself
+        (e.g. an unmarshalled cache, which keeps strings interned).
+        """
+        new = object.__new__
+        events = []
+        append = events.append
+        # Nothing built here can be garbage yet, so skip the collections
+        # that a million new objects would otherwise set off
+        paused = gc.isenabled()
+        gc.disable()
+        try:
+            for date, title, location, note, ordinal, id, repeat, end_date in zip(
+                    dates, titles, locations, notes, ordinals, ids, repeats, end_dates):
+                ev = new(cls)
+                ev.id = id
+                ev._date = date
+                ev.ordinal = ordinal
+                ev.title = title
+                ev.location = location
+                ev.note = note
+                ev.repeat = None if repeat is None else Recurrence.from_dict(repeat)
+                ev._end_date = end_date
+                append(ev)
+        finally:
+            if paused:
+                gc.enable()
+        return events
 
     @staticmethod
     def from_dict(data: dict) -> "Event":
-        """Create an Event object from a dict (loaded from JSON)."""
+        """Create an Event object from a dict (loaded from JSON).
+        Raises ValueError for an invalid "repeat" rule."""
         return Event(
             date=data.get("date", ""),
             title=data.get("title", ""),
             location=data.get("location", ""),
             note=data.get("note", ""),
+            ordinal=data.get("ordinal"),
+            id=data.get("id"),
+            repeat=Recurrence.from_dict(data["repeat"]) if data.get("repeat") else None,
+            end_date=data.get("end_date"),
         )
+
+
+def _ordinal(ev: Event) -> int:
+    return ev.ordinal
+
+
+def with_occurrences(one_offs: Iterable[Event], series: Iterable[Event],
+                     first: int, last: int) -> Iterator[Event]:
+    """one_offs (date-sorted, all overlapping days first to last)
+    merged lazily with the occurrences of each series in that window."""
+    runs = [ev.occurrences(first, last) for ev in series]
+    if not runs:
+        return iter(one_offs)
+    return heapq.merge(one_offs, *runs, key=_ordinal)
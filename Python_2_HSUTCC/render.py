@@ -0,0 +1,93 @@
+# render.py
+# Text tables for the menu views, built a page at a time in one buffer
+import sys
+from collections import Counter
+from itertools import islice
+from typing import Callable, IO, Iterable, Iterator, List, Optional
+
+from model import Event
+
+PAGE_SIZE = 50   # rows per page (and per write)
+
+HEADER = ("\nIdx | Date       | Title                   | Location           | Note\n"
+          + "-" * 60 + "\n")
+NO_EVENTS = "\nNo events.\n\n"
+
+
+# One table row; %-N.Ns pads and cuts to N characters in one step
+ROW = "%3d | %s | %-23.23s | %-18.18s | %-40.40s\n"
+
+
+def format_row(index: int, ev: Event) -> str:
+    return ROW % (index, ev.date or "", ev.title or "", ev.location or "", ev.note or "")
+
+
+def _row_pages(events: Iterable[Event], page_size: int, offset: int,
+               go_on: Optional[Callable[[int], bool]] = None) -> Iterator[List[str]]:
+    # Before page n (n > 0) is taken, go_on(n) says whether to; only the
+    # one row that shows there is such a page has been read by then
+    if page_size < 1:
+        raise ValueError("page_size must be at least 1")
+    rows = islice(events, offset, None)
+    index = offset
+    for n, first in enumerate(rows):
+        if n and go_on is not None and not go_on(n):
+            return
+        page = [format_row(index, first)]
+        page += [format_row(i, ev) for i, ev in zip(range(index + 1, index + page_size), rows)]
+        index += len(page)
+        yield page
+
+
+def pages(events: Iterable[Event], page_size: int = PAGE_SIZE,
+          offset: int = 0) -> Iterator[str]:
+    """The table of events as text, one page_size-row page at a time,
+    starting at row offset (rows keep their index in the whole view).
+    Rows are only formatted when their page is asked for, and rows
+    before offset are skipped without formatting."""
+    for n, page in enumerate(_row_pages(events, page_size, offset)):
+        yield (HEADER if n == 0 else "") + "".join(page)
+
+
+def recorded(events: Iterable[Event], into: List[Event]) -> Iterator[Event]:
+    """events, each appended to into once the next one is asked for (or
+    the events run out), so a menu view can return the rows it printed
+    without building the list first: the row write_events only peeked
+    at before the user stopped it is left out."""
+    for ev in events:
+        yield ev
+        into.append(ev)
+
+
+def summarize(events: Iterable[Event]) -> str:
+    """Event counts, in total and per month, instead of the rows."""
+    months = Counter(ev.date[:7] for ev in events)
+    total = sum(months.values())
+    if total == 0:
+        return NO_EVENTS
+    lines = [f"\n{total} event{'s' if total != 1 else ''}\n"]
+    lines += [f"  {month}: {months[month]:>7}\n" for month in sorted(months)]
+    return "".join(lines) + "\n"
+
+
+def write_events(events: Iterable[Event], out: Optional[IO[str]] = None,
+                 page_size: int = PAGE_SIZE, offset: int = 0,
+                 max_pages: Optional[int] = None,
+                 more: Optional[Callable[[], bool]] = None) -> int:
+    """Write the table of events to out (stdout), one write per page.
+
+    Stops after max_pages pages, or when more() (asked before every
+    page but the first) returns False. Returns the number of rows written.
+    """
+    if out is None:
+        out = sys.stdout
+    def go_on(n: int) -> bool:
+        return n != max_pages and (more is None or more())
+
+    written = 0
+    for n, page in enumerate(_row_pages(events, page_size, offset, go_on)):
+        out.write((HEADER if n == 0 else "") + "".join(page))
+        written += len(page)
+    if written == 0:
+        out.write(NO_EVENTS)
+    return written
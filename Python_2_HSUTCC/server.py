@@ -0,0 +1,148 @@
+# server.py
+# Asyncio TCP server sharing one calendar between many clients.
+# Protocol: one JSON command per line in (see commands.py), one JSON result per line out.
+import asyncio
+import json
+import sys
+from typing import Optional, Tuple
+
+from tracker import CalendarEventTracker
+from commands import COMMANDS, run_command
+
+HOST = "127.0.0.1"
+PORT = 8765
+WRITE_OPS = frozenset({"add", "delete", "update", "delete_where", "update_where"})
+# Not export: clients must not write files wherever the server may
+SERVER_COMMANDS = {op: handler for op, handler in COMMANDS.items() if op != "export"}
+MAX_GROUP = 1000          # writes applied (and saved) together at most
+LINE_LIMIT = 1 << 20      # longest command line accepted, in bytes
+
+
+class Event_Server:
+    """Serves one CalendarEventTracker over TCP.
+
+    Reads run straight away on the event loop against the tracker's
+    in-memory indexes; nothing changes them in between, so every read
+    sees a consistent calendar. Writes are queued to a single writer
+    task, which applies whatever has queued up as one group, saves the
+    group in a worker thread (reads carry on meanwhile) and only then
+    answers those clients.
+    """
+
+    def __init__(self, tracker: CalendarEventTracker, host: str = HOST, port: int = PORT):
+        self.tracker = tracker
+        self.host = host
+        self.port = port
+        self._queue: Optional[asyncio.Queue] = None
+        self._server = None
+        self._writer_task = None
+        self._hold = None
+        self._dumps = json.JSONEncoder(ensure_ascii=False).encode
+
+    async def start(self) -> None:
+        """Start listening (port=0 picks a free port, stored in self.port)."""
+        self._queue = asyncio.Queue()
+        # Keep autosave deferred for the server's lifetime; the writer
+        # task saves each group itself
+        self._hold = self.tracker.batch()
+        self._hold.__enter__()
+        self._writer_task = asyncio.create_task(self._write_loop())
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port, limit=LINE_LIMIT
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stop accepting clients, finish queued writes and save."""
+        self._server.close()
+        await self._server.wait_closed()
+        await self._queue.join()
+        self._writer_task.cancel()
+        self._hold.__exit__(None, None, None)
+
+    async def execute(self, line: bytes) -> dict:
+        """Run one command line and return its result."""
+        try:
+            cmd = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+            return {"ok": False, "error": f"bad JSON ({getattr(exc, 'msg', exc)})"}
+        if isinstance(cmd, dict) and cmd.get("op") in WRITE_OPS:
+            done = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait((cmd, done))
+            return await done
+        return self._apply(cmd)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                result = await self.execute(line)
+                writer.write(self._dumps(result).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):  # ValueError: line over LINE_LIMIT
+            pass
+        finally:
+            writer.close()
+
+    async def _write_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            group = [await self._queue.get()]
+            while len(group) < MAX_GROUP and not self._queue.empty():
+                group.append(self._queue.get_nowait())
+            results = [self._apply(cmd) for cmd, _ in group]
+            try:
+                await loop.run_in_executor(None, self.tracker.flush)
+            except Exception as exc:
+                results = [
+                    {**result, "ok": False, "error": f"not saved ({exc})"} if result["ok"] else result
+                    for result in results
+                ]
+            for (_, done), result in zip(group, results):
+                if not done.done():
+                    done.set_result(result)
+                self._queue.task_done()
+
+    def _apply(self, cmd: dict) -> dict:
+        # One broken command must not take the writer task (and every
+        # client waiting on it), or the client's connection, down with it
+        try:
+            return run_command(self.tracker, cmd, SERVER_COMMANDS)
+        except Exception as exc:
+            return {"ok": False, "error": f"internal error ({exc})"}
+
+
+async def serve(tracker: CalendarEventTracker, host: str = HOST, port: int = PORT) -> None:
+    server = Event_Server(tracker, host, port)
+    await server.start()
+    print(f"Serving calendar on {server.host}:{server.port}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def parse_address(args) -> Tuple[str, int]:
+    """(host, port) from an optional "HOST:PORT" first argument."""
+    host, _, port = (args[0] if args else f"{HOST}:{PORT}").rpartition(":")
+    return host or HOST, int(port)
+
+
+if __name__ == "__main__":
+    # python server.py [events.json] [HOST:PORT]
+    from storage import JSON_File_Storage
+
+    target = sys.argv[1] if len(sys.argv) > 1 else "events.json"
+    host, port = parse_address(sys.argv[2:])
+    app = CalendarEventTracker(JSON_File_Storage(target))
+    try:
+        asyncio.run(serve(app, host, port))
+    except KeyboardInterrupt:
+        pass
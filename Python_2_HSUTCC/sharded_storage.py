@@ -0,0 +1,259 @@
+# sharded_storage.py
+# Storage backend that keeps one JSON file per month plus a small manifest
+#
+# Layout of the directory:
+#   manifest.json  {"version": 1, "shards": {"2025-03": {"count": 12,
+#                   "end": "2025-04-02", "series": 0}, ...}}
+#   2025-03.json   the events that start in March 2025, as a JSON array in
+#                  the same shape as events.json, sorted by date
+#   undated.json   events whose date is invalid (never in a date query)
+# "end" is the last day any one-off event of the shard takes place on,
+# and "series" the number of recurring events starting in that month, so
+# a date query can tell from the manifest alone which shards it needs.
+import contextlib
+import json
+import os
+import sys
+import threading
+from itertools import chain
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from model import LAST_DATE, Event, date_ordinal, ordinal_date, with_occurrences
+from storage import Event_Storage, JSON_File_Storage, Queryable_Storage
+from decorators import add_count
+
+VERSION = 1
+MANIFEST = "manifest.json"
+UNDATED = "undated"
+
+
+def shard_key(ev: Event) -> str:
+    """Name of the shard ev belongs in: the year-month it starts in."""
+    return ev.date[:7] if ev.ordinal else UNDATED
+
+
+def _entry(events: List[Event]) -> dict:
+    """The manifest entry of a shard holding events."""
+    last = max((ev.end_ordinal for ev in events if ev.repeat is None and ev.ordinal),
+               default=0)
+    return {
+        "count": len(events),
+        "end": ordinal_date(last) if last else None,
+        "series": sum(ev.repeat is not None for ev in events),
+    }
+
+
+class Sharded_Storage(Event_Storage, Queryable_Storage):
+    """Storage implementation with one file per year-month.
+
+    Nothing is read when the storage is opened. query() reads the
+    manifest, then only the shards that can hold events in the window:
+    the months it covers, earlier months with a multi-day event that
+    lasts into it, and those with a series started by its end. Shards
+    stay in memory once read. load() reads them all.
+
+    save() rewrites only the shards whose events changed (a shard counts
+    as changed when it no longer holds the same Event objects, which is
+    how the tracker edits: it replaces an event, never changes it), and
+    append() only the shards the new events go in. The manifest is
+    rewritten last. Saves are not merged with other processes'.
+    """
+
+    def __init__(self, dirname: str = "events"):
+        self.dirname = dirname
+        self._manifest: Optional[Dict[str, dict]] = None   # shard key -> entry
+        self._shards: Dict[str, List[Event]] = {}          # the shards read so far
+        self._lock = threading.RLock()
+
+    # Files
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.dirname, key + ".json")
+
+    def _entries(self) -> Dict[str, dict]:
+        """The manifest's shards (read on first use, empty if none)."""
+        if self._manifest is not None:
+            return self._manifest
+        name = os.path.join(self.dirname, MANIFEST)
+        try:
+            with open(name, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {"version": VERSION, "shards": {}}
+        except json.JSONDecodeError:
+            print("Warning: shard manifest is corrupted. Starting with empty list.")
+            data = {"version": VERSION, "shards": {}}
+        if data.get("version") != VERSION:
+            print(f"Warning: shard manifest is version {data.get('version')}, expected "
+                  f"{VERSION}. Starting with empty list.")
+            data = {"version": VERSION, "shards": {}}
+        self._manifest = data["shards"]
+        return self._manifest
+
+    def _shard(self, key: str) -> List[Event]:
+        """The events of one shard, date-sorted, read from disk once."""
+        events = self._shards.get(key)
+        if events is not None:
+            return events
+        events = []
+        if key in self._entries():
+            name = self._path(key)
+            try:
+                with open(name, "r", encoding="utf-8") as f:
+                    items = json.load(f)
+            except FileNotFoundError:
+                print(f"Warning: shard '{name}' is missing. Its events are lost.")
+            except json.JSONDecodeError:
+                print(f"Warning: shard '{name}' is corrupted. Starting it empty.")
+            else:
+                for pos, item in enumerate(items):
+                    try:
+                        events.append(Event.from_dict(item))
+                    except ValueError as exc:   # only this record is dropped
+                        print(f"Warning: skipping bad event (shard '{name}', "
+                              f"record {pos}): {exc}.")
+                add_count(self, "bytes_read", os.path.getsize(name))
+                add_count(self, "shards_read", 1)
+        self._shards[key] = events
+        return events
+
+    def _write_shards(self, shards: Dict[str, List[Event]]) -> None:
+        """Write these shards (date-sorted already; an empty one is
+        deleted), then the manifest."""
+        os.makedirs(self.dirname, exist_ok=True)
+        entries = self._entries()
+        gone = []
+        for key, events in shards.items():
+            self._shards[key] = events
+            if not events:
+                entries.pop(key, None)
+                gone.append(key)
+                continue
+            raw = json.dumps([ev.to_dict() for ev in events], indent=4).encode("utf-8")
+            self._replace(self._path(key), raw)
+            add_count(self, "shards_written", 1)
+            entries[key] = _entry(events)
+        manifest = {"version": VERSION, "shards": dict(sorted(entries.items()))}
+        self._replace(os.path.join(self.dirname, MANIFEST),
+                      json.dumps(manifest, indent=4).encode("utf-8"))
+        # Only once the manifest no longer lists them
+        for key in gone:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._path(key))
+
+    def _replace(self, name: str, raw: bytes) -> None:
+        tmp_name = name + ".tmp"
+        with open(tmp_name, "wb") as f:
+            f.write(raw)
+        os.replace(tmp_name, name)
+        add_count(self, "bytes_written", len(raw))
+
+    def _needed(self, start_date: Optional[str], end_date: Optional[str]) -> List[str]:
+        """The shards (in date order) that can hold events overlapping
+        start_date..end_date (None: no limit), by the manifest alone."""
+        first = start_date or "0001-01-01"
+        last = end_date or LAST_DATE
+        keys = []
+        for key, entry in sorted(self._entries().items()):
+            if key == UNDATED or key > last[:7]:
+                continue
+            if key >= first[:7] or entry["series"] or (entry["end"] or "") >= first:
+                keys.append(key)
+        return keys
+
+    # Event_Storage
+
+    def load(self) -> List[Event]:
+        """Read every shard; events come back date-sorted."""
+        with self._lock:
+            self._manifest = None
+            self._shards = {}
+            keys = sorted(self._entries(), key=lambda key: (key != UNDATED, key))
+            events = list(chain.from_iterable(self._shard(key) for key in keys))
+        add_count(self, "events_scanned", len(events))
+        return events
+
+    def iter_events(self) -> Iterator[Event]:
+        """Read one shard at a time, in date order (undated first)."""
+        keys = sorted(self._entries(), key=lambda key: (key != UNDATED, key))
+        for key in keys:
+            with self._lock:
+                events = self._shard(key)
+            yield from events
+
+    def save(self, events: Iterable[Event]) -> None:
+        """Rewrite the shards whose events changed, and delete the ones
+        left empty."""
+        groups: Dict[str, List[Event]] = {}
+        for ev in events:
+            groups.setdefault(shard_key(ev), []).append(ev)
+        with self._lock:
+            changed = {}
+            for key in set(groups) | set(self._entries()):
+                new = groups.get(key, [])
+                old = self._shard(key)
+                if len(new) == len(old) and set(map(id, new)) == set(map(id, old)):
+                    continue
+                new.sort(key=attrgetter("ordinal"))
+                changed[key] = new
+            if changed:
+                self._write_shards(changed)
+
+    # Queryable_Storage
+
+    def query(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              keyword: Optional[str] = None) -> List[Event]:
+        """Search the shards the window needs. Events overlapping the
+        window are returned by start date; recurring events come back as
+        their occurrences in it."""
+        with self._lock:
+            if start_date is None and end_date is None:
+                keys = list(self._entries())
+            else:
+                keys = self._needed(start_date, end_date)
+            events = [ev for key in keys for ev in self._shard(key)]
+        add_count(self, "events_scanned", len(events))
+        if keyword is not None:
+            needle = keyword.lower()
+            events = [ev for ev in events
+                      if needle in ev.title.lower() or needle in ev.note.lower()]
+        if start_date is None and end_date is None:
+            return sorted(events, key=attrgetter("ordinal"))
+
+        first = 1 if start_date is None else date_ordinal(start_date)
+        last = date_ordinal(end_date or LAST_DATE)
+        # Shards come in month order, each sorted, so these stay date-sorted
+        one_offs = [ev for ev in events if ev.repeat is None and ev.overlaps(first, last)]
+        series = [ev for ev in events if ev.repeat is not None and ev.ordinal <= last]
+        if not series:
+            return one_offs
+        return list(with_occurrences(one_offs, series, first, last))
+
+    def append(self, events: Iterable[Event]) -> None:
+        """Add events, rewriting only the shards they go in."""
+        with self._lock:
+            changed: Dict[str, List[Event]] = {}
+            for ev in events:
+                key = shard_key(ev)
+                if key not in changed:
+                    changed[key] = list(self._shard(key))
+                changed[key].append(ev)
+            for shard in changed.values():
+                shard.sort(key=attrgetter("ordinal"))
+            if changed:
+                self._write_shards(changed)
+
+
+def convert_json(json_filename: str = "events.json", dirname: str = "events") -> int:
+    """Split an events.json file into monthly shards. Returns the count."""
+    events = JSON_File_Storage(json_filename).load()
+    Sharded_Storage(dirname).save(events)
+    return len(events)
+
+
+if __name__ == "__main__":
+    # python sharded_storage.py [events.json] [events directory]
+    src = sys.argv[1] if len(sys.argv) > 1 else "events.json"
+    dst = sys.argv[2] if len(sys.argv) > 2 else "events"
+    print(f"Split {convert_json(src, dst)} events from '{src}' into shards in '{dst}'.")
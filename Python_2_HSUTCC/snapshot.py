@@ -0,0 +1,311 @@
+# snapshot.py
+# Immutable, date-ordered versions of the calendar for lock-free readers
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from operator import attrgetter, is_not
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from model import Event, date_ordinal, with_occurrences
+from index import Keyword_Index, Span_Index
+
+CHUNK = 512   # events per chunk; a chunk splits in two at 2 * CHUNK
+
+# (ordinals, events) of one chunk, both sorted by ordinal
+Chunk = Tuple[Tuple[int, ...], Tuple[Event, ...]]
+
+
+class Snapshot:
+    """One version of the calendar, ordered by date. Never changes.
+
+    Events are kept in chunks of tuples. with_added/with_removed/
+    with_replaced return a new version that shares every chunk they did
+    not touch, so a change costs O(CHUNK + n / CHUNK) instead of a copy
+    of the calendar; the *_all variants apply many changes in one pass.
+    A reader holding a snapshot can query it from any thread without
+    locks while writers publish newer ones.
+
+    A recurring event is one record, filed under its first date (all()
+    lists it once). series holds those records, date-sorted, so that
+    date queries can add the occurrences that fall in their window.
+
+    A multi-day event is filed under its start date too; spans (a
+    Span_Index of them) finds the ones that began before a window but
+    still overlap it, so date queries return every event on those days.
+
+    keywords is the tracker's shared Keyword_Index (or None until the
+    first search); the snapshot searches it as of the clock it had when
+    this version was made.
+
+    Events with an invalid date (ordinal 0) sort first and are never
+    returned by on_date/in_range.
+    """
+    __slots__ = ("version", "keywords", "clock", "series", "spans", "_chunks", "_lasts",
+                 "_size", "_series_days")
+
+    def __init__(self, chunks: Tuple[Chunk, ...] = (), version: int = 0,
+                 keywords: Optional[Keyword_Index] = None,
+                 lasts: Optional[Tuple[int, ...]] = None, size: Optional[int] = None,
+                 series: Optional[Tuple[Event, ...]] = None,
+                 spans: Optional[Span_Index] = None):
+        self.version = version
+        if series is None or spans is None:
+            special = [ev for _, evs in chunks for ev in evs
+                       if ev.repeat is not None or ev.end_date is not None]
+            if series is None:
+                series = tuple(ev for ev in special if ev.repeat is not None)
+            if spans is None:
+                spans = Span_Index(ev for ev in special if _spans_days(ev))
+        self.series = series
+        self.spans = spans
+        self._series_days = tuple(ev.ordinal for ev in series)
+        self.keywords = keywords
+        self.clock = keywords.clock if keywords is not None else 0
+        self._chunks = chunks
+        # Last ordinal of each chunk, and the event count (derived if not given)
+        self._lasts = tuple(days[-1] for days, _ in chunks) if lasts is None else lasts
+        self._size = sum(len(days) for days, _ in chunks) if size is None else size
+
+    @classmethod
+    def build(cls, events: Iterable[Event], version: int = 0,
+              keywords: Optional[Keyword_Index] = None) -> "Snapshot":
+        """Sort events (stable) into a fresh snapshot."""
+        ordered = sorted(events, key=attrgetter("ordinal"))
+        chunks = tuple(
+            (tuple(ev.ordinal for ev in part), tuple(part))
+            for part in (ordered[i:i + CHUNK] for i in range(0, len(ordered), CHUNK))
+        )
+        return cls(chunks, version, keywords)
+
+    def __len__(self) -> int:
+        return self._size
+
+    # Queries
+
+    def all(self) -> List[Event]:
+        """Every event, sorted by date."""
+        return list(self.iter_all())
+
+    def iter_all(self) -> Iterator[Event]:
+        """all(), one event at a time (a series once, as itself)."""
+        return chain.from_iterable(events for _, events in self._chunks)
+
+    def on_date(self, date: str) -> List[Event]:
+        day = date_ordinal(date)
+        return self.in_days(day, day)
+
+    def in_range(self, start_date: str, end_date: str) -> List[Event]:
+        """Events on any day from start_date to end_date (both inclusive)."""
+        return self.in_days(date_ordinal(start_date), date_ordinal(end_date))
+
+    def in_days(self, first: int, last: int) -> List[Event]:
+        """Events that overlap days first to last (both inclusive), by
+        start date: multi-day events that began earlier come first, and
+        occurrences of recurring events are included."""
+        return list(self.iter_days(first, last))
+
+    def iter_days(self, first: int, last: int) -> Iterator[Event]:
+        """in_days(), one event at a time. Occurrences are only made
+        for this window, as the iteration reaches them."""
+        records = chain.from_iterable(self._day_slices(first, last))
+        if first <= 0 or last <= 0:
+            return records
+        if self.spans:
+            records = chain(self.spans.under_way(first), records)
+        if not self.series:
+            return records
+        one_offs = (ev for ev in records if ev.repeat is None)
+        started = self.series[:bisect_right(self._series_days, last)]
+        return with_occurrences(one_offs, started, first, last)
+
+    def records_in_days(self, first: int, last: int) -> List[Event]:
+        """The stored events dated first..last: a series counts only
+        on its first date, as one event."""
+        return list(chain.from_iterable(self._day_slices(first, last)))
+
+    def _day_slices(self, first: int, last: int) -> Iterator[Tuple[Event, ...]]:
+        if first <= 0 or last <= 0:
+            return
+        for i in range(bisect_left(self._lasts, first), len(self._chunks)):
+            days, events = self._chunks[i]
+            lo = bisect_left(days, first)
+            hi = bisect_right(days, last, lo)
+            yield events[lo:hi]
+            if hi < len(days):
+                return
+
+    def search(self, keyword: str, mode: str = "prefix") -> List[Event]:
+        """Keyword_Index.search as of this version (needs keywords)."""
+        return self.keywords.search(keyword, mode, at=self.clock)
+
+    def search_page(self, keyword: str, mode: str = "prefix",
+                    limit: Optional[int] = None) -> Tuple[int, List[Event]]:
+        """Keyword_Index.search_page as of this version (needs keywords)."""
+        return self.keywords.search_page(keyword, mode, self.clock, limit)
+
+    # New versions
+
+    def with_keywords(self, keywords: Optional[Keyword_Index]) -> "Snapshot":
+        return Snapshot(self._chunks, self.version + 1, keywords, self._lasts, self._size,
+                        self.series, self.spans)
+
+    def with_added(self, events: Iterable[Event]) -> "Snapshot":
+        """Insert each event after any others on the same date."""
+        chunks = list(self._chunks)
+        lasts = list(self._lasts)
+        size = self._size
+        events = list(events)
+        for ev in events:
+            size += 1
+            day = ev.ordinal
+            if not chunks:
+                chunks.append(((day,), (ev,)))
+                lasts.append(day)
+                continue
+            i = min(bisect_right(lasts, day), len(chunks) - 1)
+            days, evs = chunks[i]
+            pos = bisect_right(days, day)
+            days = days[:pos] + (day,) + days[pos:]
+            evs = evs[:pos] + (ev,) + evs[pos:]
+            if len(days) >= 2 * CHUNK:
+                chunks[i:i + 1] = [(days[:CHUNK], evs[:CHUNK]), (days[CHUNK:], evs[CHUNK:])]
+                lasts[i:i + 1] = [days[CHUNK - 1], days[-1]]
+            else:
+                chunks[i] = (days, evs)
+                lasts[i] = days[-1]
+        return self._derived(chunks, lasts, size, added=events)
+
+    def with_removed(self, ev: Event) -> "Snapshot":
+        """Drop this exact event object (returns self if it isn't here)."""
+        found = self._find(ev)
+        if found is None:
+            return self
+        i, pos = found
+        chunks = list(self._chunks)
+        lasts = list(self._lasts)
+        days, evs = chunks[i]
+        if len(days) == 1:
+            del chunks[i]
+            del lasts[i]
+        else:
+            days = days[:pos] + days[pos + 1:]
+            chunks[i] = (days, evs[:pos] + evs[pos + 1:])
+            lasts[i] = days[-1]
+        return self._derived(chunks, lasts, self._size - 1, removed=[ev])
+
+    def with_replaced(self, old: Event, new: Event) -> "Snapshot":
+        """Swap old for new; new keeps old's place if the date is the same."""
+        found = self._find(old)
+        if found is None or old.ordinal != new.ordinal:
+            return self.with_removed(old).with_added([new])
+        i, pos = found
+        chunks = list(self._chunks)
+        days, evs = chunks[i]
+        chunks[i] = (days, evs[:pos] + (new,) + evs[pos + 1:])
+        return self._derived(chunks, self._lasts, self._size, [old], [new])
+
+    def with_removed_all(self, events: Iterable[Event]) -> "Snapshot":
+        """Drop all these exact event objects at once (any not here are
+        skipped). Each chunk that loses events is rebuilt once."""
+        events = list(events)
+        return self._with_changes(dict.fromkeys(map(id, events)), events)
+
+    def with_replaced_all(self, pairs: Iterable[Tuple[Event, Event]]) -> "Snapshot":
+        """with_replaced for many (old, new) pairs, rebuilding each
+        touched chunk once. News with a different date move."""
+        pairs = list(pairs)
+        changes: Dict[int, Optional[Event]] = {}
+        stayed = []
+        moved = []
+        for old, new in pairs:
+            if old.ordinal == new.ordinal:
+                changes[id(old)] = new
+                stayed.append(new)
+            else:
+                changes[id(old)] = None
+                moved.append(new)
+        snap = self._with_changes(changes, [old for old, _ in pairs], stayed)
+        return snap.with_added(moved) if moved else snap
+
+    def _with_changes(self, changes: Dict[int, Optional[Event]], olds: List[Event],
+                      news: List[Event] = ()) -> "Snapshot":
+        # changes: id(old) -> new, or None to drop old. The olds are alive,
+        # so no other event here can share their id(). Only the chunks
+        # that can hold the changed days are looked through, once each.
+        lasts = self._lasts
+        touched = set()
+        for day in {ev.ordinal for ev in olds}:
+            for i in range(bisect_left(lasts, day), len(lasts)):
+                touched.add(i)
+                if lasts[i] > day:
+                    break
+        chunks: List[Chunk] = []
+        new_lasts: List[int] = []
+        size = self._size
+        changed = False
+        get = changes.get
+        for i, chunk in enumerate(self._chunks):
+            if i in touched:
+                days, evs = chunk
+                new_evs = [get(id(ev), ev) for ev in evs]
+                if any(map(is_not, new_evs, evs)):
+                    changed = True
+                    if None in new_evs:
+                        kept = [pos for pos, ev in enumerate(new_evs) if ev is not None]
+                        size -= len(days) - len(kept)
+                        if not kept:
+                            continue
+                        days = tuple([days[pos] for pos in kept])
+                        new_evs = [new_evs[pos] for pos in kept]
+                    chunk = (days, tuple(new_evs))
+            chunks.append(chunk)
+            new_lasts.append(chunk[0][-1])
+        if not changed:
+            return self
+        return self._derived(chunks, new_lasts, size, olds, news)
+
+    def _find(self, ev: Event) -> Optional[Tuple[int, int]]:
+        day = ev.ordinal
+        for i in range(bisect_left(self._lasts, day), len(self._chunks)):
+            days, evs = self._chunks[i]
+            lo = bisect_left(days, day)
+            hi = bisect_right(days, day, lo)
+            for pos in range(lo, hi):
+                if evs[pos] is ev:
+                    return i, pos
+            if hi < len(days):
+                return None
+        return None
+
+    def _series_with(self, removed: Iterable[Event],
+                     added: Iterable[Event]) -> Tuple[Event, ...]:
+        """series once these events are removed and added (just series
+        itself when none of them recur)."""
+        gone = [ev for ev in removed if ev.repeat is not None]
+        new = [ev for ev in added if ev.repeat is not None]
+        if not gone and not new:
+            return self.series
+        drop = set(map(id, gone))
+        kept = [ev for ev in self.series if id(ev) not in drop]
+        return tuple(sorted(kept + new, key=attrgetter("ordinal")))
+
+    def _spans_with(self, removed: Iterable[Event], added: Iterable[Event]) -> Span_Index:
+        """spans once these events are removed and added (the same
+        index when none of them last more than a day)."""
+        gone = [ev for ev in removed if _spans_days(ev)]
+        new = [ev for ev in added if _spans_days(ev)]
+        if not gone and not new:
+            return self.spans
+        return self.spans.with_changes(gone, new)
+
+    def _derived(self, chunks: List[Chunk], lasts: List[int], size: int,
+                 removed: Iterable[Event] = (), added: Iterable[Event] = ()) -> "Snapshot":
+        # The keyword clock is read now, after the writer updated keywords
+        removed, added = list(removed), list(added)
+        return Snapshot(tuple(chunks), self.version + 1, self.keywords, tuple(lasts), size,
+                        self._series_with(removed, added), self._spans_with(removed, added))
+
+
+def _spans_days(ev: Event) -> bool:
+    """Is ev a one-off event that lasts more than a day? (A series'
+    occurrences are found through series instead.)"""
+    return ev.repeat is None and ev.end_date is not None and ev.end_ordinal > ev.ordinal
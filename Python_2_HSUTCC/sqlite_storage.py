@@ -0,0 +1,222 @@
+# sqlite_storage.py
+# Storage backend on top of the stdlib sqlite3 module
+import json
+import sqlite3
+import threading
+from typing import Iterable, Iterator, List, Optional
+
+from model import LAST_DATE, Event, Recurrence, date_ordinal, new_event_id, with_occurrences
+from storage import Event_Storage, Queryable_Storage, Saved_Events
+from decorators import add_count
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id       INTEGER PRIMARY KEY,
+    date     TEXT NOT NULL,
+    title    TEXT NOT NULL,
+    location TEXT NOT NULL DEFAULT '',
+    note     TEXT NOT NULL DEFAULT '',
+    ordinal  INTEGER NOT NULL DEFAULT 0,
+    uid      TEXT NOT NULL DEFAULT '',
+    repeat   TEXT,
+    end_date TEXT,
+    end_ordinal INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_events_title ON events (title COLLATE NOCASE);
+"""
+# Created after _migrate(), which may have to add the columns first
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_events_ordinal ON events (ordinal);
+CREATE INDEX IF NOT EXISTS idx_events_uid ON events (uid);
+CREATE INDEX IF NOT EXISTS idx_events_series ON events (ordinal) WHERE repeat IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_events_span ON events (end_ordinal) WHERE end_ordinal > ordinal;
+"""
+
+# uid is Event.id (id is the table's own row key); repeat is the
+# Recurrence as JSON, NULL for one-off events; end_ordinal is
+# Event.end_ordinal, the same as ordinal unless the event lasts days
+COLUMNS = "date, title, location, note, ordinal, uid, repeat, end_date, end_ordinal"
+
+
+class SQLite_Storage(Event_Storage, Queryable_Storage):
+    """Storage implementation that keeps events in an SQLite database.
+
+    save() writes only the rows that changed since the last load/save, and
+    query() lets the tracker filter by date and keyword in SQL instead of
+    loading every event. Each row stores its day ordinal, so date filters
+    compare integers and loaded events need no date parsing. Event ids
+    are kept in the uid column.
+
+    The connection is shared by every thread (a write-behind or server
+    flush saves from a background thread), so each use of it holds
+    _lock.
+
+    A recurring event is one row. Date-filtered queries also fetch the
+    series that started by the end of the window (idx_events_series)
+    and return their occurrences in it, and the multi-day events that
+    began before the window but end in or after it (idx_events_span,
+    which only holds the rows that last more than a day).
+    """
+
+    def __init__(self, filename: str = "events.db"):
+        self.filename = filename
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.executescript(INDEXES)
+        self._saved = Saved_Events()
+
+    def _migrate(self) -> None:
+        """Add the ordinal, uid, repeat and end columns to databases created
+        before they existed, filling them in for the rows already there."""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(events)")]
+        with self._conn:
+            if "ordinal" not in columns:
+                self._conn.create_function("date_ordinal", 1, date_ordinal, deterministic=True)
+                self._conn.execute(
+                    "ALTER TABLE events ADD COLUMN ordinal INTEGER NOT NULL DEFAULT 0"
+                )
+                self._conn.execute("UPDATE events SET ordinal = date_ordinal(date)")
+            if "uid" not in columns:
+                self._conn.create_function("new_event_id", 0, new_event_id)
+                self._conn.execute("ALTER TABLE events ADD COLUMN uid TEXT NOT NULL DEFAULT ''")
+                self._conn.execute("UPDATE events SET uid = new_event_id()")
+            if "repeat" not in columns:
+                self._conn.execute("ALTER TABLE events ADD COLUMN repeat TEXT")
+            if "end_date" not in columns:
+                self._conn.execute("ALTER TABLE events ADD COLUMN end_date TEXT")
+                self._conn.execute(
+                    "ALTER TABLE events ADD COLUMN end_ordinal INTEGER NOT NULL DEFAULT 0"
+                )
+                self._conn.execute("UPDATE events SET end_ordinal = ordinal")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row_to_event(row) -> Optional[Event]:
+        """The event of a row, or None (with a warning) if its repeat
+        rule is broken."""
+        try:
+            repeat = None if row[6] is None else Recurrence.from_dict(json.loads(row[6]))
+        except ValueError as exc:
+            print(f"Warning: skipping bad event {row[5]!r}: {exc}.")
+            return None
+        return Event(row[0], row[1], row[2], row[3], ordinal=row[4], id=row[5], repeat=repeat,
+                     end_date=row[7])
+
+    @staticmethod
+    def _values(ev: Event) -> tuple:
+        """ev as the values of COLUMNS."""
+        repeat = None if ev.repeat is None else json.dumps(ev.repeat.to_dict())
+        return (ev.date, ev.title, ev.location, ev.note, ev.ordinal, ev.id, repeat, ev.end_date,
+                ev.end_ordinal)
+
+    def load(self) -> List[Event]:
+        """Read every row (in insertion order) as Event objects."""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id, {COLUMNS} FROM events ORDER BY id").fetchall()
+            self._saved = Saved_Events()
+            events: List[Event] = []
+            for row in rows:
+                ev = self._row_to_event(row[1:])
+                if ev is None:
+                    continue   # not remembered, so saves leave its row alone
+                self._saved.remember(row[0], ev)
+                events.append(ev)
+        add_count(self, "events_scanned", len(events))
+        return events
+
+    def iter_events(self) -> Iterator[Event]:
+        """Stream rows from a cursor instead of building a list."""
+        with self._lock:
+            cur = self._conn.execute(f"SELECT {COLUMNS} FROM events ORDER BY id")
+        while True:
+            with self._lock:
+                rows = cur.fetchmany(1000)
+            if not rows:
+                return
+            for row in rows:
+                ev = self._row_to_event(row)
+                if ev is not None:
+                    yield ev
+
+    def save(self, events: Iterable[Event]) -> None:
+        """Insert, update and delete only the rows that changed."""
+        with self._lock:
+            self._save(events)
+
+    def _save(self, events: Iterable[Event]) -> None:
+        added, changed, removed = self._saved.diff(events)
+        if not (added or changed or removed):
+            return
+        with self._conn:  # one transaction
+            self._insert(added)
+            self._conn.executemany(
+                "UPDATE events SET date = ?, title = ?, location = ?, note = ?, ordinal = ?,"
+                " uid = ?, repeat = ?, end_date = ?, end_ordinal = ? WHERE id = ?",
+                [self._values(ev) + (row_id,) for row_id, ev in changed],
+            )
+            for row_id, ev in changed:
+                self._saved.remember(row_id, ev)
+            self._conn.executemany(
+                "DELETE FROM events WHERE id = ?", [(row_id,) for row_id in removed]
+            )
+            for row_id in removed:
+                self._saved.forget(row_id)
+
+    def append(self, events: Iterable[Event]) -> None:
+        with self._lock, self._conn:
+            self._insert(events)
+
+    def _insert(self, events: Iterable[Event]) -> None:
+        for ev in events:
+            cur = self._conn.execute(
+                f"INSERT INTO events ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._values(ev),
+            )
+            self._saved.remember(cur.lastrowid, ev)
+
+    def query(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              keyword: Optional[str] = None) -> List[Event]:
+        """Filter in SQL; the date conditions use idx_events_ordinal.
+        With a date filter, every event that overlaps the window is
+        returned (by start date) and recurring events come back as
+        their occurrences in it."""
+        where, params = [], []
+        if keyword is not None:
+            # Same rule as the in-memory search: substring of title or note
+            escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            pattern = "%" + escaped + "%"
+            where.append("(title LIKE ? ESCAPE '\\' OR note LIKE ? ESCAPE '\\')")
+            params += [pattern, pattern]
+        if start_date is None and end_date is None:
+            return self._select(where, params)
+
+        first = 1 if start_date is None else date_ordinal(start_date)
+        last = date_ordinal(end_date or LAST_DATE)
+        one_offs = self._select(where + ["repeat IS NULL", "ordinal >= ?", "ordinal <= ?"],
+                                params + [first, last])
+        if start_date is not None:
+            # The condition end_ordinal > ordinal lets SQLite use idx_events_span
+            under_way = self._select(where + ["repeat IS NULL", "end_ordinal > ordinal",
+                                              "end_ordinal >= ?", "ordinal < ?"],
+                                     params + [first, first])
+            one_offs = under_way + one_offs
+        series = self._select(where + ["repeat IS NOT NULL", "ordinal <= ?"], params + [last])
+        if not series:
+            return one_offs
+        return list(with_occurrences(one_offs, series, first, last))
+
+    def _select(self, where: List[str], params: list) -> List[Event]:
+        sql = f"SELECT {COLUMNS} FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ordinal, id"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        events = [ev for ev in map(self._row_to_event, rows) if ev is not None]
+        add_count(self, "events_scanned", len(events))
+        return events
@@ -1,13 +1,47 @@
 # storage.py
 # Class which implements Storage and JSON
 from abc import ABC, abstractmethod
-from typing import List, Iterable
+from array import array
+from typing import Dict, Iterator, List, Iterable, Optional, Tuple
+import atexit
+import contextlib
+import hashlib
 import json
+import marshal
+import os
+import re
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: saves there are not locked against other processes
+    fcntl = None
 
 from model import Event   # same folder
+from decorators import add_count, instrumented
+
+# Every backend's implementation of these is wrapped with @instrumented
+STORAGE_CALLS = ("load", "save", "iter_events", "query", "append", "changed")
+
+# Written first in every JSON_File_Storage cache file. marshal's format
+# may change between Python versions, so those are part of it too.
+CACHE_TAG = ("events-cache", 4, marshal.version, sys.version_info[:2])
 
 class Event_Storage(ABC):
-    """Abstract base class for event storage backends."""
+    """Abstract base class for event storage backends.
+
+    The storage calls of every subclass are timed into self.metrics
+    while the tracker's metrics are on (see CalendarEventTracker.stats).
+    """
+    metrics = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in STORAGE_CALLS:
+            method = cls.__dict__.get(name)
+            if callable(method) and not getattr(method, "instrumented", False):
+                setattr(cls, name, instrumented(method))
 
     @abstractmethod
     def load(self) -> List[Event]:
@@ -19,27 +53,519 @@ class Event_Storage(ABC):
         """Save the given events to storage."""
         pass
 
+    @instrumented
+    def iter_events(self) -> Iterator[Event]:
+        """Yield the stored events one at a time.
+
+        Backends that can read incrementally override this so callers
+        (e.g. the streaming CSV export) never hold the whole calendar.
+        """
+        return iter(self.load())
+
+    @instrumented
+    def changed(self) -> bool:
+        """True if the stored events are no longer what this process last
+        loaded (another process saved, or save() merged its changes in)."""
+        return False
+
+
+class Queryable_Storage(ABC):
+    """Optional extra for backends that can filter events themselves.
+
+    A tracker over one of these answers date and keyword queries through
+    query() and only loads the whole calendar when it has to.
+    """
+
+    @abstractmethod
+    def query(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              keyword: Optional[str] = None) -> List[Event]:
+        """Events with start_date <= date <= end_date whose title or note
+        contains keyword (case-insensitive). None means no limit. Results
+        are sorted by date."""
+        pass
+
+    @abstractmethod
+    def append(self, events: Iterable[Event]) -> None:
+        """Persist new events without touching the stored ones."""
+        pass
+
+
+class Saved_Events:
+    """Remembers what a backend last persisted, keyed by its own record keys.
+
+    Events are matched up by Event.id, so the next save can tell added,
+    edited (same id, new fields) and deleted events apart and write only
+    the difference instead of the whole calendar. The tracker never
+    changes an Event in place, so one that is still the object that was
+    saved is not compared field by field.
+    """
+
+    def __init__(self):
+        self._key_of: Dict[str, int] = {}                 # Event.id -> key
+        self._records: Dict[int, Tuple[Event, dict]] = {}  # key -> (event, saved dict)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def remember(self, key: int, ev: Event, data: Optional[dict] = None) -> None:
+        old = self._records.get(key)
+        if old is not None and old[0].id != ev.id:
+            self._key_of.pop(old[0].id, None)
+        self._key_of[ev.id] = key
+        self._records[key] = (ev, ev.to_dict() if data is None else data)
+
+    def forget(self, key: int) -> None:
+        ev, _ = self._records.pop(key)
+        self._key_of.pop(ev.id, None)
+
+    def rows(self) -> List[Tuple[int, dict]]:
+        """(key, dict) for every saved event, in the order they were added."""
+        return [(key, data) for key, (_, data) in self._records.items()]
+
+    def diff(self, events: Iterable[Event]):
+        """Compare the current events with the saved ones.
+
+        Returns (added, changed, removed): new Event objects, (key, Event)
+        pairs whose fields differ from what was saved, and the keys of
+        saved events that are gone.
+        """
+        added: List[Event] = []
+        changed: List[Tuple[int, Event]] = []
+        seen = set()
+        for ev in events:
+            key = self._key_of.get(ev.id)
+            if key is None or key in seen:
+                added.append(ev)
+                continue
+            seen.add(key)
+            saved, data = self._records[key]
+            if ev is not saved and ev.to_dict() != data:
+                changed.append((key, ev))
+        removed = [key for key in self._records if key not in seen]
+        return added, changed, removed
+
+
+class Corrupt_Events_File(json.JSONDecodeError):
+    """A JSONDecodeError from the streaming reader.
+
+    pos/lineno/colno point into the whole file (pos counts characters)
+    and record is the index of the record that could not be read.
+    """
+
+    def __init__(self, msg: str, pos: int, lineno: int, colno: int, record: int):
+        ValueError.__init__(
+            self, f"{msg}: record {record} at line {lineno} column {colno} (char {pos})"
+        )
+        self.msg = msg
+        self.doc = ""
+        self.pos = pos
+        self.lineno = lineno
+        self.colno = colno
+        self.record = record
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# A decode error this close to the end of the buffer may just be a token
+# (say "false" or a \uXXXX escape) cut off at the chunk boundary
+_CUT_TOKEN = 16
+
+
+class _Json_Array_Reader:
+    """Reads a JSON array of objects from a text file one element at a time.
+
+    Only the current chunk (plus whatever one record needs) is held in
+    memory, so the file size doesn't matter.
+    """
+
+    def __init__(self, f, chunk_size: int):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0           # position in _buf
+        self._base = 0          # file offset of _buf[0]
+        self._lines = 0         # newlines before _buf
+        self._line_start = 0    # file offset where the current line starts
+        self._eof = False
+        self.record = 0
+
+    def _read_more(self) -> bool:
+        """Append the next chunk (dropping what was consumed). False at EOF."""
+        if self._eof:
+            return False
+        pos = self._pos
+        if pos:
+            self._lines += self._buf.count("\n", 0, pos)
+            last_nl = self._buf.rfind("\n", 0, pos)
+            if last_nl >= 0:
+                self._line_start = self._base + last_nl + 1
+            self._base += pos
+            self._buf = self._buf[pos:]
+            self._pos = 0
+        # Read at least as much again as we hold, so one huge record
+        # doesn't cost a retry per chunk
+        chunk = self._f.read(max(self._chunk_size, len(self._buf)))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf += chunk
+        return True
+
+    def _peek(self) -> str:
+        """Next non-whitespace character ("" at end of file)."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._read_more():
+                return ""
+
+    def error(self, msg: str, pos: Optional[int] = None) -> Corrupt_Events_File:
+        pos = self._pos if pos is None else pos
+        lineno = self._lines + self._buf.count("\n", 0, pos) + 1
+        last_nl = self._buf.rfind("\n", 0, pos)
+        line_start = self._base + last_nl + 1 if last_nl >= 0 else self._line_start
+        offset = self._base + pos
+        return Corrupt_Events_File(msg, offset, lineno, offset - line_start + 1, self.record)
+
+    def __iter__(self) -> Iterator[dict]:
+        if self._peek() != "[":
+            raise self.error("Expecting '['")
+        self._pos += 1
+        if self._peek() == "]":
+            self._pos += 1
+        else:
+            while True:
+                yield self._next_object()
+                self.record += 1
+                char = self._peek()
+                self._pos += 1
+                if char == "]":
+                    break
+                if char != ",":
+                    self._pos -= 1
+                    raise self.error("Expecting ',' delimiter")
+        if self._peek() != "":
+            raise self.error("Extra data")
+
+    def _next_object(self) -> dict:
+        self._peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+                break
+            except json.JSONDecodeError as exc:
+                # Read on only if the record may just be cut off at the end
+                # of the chunk; anything earlier is a real error, so a bad
+                # record never pulls the rest of the file into memory
+                cut = (exc.pos >= len(self._buf) - _CUT_TOKEN
+                       or exc.msg.startswith("Unterminated string"))
+                if not cut:
+                    raise self.error(exc.msg, exc.pos) from None
+                start = self._pos
+                if not self._read_more():
+                    raise self.error(exc.msg, exc.pos - start + self._pos) from None
+        if not isinstance(obj, dict):
+            raise self.error("Expecting object")
+        self._pos = end
+        return obj
+
+
+def iter_json_events(filename: str, chunk_size: int = 1 << 16) -> Iterator[Event]:
+    """Yield the events of a JSON events file one by one (bounded memory).
+
+    Raises Corrupt_Events_File (a json.JSONDecodeError) at the first bad
+    record, after yielding every good record before it. A record that
+    is valid JSON but not a valid event (say, a broken repeat rule) is
+    skipped with a warning instead.
+    """
+    with open(filename, "r", encoding="utf-8") as f:
+        reader = _Json_Array_Reader(f, chunk_size)
+        for data in reader:
+            try:
+                ev = Event.from_dict(data)
+            except ValueError as exc:
+                print(f"Warning: skipping bad event (record {reader.record}): {exc}.")
+                continue
+            yield ev
+
+
+def _record_key(ev: Event) -> int:
+    if ev.repeat is None and ev.end_date is None:
+        return hash((ev.date, ev.title, ev.location, ev.note))
+    return hash((ev.date, ev.title, ev.location, ev.note, ev.end_date, ev.repeat))
+
+
+def merge_events(base: List[Event], base_keys: array, ours: List[Event],
+                 theirs: List[Event]) -> List[Event]:
+    """Three-way merge of an events list.
+
+    base is what we loaded (base_keys their _record_key at the time),
+    ours is our current list and theirs what another process saved
+    since. Events are matched by Event.id: our deletes and edits are
+    applied to the same records of theirs, and our new events are
+    appended. If they already edited or deleted a record we changed,
+    their version stands.
+    """
+    base_pos = {ev.id: i for i, ev in enumerate(base)}
+    added: List[Event] = []
+    edited: Dict[int, Event] = {}
+    kept = set()
+    for ev in ours:
+        i = base_pos.get(ev.id)
+        if i is None or i in kept:
+            added.append(ev)
+            continue
+        kept.add(i)
+        if _record_key(ev) != base_keys[i]:
+            edited[i] = ev
+
+    their_pos = {ev.id: pos for pos, ev in enumerate(theirs)}
+    # Their records by content (duplicates in order), for base events
+    # whose ids they never saw: files from before ids get fresh ones on
+    # every load
+    where: Optional[Dict[int, List[int]]] = None
+
+    merged: List[Optional[Event]] = list(theirs)
+    for i, key in enumerate(base_keys):
+        if i in kept and i not in edited:
+            continue
+        pos = their_pos.get(base[i].id)
+        if pos is None:
+            if where is None:
+                where = {}
+                for at, ev in enumerate(theirs):
+                    where.setdefault(_record_key(ev), []).append(at)
+            positions = where.get(key)
+            if not positions:
+                continue  # they deleted it (or changed it, and it had no id)
+            pos = positions.pop(0)
+        elif _record_key(theirs[pos]) != key:
+            continue  # they edited it too
+        merged[pos] = edited.get(i)   # None: we deleted it
+    return [ev for ev in merged if ev is not None] + added
+
 
 class JSON_File_Storage(Event_Storage):
-    """Storage implementation that saves events to a JSON file."""
+    """Storage implementation that saves events to a JSON file.
 
-    def __init__(self, filename: str = "events.json"):
+    Several processes can share one file. Reads and saves hold an
+    advisory lock on <filename>.lock (fcntl, where available), and the
+    file's inode, mtime, size and content hash are remembered at every
+    load and save. changed() is then a stat() call while nobody else
+    writes, and if another process did save in between, save() merges
+    our changes into theirs instead of overwriting them (see
+    merge_events).
+
+    With cache=True (the default) the parsed events are also kept in
+    <filename>.cache, as marshalled column tuples next to the JSON file's
+    stat and hash. load() uses the cache instead of parsing JSON when it
+    matches the file, which is several times faster on big calendars;
+    a stale or broken cache is simply rewritten. Saves do not rewrite
+    it each time: the last one is cached by close(), which runs at exit.
+    """
+
+    def __init__(self, filename: str = "events.json", cache: bool = True):
         self.filename = filename
+        self.lock_name = filename + ".lock"
+        self.cache_name = filename + ".cache" if cache else None
+        self._seen_stat: Optional[Tuple[int, int, int]] = None
+        self._seen_digest: Optional[bytes] = None
+        self._base: List[Event] = []     # what the file held at our last load
+        self._base_keys = array("q")
+        self._stale = False              # a save merged in someone else's changes
+        self._cache_due = False          # saved since the cache was last written
+
+    def iter_events(self) -> Iterator[Event]:
+        """Stream events from the file without loading it all at once
+        (none before the first save)."""
+        if not os.path.exists(self.filename):
+            return iter(())
+        return iter_json_events(self.filename)
 
     def load(self) -> List[Event]:
         """Load events from a JSON file and return them as Event objects."""
+        with self._locked(exclusive=False):
+            stat = self._stat()
+            cached = self._read_cache(stat)
+            if cached is not None:
+                events, digest, keys = cached
+            else:
+                events = self._read()
+                digest = self._digest()
+                keys = None
+                add_count(self, "bytes_read", stat[2] if stat else 0)
+                if events:
+                    self._write_cache(events, stat, digest)
+            self._remember(events, digest, keys)
+        self._stale = False
+        add_count(self, "events_scanned", len(events))
+        return events
+
+    def _read(self) -> List[Event]:
         try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            return [Event.from_dict(ev) for ev in data]
+            return list(self.iter_events())
         except FileNotFoundError:
             return []
-        except json.JSONDecodeError:
-            print("Warning: events file is corrupted. Starting with empty list.")
+        except Corrupt_Events_File as exc:
+            print(
+                f"Warning: events file is corrupted (record {exc.record}, "
+                f"char {exc.pos}). Starting with empty list."
+            )
             return []
 
     def save(self, events: Iterable[Event]) -> None:
-        """Serialize Event objects to JSON and write them to file."""
-        data = [ev.to_dict() for ev in events]
-        with open(self.filename, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4)
+        """Serialize Event objects to JSON and write them to file.
+
+        If another process saved since our last load, the two sets of
+        changes are merged and changed() reports True until load().
+        """
+        events = list(events)
+        with self._locked(exclusive=True):
+            if self._file_changed():
+                events = merge_events(self._base, self._base_keys, events, self._read())
+                self._stale = True
+            raw = json.dumps([ev.to_dict() for ev in events], indent=4).encode("utf-8")
+            tmp_name = self.filename + ".tmp"
+            with open(tmp_name, "wb") as f:
+                f.write(raw)
+            os.replace(tmp_name, self.filename)
+            digest = hashlib.blake2b(raw, digest_size=16).digest()
+            self._remember(events, digest)
+            if self.cache_name is not None and not self._cache_due:
+                self._cache_due = True
+                atexit.register(self.close)
+        add_count(self, "bytes_written", len(raw))
+        add_count(self, "events_scanned", len(events))
+
+    def changed(self) -> bool:
+        return self._stale or self._file_changed()
+
+    def close(self) -> None:
+        """Cache what the last save wrote (unless the file has changed
+        since: the next load then parses and caches it)."""
+        if not self._cache_due:
+            return
+        self._cache_due = False
+        atexit.unregister(self.close)
+        if self._stat() != self._seen_stat:
+            return   # changed or gone
+        with self._locked(exclusive=False):
+            if self._stat() == self._seen_stat:
+                self._write_cache(self._base, self._seen_stat, self._seen_digest)
+
+    # Parsed-events cache
+
+    def _read_cache(self, stat: Optional[Tuple[int, int, int]]):
+        """(events, digest, record keys) from the cache if it matches the JSON file
+        with this stat, else None. A stat mismatch with the same size
+        (e.g. a touch) is settled by hashing the file."""
+        if self.cache_name is None or stat is None:
+            return None
+        try:
+            with open(self.cache_name, "rb") as f:
+                # A short header first, so a stale cache is never read whole.
+                # (marshal.loads of bytes: marshal.load(f) reads per object)
+                size = int.from_bytes(f.read(4), "little")
+                tag, cached_stat, digest = marshal.loads(f.read(size))
+                if tag != CACHE_TAG or cached_stat[2] != stat[2]:
+                    return None
+                if tuple(cached_stat) != stat and self._digest() != digest:
+                    return None
+                columns = marshal.loads(f.read())
+            dates, titles, locations, notes, ordinals, ids, repeats, end_dates = columns
+            events = Event.from_columns(dates, titles, locations, notes, ordinals, ids,
+                                        repeats, end_dates)
+            # _record_key of every event, computed without touching them
+            # (except for the few recurring or multi-day ones)
+            keys = array("q", map(hash, zip(dates, titles, locations, notes)))
+            if any(repeats) or any(end_dates):
+                for i, (repeat, end_date) in enumerate(zip(repeats, end_dates)):
+                    if repeat is not None or end_date is not None:
+                        keys[i] = _record_key(events[i])
+        except (OSError, EOFError, ValueError, TypeError):
+            return None  # missing or unreadable: fall back to the JSON
+        add_count(self, "bytes_read", os.path.getsize(self.cache_name))
+        if tuple(cached_stat) != stat:
+            self._write_cache(events, stat, digest)
+        return events, digest, keys
+
+    def _write_cache(self, events: List[Event], stat: Optional[Tuple[int, int, int]],
+                     digest: Optional[bytes]) -> None:
+        if self.cache_name is None or stat is None:
+            return
+        columns = (
+            tuple(ev.date for ev in events),
+            tuple(ev.title for ev in events),
+            tuple(ev.location for ev in events),
+            tuple(ev.note for ev in events),
+            tuple(ev.ordinal for ev in events),
+            tuple(ev.id for ev in events),
+            tuple(None if ev.repeat is None else ev.repeat.to_dict() for ev in events),
+            tuple(ev.end_date for ev in events),
+        )
+        # Loads can run side by side, so each writer gets its own temp file
+        tmp_name = f"{self.cache_name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            header = marshal.dumps((CACHE_TAG, stat, digest))
+            with open(tmp_name, "wb") as f:
+                f.write(len(header).to_bytes(4, "little"))
+                f.write(header)
+                f.write(marshal.dumps(columns))
+            os.replace(tmp_name, self.cache_name)
+        except (OSError, ValueError) as exc:
+            # Only a cache: the events themselves are safe in the JSON
+            print(f"Warning: could not write events cache ({exc}).")
+            with contextlib.suppress(OSError):
+                os.remove(tmp_name)
+
+    # Change detection
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        # save() replaces the file, so the inode changes even when the
+        # mtime (coarse on some filesystems) and size do not
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _digest(self) -> Optional[bytes]:
+        digest = hashlib.blake2b(digest_size=16)
+        try:
+            with open(self.filename, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        except FileNotFoundError:
+            return None
+        return digest.digest()
+
+    def _remember(self, events: List[Event], digest: Optional[bytes],
+                  keys: Optional[array] = None) -> None:
+        self._seen_stat = self._stat()
+        self._seen_digest = digest
+        self._base = list(events)
+        self._base_keys = array("q", map(_record_key, events)) if keys is None else keys
+
+    def _file_changed(self) -> bool:
+        """Has the file changed since our last load/save? Reads it only if
+        stat() says so, and then only to hash it (a touch is no change)."""
+        stat = self._stat()
+        if stat == self._seen_stat:
+            return False
+        if stat is not None and self._digest() == self._seen_digest:
+            self._seen_stat = stat
+            return False
+        return True
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_name, "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
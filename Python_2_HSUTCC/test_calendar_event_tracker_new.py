@@ -1,10 +1,17 @@
 import os
 import io
+import sys
+import csv
 import json
+import asyncio
+import sqlite3
 import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import patch
 from contextlib import redirect_stdout
+from datetime import date
 
 from Python_2_HSUTCC.main_ev_tracker import (
     Event,
@@ -12,6 +19,26 @@ from Python_2_HSUTCC.main_ev_tracker import (
     Event_Storage,
     CalendarEventTracker,
 )
+from Python_2_HSUTCC.journal_storage import Journal_Storage
+from Python_2_HSUTCC.sqlite_storage import SQLite_Storage
+from Python_2_HSUTCC.binary_storage import Binary_Storage, convert_json
+from Python_2_HSUTCC.sharded_storage import Sharded_Storage
+from Python_2_HSUTCC.decorators import autosave
+from Python_2_HSUTCC.export import export_events_csv
+from Python_2_HSUTCC.bulk_import import bulk_import
+from Python_2_HSUTCC.commands import run_batch, run_command
+from Python_2_HSUTCC.server import Event_Server
+from Python_2_HSUTCC.load_client import run_load
+from Python_2_HSUTCC.benchmark import run_benchmarks, synthetic_events
+
+# The app modules import each other by bare name (tracker, storage, ...),
+# so use those module objects rather than Python_2_HSUTCC.* duplicates
+tracker_module = sys.modules[CalendarEventTracker.__module__]
+storage_module = sys.modules[JSON_File_Storage.__module__]
+Corrupt_Events_File = storage_module.Corrupt_Events_File
+iter_json_events = storage_module.iter_json_events
+render_module = sys.modules[tracker_module.write_events.__module__]
+Recurrence = sys.modules[Event.__module__].Recurrence
 
 
 class FakeStorage(Event_Storage):
@@ -49,6 +76,7 @@ class TestEventModel(unittest.TestCase):
                 "title": "Meeting",
                 "location": "Office",
                 "note": "Bring laptop",
+                "id": ev.id,
             },
         )
 
@@ -57,6 +85,26 @@ class TestEventModel(unittest.TestCase):
         self.assertEqual(ev2.title, ev.title)
         self.assertEqual(ev2.location, ev.location)
         self.assertEqual(ev2.note, ev.note)
+        self.assertEqual(ev2.id, ev.id)
+
+    def test_events_are_slotted_and_share_repeated_strings(self):
+        a = Event.from_dict(json.loads('{"date": "2025-11-17", "title": "Gym", "location": "Bangkok"}'))
+        b = Event.from_dict(json.loads('{"date": "2025-11-17", "title": "Gym", "location": "Bangkok"}'))
+        self.assertFalse(hasattr(a, "__dict__"))
+        self.assertIs(a.location, b.location)
+        self.assertIs(a.title, b.title)
+        self.assertIs(a.date, b.date)
+
+    def test_ordinal_follows_date(self):
+        ev = Event("2024-02-29", "Leap day")
+        self.assertEqual(ev.ordinal, date(2024, 2, 29).toordinal())
+        ev.date = "2025-01-01"
+        self.assertEqual(ev.ordinal, date(2025, 1, 1).toordinal())
+        for bad in ("2025-02-29", "2025-1-01", "", "2025-13-01"):
+            with self.subTest(date=bad):
+                self.assertEqual(Event(bad, "x").ordinal, 0)
+        # A stored ordinal is trusted, not re-parsed
+        self.assertEqual(Event.from_dict({"date": "2025-01-01", "ordinal": 5}).ordinal, 5)
 
 
 class TestJSONFileStorage(unittest.TestCase):
@@ -96,6 +144,409 @@ class TestJSONFileStorage(unittest.TestCase):
         finally:
             os.remove(path)
 
+    def test_iter_events_streams_in_small_chunks(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        try:
+            events = [Event(f"2025-11-{d:02d}", f"Título {d}", "Home", "x" * d) for d in range(1, 29)]
+            JSON_File_Storage(path).save(events)
+            # Chunks much smaller than one record still work
+            streamed = list(iter_json_events(path, chunk_size=7))
+            self.assertEqual(
+                [ev.to_dict() for ev in streamed], [ev.to_dict() for ev in events]
+            )
+        finally:
+            os.remove(path)
+
+    def test_iter_events_reports_bad_record(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write('[\n {"date": "2025-11-17", "title": "Ok"},\n {"date": 2025-11-18}\n]')
+
+            seen = []
+            with self.assertRaises(Corrupt_Events_File) as ctx:
+                for ev in iter_json_events(path, chunk_size=8):
+                    seen.append(ev.title)
+            self.assertEqual(seen, ["Ok"])
+            self.assertEqual(ctx.exception.record, 1)
+            # Where the decoder failed (the "-"), not where the record starts
+            self.assertEqual((ctx.exception.lineno, ctx.exception.colno), (3, 15))
+            self.assertEqual(ctx.exception.pos, 56)
+
+            buf = io.StringIO()
+            with redirect_stdout(buf):
+                self.assertEqual(JSON_File_Storage(path).load(), [])
+            self.assertIn("record 1, char 56", buf.getvalue())
+        finally:
+            os.remove(path)
+
+    def test_bad_record_does_not_read_the_rest_of_the_file(self):
+        good = ',\n'.join(json.dumps(Event("2025-11-17", f"E{i}").to_dict())
+                          for i in range(2000))
+        text = '[{"date": 2025-11-18},\n' + good + "]"
+        f = io.StringIO(text)
+        reader = storage_module._Json_Array_Reader(f, 64)
+        with self.assertRaises(Corrupt_Events_File) as ctx:
+            list(reader)
+        self.assertEqual(ctx.exception.pos, text.index("-"))
+        self.assertLess(f.tell(), 1000)
+
+
+class TestSharedJSONFile(unittest.TestCase):
+    """Two trackers (as if in two processes) on one events.json."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "events.json")
+        JSON_File_Storage(self.path).save([
+            Event("2025-11-18", "Gym"),
+            Event("2025-11-19", "Dentist"),
+        ])
+        self.a = CalendarEventTracker(JSON_File_Storage(self.path))
+        self.b = CalendarEventTracker(JSON_File_Storage(self.path))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_saves_merge_instead_of_clobbering(self):
+        self.a.add_events([Event("2025-11-20", "From A")])
+        self.b.add_events([Event("2025-11-21", "From B")])
+        self.b.remove_event(self.b.events_on_date("2025-11-18")[0])
+
+        # b merged a's add into its own changes and reloaded
+        self.assertEqual([ev.title for ev in self.b.sorted_events()],
+                         ["Dentist", "From A", "From B"])
+        self.assertTrue(self.a.refresh())
+        self.assertEqual([ev.title for ev in self.a.sorted_events()],
+                         ["Dentist", "From A", "From B"])
+        self.assertFalse(self.a.refresh())
+
+    def test_edits_merge_by_id(self):
+        gym = self.a.events_on_date("2025-11-18")[0]
+        dentist = self.b.events_on_date("2025-11-19")[0]
+        self.a.update(gym.id, title="Gym (moved)")
+        self.b.update(dentist.id, note="Bring card")
+        self.assertEqual(
+            [(ev.id, ev.title, ev.note) for ev in self.b.sorted_events()],
+            [(gym.id, "Gym (moved)", ""), (dentist.id, "Dentist", "Bring card")],
+        )
+
+    def test_unchanged_file_is_not_parsed(self):
+        os.utime(self.path)  # touched, same content
+        with patch.object(storage_module, "iter_json_events",
+                          side_effect=AssertionError("parsed")):
+            self.assertFalse(self.a.refresh())
+            self.assertFalse(self.a._storage.changed())
+
+
+class TestJSONCache(unittest.TestCase):
+    """The parsed-events cache next to events.json."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "events.json")
+        self.events = [Event("2025-11-18", "Gym", "Home", "legs"), Event("2025-11-19", "Dentist")]
+        storage = JSON_File_Storage(self.path)
+        storage.save(self.events)
+        storage.close()
+
+    def load_without_json(self):
+        with patch.object(storage_module, "iter_json_events",
+                          side_effect=AssertionError("parsed")):
+            return JSON_File_Storage(self.path).load()
+
+    def test_load_uses_cache_after_save(self):
+        self.assertTrue(os.path.exists(self.path + ".cache"))
+        loaded = self.load_without_json()
+        self.assertEqual([ev.to_dict() for ev in loaded], [ev.to_dict() for ev in self.events])
+        self.assertEqual(loaded[0].ordinal, self.events[0].ordinal)
+        os.utime(self.path)  # touched, same content: still valid
+        self.assertEqual(len(self.load_without_json()), 2)
+
+    def test_stale_or_broken_cache_falls_back_to_json(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump([{"date": "2025-12-01", "title": "Edited elsewhere"}], f)
+        self.assertEqual([ev.title for ev in JSON_File_Storage(self.path).load()],
+                         ["Edited elsewhere"])
+        # That load refreshed the cache
+        self.assertEqual([ev.title for ev in self.load_without_json()], ["Edited elsewhere"])
+
+        with open(self.path + ".cache", "r+b") as f:
+            f.truncate(20)
+        self.assertEqual([ev.title for ev in JSON_File_Storage(self.path).load()],
+                         ["Edited elsewhere"])
+
+    def test_saves_leave_the_cache_to_close(self):
+        storage = JSON_File_Storage(self.path)
+        storage.load()
+        with patch.object(storage, "_write_cache") as write:
+            for title in ("One", "Two", "Three"):
+                storage.save(self.events + [Event("2025-11-20", title)])
+        write.assert_not_called()
+        storage.close()
+        loaded = self.load_without_json()
+        self.assertEqual([ev.title for ev in loaded], ["Gym", "Dentist", "Three"])
+
+        # Not closed (a crash): the next load sees the cache is stale
+        storage.save(self.events)
+        self.assertEqual(len(JSON_File_Storage(self.path).load()), 2)
+        self.assertEqual(len(self.load_without_json()), 2)
+        storage.close()
+
+    def test_cache_can_be_turned_off(self):
+        os.remove(self.path + ".cache")
+        self.assertEqual(len(JSON_File_Storage(self.path, cache=False).load()), 2)
+        self.assertFalse(os.path.exists(self.path + ".cache"))
+
+
+class TestJournalStorage(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "events.json")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_changes_are_appended_and_replayed(self):
+        storage = Journal_Storage(self.path)
+        events = storage.load()
+        e1 = Event("2025-11-17", "One", "Home")
+        e2 = Event("2025-11-18", "Two", "Work")
+        events += [e1, e2]
+        storage.save(events)
+
+        # Edits replace the event (same id), like the tracker's
+        events[0] = Event(e1.date, "One (edited)", e1.location, id=e1.id)
+        events.remove(e2)
+        storage.save(events)
+
+        with open(storage.log_name, encoding="utf-8") as f:
+            ops = [json.loads(line)["op"] for line in f]
+        self.assertEqual(ops, ["add", "add", "edit", "delete"])
+        self.assertFalse(os.path.exists(self.path))
+
+        loaded = Journal_Storage(self.path).load()
+        self.assertEqual([ev.title for ev in loaded], ["One (edited)"])
+
+    def test_unchanged_save_writes_nothing(self):
+        storage = Journal_Storage(self.path)
+        events = [Event("2025-11-17", "One")]
+        storage.save(events)
+        size = os.path.getsize(storage.log_name)
+        # The same objects are not even turned back into dicts
+        with patch.object(Event, "to_dict", side_effect=AssertionError("compared")):
+            storage.save(events)
+        self.assertEqual(os.path.getsize(storage.log_name), size)
+
+    def test_compaction_folds_log_into_snapshot(self):
+        storage = Journal_Storage(self.path, compact_at=200)
+        events = []
+        for day in range(1, 11):
+            events.append(Event(f"2025-11-{day:02d}", f"Event {day}"))
+            storage.save(events)
+        storage.wait()
+        events.pop(0)
+        storage.save(events)
+        storage.wait()
+
+        self.assertTrue(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(storage.log_name + ".old"))
+        # The snapshot is still readable by the plain JSON backend
+        self.assertGreater(len(JSON_File_Storage(self.path).load()), 0)
+
+        loaded = Journal_Storage(self.path).load()
+        self.assertEqual(
+            [ev.title for ev in loaded], [f"Event {d}" for d in range(2, 11)]
+        )
+
+    def test_opens_plain_events_json_and_skips_torn_record(self):
+        JSON_File_Storage(self.path).save([Event("2025-11-17", "Old")])
+        with open(self.path + ".log", "w", encoding="utf-8") as f:
+            f.write('{"op": "add", "seq": 1, "event": {"date": "2025-11-18", "title": "New"}}\n')
+            f.write('{"op": "add", "se')
+
+        buf = io.StringIO()
+        with redirect_stdout(buf):
+            loaded = Journal_Storage(self.path).load()
+        self.assertEqual([ev.title for ev in loaded], ["Old", "New"])
+        self.assertIn("Warning", buf.getvalue())
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "events.db")
+        self.storage = SQLite_Storage(self.path)
+        self.storage.save([
+            Event("2025-11-20", "Team Meeting", "Office", "Sprint review"),
+            Event("2025-11-18", "Gym", "Club", "Leg day"),
+            Event("2025-11-19", "Dentist", "Clinic", "100% on time"),
+            Event("2025-11-19", "Family meeting", "Home", ""),
+        ])
+
+    def tearDown(self):
+        self.storage.close()
+        self.dir.cleanup()
+
+    def test_save_writes_only_changes(self):
+        events = self.storage.load()
+        old = events[0]
+        events[0] = Event(old.date, old.title, old.location, "Moved", id=old.id)
+        del events[1]
+        self.storage.save(events)
+
+        reopened = SQLite_Storage(self.path)
+        try:
+            loaded = reopened.load()
+        finally:
+            reopened.close()
+        self.assertEqual(
+            [ev.title for ev in loaded], ["Team Meeting", "Dentist", "Family meeting"]
+        )
+        self.assertEqual(loaded[0].note, "Moved")
+
+    def test_query_filters_and_sorts(self):
+        self.assertEqual(
+            [ev.title for ev in self.storage.query("2025-11-19", "2025-11-19")],
+            ["Dentist", "Family meeting"],
+        )
+        self.assertEqual(
+            [ev.title for ev in self.storage.query(keyword="MEETING")],
+            ["Family meeting", "Team Meeting"],
+        )
+        # LIKE wildcards in the keyword are matched literally
+        self.assertEqual(
+            [ev.title for ev in self.storage.query(keyword="0%")], ["Dentist"]
+        )
+        self.assertEqual(self.storage.query(keyword="_"), [])
+
+    def test_tracker_pushes_queries_down_without_loading(self):
+        with patch.object(self.storage, "load", side_effect=AssertionError("loaded")):
+            app = CalendarEventTracker(self.storage)
+            self.assertEqual(
+                [ev.title for ev in app.events_in_range("2025-11-18", "2025-11-19")],
+                ["Gym", "Dentist", "Family meeting"],
+            )
+            with patch("builtins.input", return_value="gym"):
+                with redirect_stdout(io.StringIO()):
+                    found = app.search_events()
+            self.assertEqual([ev.title for ev in found], ["Gym"])
+
+            with patch("builtins.input", side_effect=["2025-11-21", "New", "", ""]):
+                with redirect_stdout(io.StringIO()):
+                    app.add_event()
+            self.assertEqual(len(app.events_on_date("2025-11-21")), 1)
+
+        # Anything that needs the whole calendar loads it once
+        self.assertEqual(len(app.events), 5)
+
+    def test_pushdown_adds_in_a_batch_append_once(self):
+        app = CalendarEventTracker(self.storage)
+        with patch.object(self.storage, "append", wraps=self.storage.append) as append:
+            with app.batch():
+                for day in range(21, 26):
+                    app.add_events([Event(f"2025-11-{day}", f"New {day}")])
+                self.assertEqual(append.call_count, 0)
+            self.assertEqual(append.call_count, 1)
+            self.assertEqual(len(append.call_args[0][0]), 5)
+
+            # A query inside a batch still sees what was added before it
+            with app.batch():
+                app.add_events([Event("2025-12-01", "Later")])
+                self.assertEqual([ev.title for ev in app.events_on_date("2025-12-01")],
+                                 ["Later"])
+            self.assertEqual(append.call_count, 2)
+        self.assertTrue(app._pushdown)
+        self.assertEqual(len(self.storage.query(start_date="2025-11-21")), 6)
+
+    def test_old_database_gets_ordinal_column(self):
+        path = os.path.join(self.dir.name, "old.db")
+        conn = sqlite3.connect(path)
+        conn.executescript(
+            "CREATE TABLE events (id INTEGER PRIMARY KEY, date TEXT NOT NULL,"
+            " title TEXT NOT NULL, location TEXT NOT NULL DEFAULT '',"
+            " note TEXT NOT NULL DEFAULT '');"
+            "INSERT INTO events (date, title) VALUES ('2025-11-19', 'Old');"
+        )
+        conn.close()
+        storage = SQLite_Storage(path)
+        try:
+            found = storage.query("2025-11-19", "2025-11-19")
+        finally:
+            storage.close()
+        self.assertEqual([ev.title for ev in found], ["Old"])
+        self.assertEqual(found[0].ordinal, date(2025, 11, 19).toordinal())
+        self.assertEqual(len(found[0].id), 16)
+
+    def test_edit_by_id_updates_the_row_in_place(self):
+        app = CalendarEventTracker(self.storage)
+        gym = app.events_on_date("2025-11-18")[0]
+        app.update(gym.id, title="Gym (moved)")
+        conn = sqlite3.connect(self.path)
+        try:
+            rows = conn.execute("SELECT id, title FROM events WHERE uid = ?", (gym.id,)).fetchall()
+            count = conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(rows, [(2, "Gym (moved)")])   # same row, not delete + insert
+        self.assertEqual(count, 4)
+
+
+class TestBinaryStorage(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.json_path = os.path.join(self.dir.name, "events.json")
+        self.path = os.path.join(self.dir.name, "events.bin")
+        self.events = [
+            Event("2025-11-20", "Café", "Bangkok", "Ünïcode note"),
+            Event("2025-11-18", "Gym", "Club", ""),
+            Event("2025-11-19", "Dentist", "", "Check-up"),
+        ]
+        JSON_File_Storage(self.json_path).save(self.events)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_convert_and_load_in_date_order(self):
+        self.assertEqual(convert_json(self.json_path, self.path), 3)
+        storage = Binary_Storage(self.path)
+        loaded = storage.load()
+        storage.close()
+        self.assertEqual([ev.title for ev in loaded], ["Gym", "Dentist", "Café"])
+        self.assertEqual(loaded[2].to_dict(), {
+            "date": "2025-11-20", "title": "Café",
+            "location": "Bangkok", "note": "Ünïcode note", "id": self.events[0].id,
+        })
+        self.assertEqual(loaded[0].ordinal, date(2025, 11, 18).toordinal())
+
+    def test_query_and_append(self):
+        convert_json(self.json_path, self.path)
+        storage = Binary_Storage(self.path)
+        self.assertEqual(
+            [ev.title for ev in storage.query("2025-11-19", "2025-11-20")],
+            ["Dentist", "Café"],
+        )
+        self.assertEqual([ev.title for ev in storage.query(keyword="check")], ["Dentist"])
+
+        storage.append([Event("2025-11-19", "Lunch")])
+        self.assertEqual(
+            [ev.title for ev in storage.query("2025-11-19", "2025-11-19")],
+            ["Dentist", "Lunch"],
+        )
+        storage.close()
+
+    def test_missing_or_corrupt_file_is_empty(self):
+        self.assertEqual(Binary_Storage(self.path).load(), [])
+        with open(self.path, "wb") as f:
+            f.write(b"not a binary event file at all, not at all......" * 2)
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(Binary_Storage(self.path).load(), [])
+
 
 class TestDateValidation(unittest.TestCase):
     def test_is_leap_year(self):
@@ -135,6 +586,27 @@ class TestDateValidation(unittest.TestCase):
             with self.subTest(date=d):
                 self.assertFalse(CalendarEventTracker.is_valid_date(d))
 
+    def test_validate_dates_matches_scalar_rules(self):
+        dates = [
+            "2024-02-29", "2023-02-29", "1900-02-29", "2000-02-29", "0001-01-01",
+            "9999-12-31", "2025-13-01", "2025-11-00", "abcd-ef-gh", "2025/11/17",
+            "2025-1-1", "", "0000-01-01", "2025-11-18",
+        ]
+        expected_valid = [CalendarEventTracker.is_valid_date(d) for d in dates]
+        expected_ordinals = [
+            date.fromisoformat(d).toordinal() if ok else 0
+            for d, ok in zip(dates, expected_valid)
+        ]
+
+        numpy = tracker_module._numpy()  # imported on first use
+        backends = [("numpy", numpy)] if numpy is not None else []
+        backends.append(("python", None))
+        for name, np_module in backends:
+            with self.subTest(backend=name), patch.object(tracker_module, "np", np_module):
+                valid, ordinals = CalendarEventTracker.validate_dates(dates)
+                self.assertEqual([bool(v) for v in valid], expected_valid)
+                self.assertEqual([int(o) for o in ordinals], expected_ordinals)
+
 
 class TestCalendarEventTrackerCore(unittest.TestCase):
     def setUp(self):
@@ -208,6 +680,37 @@ class TestCalendarEventTrackerCore(unittest.TestCase):
         self.assertEqual(self.app.events[0].title, "Event 2")
         self.assertEqual(self.storage.save_call_count, 1)
 
+    def test_delete_and_update_by_id(self):
+        gym, dentist = Event("2025-11-18", "Gym"), Event("2025-11-19", "Dentist")
+        self.app.add_events([gym, dentist, Event("2025-11-20", "Demo")])
+        saves = self.storage.save_call_count
+
+        moved = self.app.update(gym.id, date="2025-11-21", note="Legs")
+        self.assertEqual((moved.id, moved.title, moved.note), (gym.id, "Gym", "Legs"))
+        self.assertIs(self.app.get_event(gym.id), moved)
+        self.assertEqual([ev.title for ev in self.app.events_on_date("2025-11-21")], ["Gym"])
+        self.assertEqual(self.app.events_on_date("2025-11-18"), [])
+
+        self.assertTrue(self.app.delete(dentist.id))
+        self.assertFalse(self.app.delete(dentist.id))
+        self.assertIsNone(self.app.get_event(dentist.id))
+        self.assertEqual([ev.title for ev in self.app.sorted_events()], ["Demo", "Gym"])
+        self.assertEqual(self.storage.save_call_count, saves + 2)
+
+        with self.assertRaises(KeyError):
+            self.app.update(dentist.id, title="Gone")
+        with self.assertRaises(ValueError):
+            self.app.update(gym.id, colour="red")
+        with self.assertRaises(ValueError):
+            self.app.update(gym.id, date="2025-02-30")
+
+    def test_duplicate_ids_are_replaced_on_load(self):
+        a = Event("2025-11-18", "A")
+        b = Event("2025-11-19", "B", id=a.id)
+        self.app.events = [a, b]
+        self.assertNotEqual(a.id, b.id)
+        self.assertIs(self.app.get_event(b.id), b)
+
     def test_delete_event_invalid_index_does_not_save(self):
         e1 = Event("2025-11-18", "Event 1")
         self.app.events = [e1]
@@ -255,6 +758,889 @@ class TestCalendarEventTrackerCore(unittest.TestCase):
         self.assertIn("Project Meeting", buf.getvalue())
 
 
+class TestDateIndex(unittest.TestCase):
+    def setUp(self):
+        self.storage = FakeStorage([
+            Event("2025-11-20", "C"),
+            Event("2025-11-18", "A"),
+            Event("2025-11-19", "B1"),
+            Event("2025-11-19", "B2"),
+        ])
+        self.app = CalendarEventTracker(self.storage)
+
+    def test_on_date_and_range_come_back_sorted(self):
+        self.assertEqual(
+            [ev.title for ev in self.app.events_on_date("2025-11-19")],
+            ["B1", "B2"],
+        )
+        self.assertEqual(
+            [ev.title for ev in self.app.events_in_range("2025-11-18", "2025-11-19")],
+            ["A", "B1", "B2"],
+        )
+        self.assertEqual(self.app.events_on_date("2025-11-21"), [])
+
+    def test_index_follows_add_and_delete(self):
+        with patch("builtins.input", side_effect=["2025-11-19", "B3", "", ""]):
+            self.app.add_event()
+        self.assertEqual(
+            [ev.title for ev in self.app.events_on_date("2025-11-19")],
+            ["B1", "B2", "B3"],
+        )
+
+        # Sorted view: A, B1, B2, B3, C -> index 2 is B2
+        with patch("builtins.input", return_value="2"):
+            with redirect_stdout(io.StringIO()):
+                self.app.delete_event()
+        self.assertEqual(
+            [ev.title for ev in self.app.events_on_date("2025-11-19")],
+            ["B1", "B3"],
+        )
+        self.assertEqual(len(self.app.events), 4)
+
+    def test_replacing_events_list_rebuilds_index(self):
+        self.app.events = [Event("2024-01-02", "X"), Event("2024-01-01", "Y")]
+        self.assertEqual(
+            [ev.title for ev in self.app.sorted_events()], ["Y", "X"]
+        )
+        self.assertEqual(self.app.events_on_date("2025-11-18"), [])
+
+
+class TestSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.storage = FakeStorage([
+            Event("2025-11-18", "Gym"),
+            Event("2025-11-19", "Dentist"),
+        ])
+        self.app = CalendarEventTracker(self.storage)
+
+    def test_snapshot_does_not_see_later_writes(self):
+        self.app.search("gym")  # build the keyword index
+        before = self.app.snapshot()
+        self.app.add_events([Event("2025-11-18", "Gym again")])
+        with patch("builtins.input", side_effect=["0", "Swim", "", ""]):
+            with redirect_stdout(io.StringIO()):
+                self.app.edit_event()
+        self.app.remove_event(self.app.events_on_date("2025-11-19")[0])
+
+        self.assertEqual([ev.title for ev in before.all()], ["Gym", "Dentist"])
+        self.assertEqual([ev.title for ev in before.search("gym")], ["Gym"])
+        after = self.app.snapshot()
+        self.assertGreater(after.version, before.version)
+        self.assertEqual([ev.title for ev in after.all()], ["Swim", "Gym again"])
+        self.assertEqual([ev.title for ev in after.search("gym")], ["Gym again"])
+
+    def test_chunks_split_and_share(self):
+        snapshot_module = sys.modules[tracker_module.Snapshot.__module__]
+        with patch.object(snapshot_module, "CHUNK", 4):
+            events = [Event(f"2025-01-{day:02d}", f"E{day}") for day in range(1, 21)]
+            snap = tracker_module.Snapshot.build(events[::2])
+            grown = snap.with_added(events[1::2])
+            self.assertEqual(grown.all(), events)
+            self.assertEqual(len(snap), 10)
+            self.assertEqual(
+                [ev.title for ev in grown.in_range("2025-01-07", "2025-01-09")],
+                ["E7", "E8", "E9"],
+            )
+            # Only the chunk that changed is copied; the rest are shared
+            early = grown.with_added([Event("2025-01-01", "New Year")])
+            self.assertEqual(len(early), 21)
+            shared = [c for c in early._chunks if any(c is d for d in grown._chunks)]
+            self.assertEqual(len(shared), len(grown._chunks) - 1)
+            self.assertEqual(grown.with_removed(events[0]).all(), events[1:])
+
+    def test_readers_run_while_a_writer_changes_the_calendar(self):
+        stop = threading.Event()
+        errors = []
+
+        def read():
+            while not stop.is_set():
+                try:
+                    snap = self.app.snapshot()
+                    everything = snap.all()
+                    self.assertEqual(len(everything), len(snap))
+                    self.assertEqual([ev.ordinal for ev in everything],
+                                     sorted(ev.ordinal for ev in everything))
+                    self.app.search("meeting")
+                except Exception as exc:  # reported after join
+                    errors.append(exc)
+                    return
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for thread in readers:
+            thread.start()
+        for i in range(300):
+            ev = Event(f"2025-12-{i % 28 + 1:02d}", f"Meeting {i}")
+            self.app.add_events([ev])
+            if i % 3 == 0:
+                self.app.remove_event(ev)
+        stop.set()
+        for thread in readers:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.app.search("meeting")), 200)
+
+
+class TestKeywordIndex(unittest.TestCase):
+    def setUp(self):
+        self.storage = FakeStorage([
+            Event("2025-11-20", "Team Meeting", "Office", "Sprint review"),
+            Event("2025-11-18", "Gym", "Club", "Leg day"),
+            Event("2025-11-19", "Family meeting", "Home", "Dinner"),
+            Event("2025-11-18", "Meetup", "Bar", ""),
+        ])
+        self.app = CalendarEventTracker(self.storage, ngram_index=True)
+
+    def titles(self, keyword, mode="prefix"):
+        return [ev.title for ev in self.app.search(keyword, mode)]
+
+    def test_word_prefix_and_substring_modes(self):
+        self.assertEqual(self.titles("meeting", "word"), ["Family meeting", "Team Meeting"])
+        self.assertEqual(self.titles("meet"), ["Meetup", "Family meeting", "Team Meeting"])
+        self.assertEqual(self.titles("team meet"), ["Team Meeting"])
+        self.assertEqual(self.titles("eeting"), [])
+        self.assertEqual(self.titles("eeting", "substring"), ["Family meeting", "Team Meeting"])
+        self.assertEqual(self.titles("ly m", "substring"), ["Family meeting"])
+        self.assertEqual(self.titles("g", "substring"), ["Gym", "Family meeting", "Team Meeting"])
+        with self.assertRaises(ValueError):
+            self.app.search("gym", "fuzzy")
+
+    def test_index_follows_add_edit_and_delete(self):
+        self.assertEqual(self.titles("dinner"), ["Family meeting"])
+
+        with patch("builtins.input", side_effect=["2025-11-17", "Dinner party", "", ""]):
+            self.app.add_event()
+        # Sorted: Dinner party, Gym, Meetup, Family meeting, Team Meeting
+        with patch("builtins.input", side_effect=["3", "", "", "Lunch"]):
+            with redirect_stdout(io.StringIO()):
+                self.app.edit_event()
+        self.assertEqual(self.titles("dinner"), ["Dinner party"])
+        self.assertEqual(self.titles("lunch", "substring"), ["Family meeting"])
+
+        with patch("builtins.input", return_value="0"):
+            with redirect_stdout(io.StringIO()):
+                self.app.delete_event()
+        self.assertEqual(self.titles("dinner"), [])
+
+    def test_substring_without_ngrams_matches_same_events(self):
+        plain = CalendarEventTracker(FakeStorage(self.storage.load()))
+        for needle in ("eeting", "ly m", "g", "review"):
+            with self.subTest(needle=needle):
+                self.assertEqual(
+                    [ev.title for ev in plain.search(needle, "substring")],
+                    self.titles(needle, "substring"),
+                )
+
+
+class TestRecurringEvents(unittest.TestCase):
+    def setUp(self):
+        self.standup = Event("2025-01-06", "Standup", "Office",
+                             repeat=Recurrence("weekly", interval=2, until="2025-03-31"))
+        self.storage = FakeStorage([self.standup, Event("2025-01-20", "Dentist")])
+        self.app = CalendarEventTracker(self.storage)
+
+    def dates(self, events):
+        return [(ev.date, ev.title) for ev in events]
+
+    def test_rules(self):
+        def days(rule, start, first="2025-01-01", last="2030-12-31"):
+            ev = Event(start, "X", repeat=rule)
+            return [o.date for o in ev.occurrences(date_ordinal(first), date_ordinal(last))]
+
+        date_ordinal = tracker_module.date_ordinal
+        self.assertEqual(days(Recurrence("daily", count=3), "2025-01-30"),
+                         ["2025-01-30", "2025-01-31", "2025-02-01"])
+        # Months without a 31st are skipped (and not counted)
+        self.assertEqual(days(Recurrence("monthly", count=4), "2025-01-31"),
+                         ["2025-01-31", "2025-03-31", "2025-05-31", "2025-07-31"])
+        # A window far from the start jumps straight there
+        self.assertEqual(days(Recurrence("monthly", interval=6), "2025-02-28",
+                              "2030-01-01", "2030-12-31"), ["2030-02-28", "2030-08-28"])
+        self.assertEqual(days(Recurrence("weekly", count=2), "2025-01-01", "2025-01-02"),
+                         ["2025-01-08"])
+        for bad in ({"freq": "yearly"}, {"freq": "daily", "interval": 0},
+                    {"freq": "daily", "until": "2025-13-01"}):
+            with self.assertRaises(ValueError):
+                Recurrence.from_dict(bad)
+
+    def test_range_queries_expand_only_the_window(self):
+        self.assertEqual(self.dates(self.app.events_in_range("2025-01-15", "2025-02-05")), [
+            ("2025-01-20", "Dentist"), ("2025-01-20", "Standup"), ("2025-02-03", "Standup"),
+        ])
+        self.assertEqual(len(self.app.events_in_range("2025-01-01", "2025-12-31")), 8)
+        self.assertEqual(self.app.events_on_date("2025-04-14"), [])   # after until
+        # The series itself is one event
+        self.assertEqual(self.dates(self.app.sorted_events()),
+                         [("2025-01-06", "Standup"), ("2025-01-20", "Dentist")])
+        with patch("builtins.input", return_value="2025-02-02"):
+            with redirect_stdout(io.StringIO()) as buf:
+                self.app.weekly_view()
+        self.assertIn("Standup @ Office", buf.getvalue())
+
+    def test_occurrence_edits_are_exceptions(self):
+        moved = self.app.update(self.standup.id + "@2025-02-03", date="2025-02-04", note="Moved")
+        self.assertEqual((moved.date, moved.note), ("2025-02-04", "Moved"))
+        self.assertTrue(self.app.delete(self.standup.id + "@2025-02-17"))
+        self.assertFalse(self.app.delete(self.standup.id + "@2025-02-18"))  # not in the series
+        with self.assertRaises(KeyError):
+            self.app.update(self.standup.id + "@2025-02-17", title="Gone")
+
+        self.assertEqual(self.dates(self.app.events_in_range("2025-02-01", "2025-03-05")),
+                         [("2025-02-04", "Standup"), ("2025-03-03", "Standup")])
+        self.assertEqual(self.app.get_event(moved.id).note, "Moved")
+        # Still one stored record, with the changes as exceptions
+        self.assertEqual(len(self.storage._events), 2)
+        series = self.app.get_event(self.standup.id)
+        self.assertEqual(series.repeat.to_dict()["exceptions"], {
+            "2025-02-03": {"date": "2025-02-04", "note": "Moved"}, "2025-02-17": None,
+        })
+        # Editing the series keeps its rule and exceptions
+        self.app.update(self.standup.id, location="Online")
+        self.assertEqual([ev.location for ev in self.app.events_in_range("2025-02-01",
+                                                                         "2025-03-05")],
+                         ["Online", "Online"])
+
+    def test_storage_roundtrips(self):
+        self.app.delete(self.standup.id + "@2025-01-20")
+        series = self.app.get_event(self.standup.id)
+        with tempfile.TemporaryDirectory() as tmp:
+            for storage in (JSON_File_Storage(os.path.join(tmp, "events.json")),
+                            Journal_Storage(os.path.join(tmp, "journal.json")),
+                            SQLite_Storage(os.path.join(tmp, "events.db")),
+                            Binary_Storage(os.path.join(tmp, "events.bin")),
+                            Sharded_Storage(os.path.join(tmp, "shards"))):
+                with self.subTest(storage=type(storage).__name__):
+                    storage.save(self.app.events)
+                    if isinstance(storage, JSON_File_Storage):
+                        storage = JSON_File_Storage(storage.filename)   # through the cache
+                    loaded = {ev.id: ev for ev in storage.load()}
+                    self.assertEqual(loaded[series.id].repeat, series.repeat)
+                    if hasattr(storage, "query"):
+                        found = storage.query("2025-01-15", "2025-02-05")
+                        self.assertEqual(self.dates(found), [("2025-01-20", "Dentist"),
+                                                             ("2025-02-03", "Standup")])
+                    if hasattr(storage, "close"):
+                        storage.close()
+
+    def test_a_bad_repeat_rule_drops_only_its_event(self):
+        model_module = sys.modules[Event.__module__]
+        with tempfile.TemporaryDirectory() as tmp:
+            for storage in (JSON_File_Storage(os.path.join(tmp, "events.json"), cache=False),
+                            Journal_Storage(os.path.join(tmp, "journal.json")),
+                            SQLite_Storage(os.path.join(tmp, "events.db")),
+                            Binary_Storage(os.path.join(tmp, "events.bin")),
+                            Sharded_Storage(os.path.join(tmp, "shards"))):
+                with self.subTest(storage=type(storage).__name__):
+                    storage.save(self.app.events)
+                    reopened = type(storage)(getattr(storage, "filename", None)
+                                             or storage.dirname)
+                    # "weekly" no longer a valid rule: the stored Standup is broken
+                    with patch.object(model_module, "FREQUENCIES", ("daily", "monthly")), \
+                            redirect_stdout(io.StringIO()) as buf:
+                        loaded = reopened.load()
+                        reopened.save(loaded + [Event("2025-02-01", "New")])
+                    self.assertIn("Warning: skipping bad event", buf.getvalue())
+                    self.assertEqual([ev.title for ev in loaded], ["Dentist"])
+                    if isinstance(storage, (Journal_Storage, SQLite_Storage)):
+                        # Saves (and compaction) leave the record they could not read alone
+                        if isinstance(storage, Journal_Storage):
+                            reopened.compact()
+                        again = type(storage)(storage.filename)
+                        self.assertEqual(sorted(ev.title for ev in again.load()),
+                                         ["Dentist", "New", "Standup"])
+                        reopened = again
+                    for store in (storage, reopened):
+                        if hasattr(store, "close"):
+                            store.close()
+
+    def test_add_command_with_repeat(self):
+        result = run_command(self.app, {"op": "add", "date": "2025-03-01", "title": "Rent",
+                                        "repeat": {"freq": "monthly", "count": 2}})
+        self.assertEqual(result["event"]["repeat"], {"freq": "monthly", "interval": 1,
+                                                     "count": 2})
+        found = run_command(self.app, {"op": "range", "start": "2025-03-02",
+                                       "end": "2025-12-31"})
+        self.assertEqual([ev["title"] for ev in found["events"]].count("Rent"), 1)
+        bad = run_command(self.app, {"op": "add", "date": "2025-03-01", "title": "Rent",
+                                     "repeat": {"freq": "hourly"}})
+        self.assertIn("repeat must be one of", bad["error"])
+        bad = run_command(self.app, {"op": "add", "date": "2025-03-01", "title": "Rent",
+                                     "repeat": {"freq": "monthly", "exceptions": [1]}})
+        self.assertEqual(bad, {"ok": False, "error": "exceptions must be an object"})
+
+    def test_batch_delete_by_date_cancels_one_occurrence(self):
+        lines = [
+            '{"op": "delete", "date": "2025-02-03", "title": "Standup"}',
+            '{"op": "delete", "date": "2025-02-03", "title": "Standup"}',
+            '{"op": "range", "start": "2025-01-27", "end": "2025-02-20"}',
+        ]
+        out = io.StringIO()
+        run_batch(self.app, lines, out)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertTrue(results[0]["ok"])
+        self.assertEqual(results[0]["deleted"]["date"], "2025-02-03")
+        self.assertFalse(results[1]["ok"])   # already cancelled
+        self.assertEqual([e["date"] for e in results[2]["events"]], ["2025-02-17"])
+        self.assertEqual(self.storage.save_call_count, 1)
+        self.assertIsNone(self.storage._events[0].repeat.exceptions["2025-02-03"])
+
+    def test_bad_exceptions_are_rejected(self):
+        for exceptions in ([1], "2025-01-06",
+                           {"2025-01-20": {"date": 20250121}},
+                           {"2025-01-20": {"date": "2025-02-30"}},
+                           {"2025-01-20": {"end_date": "tomorrow"}}):
+            with self.subTest(exceptions=exceptions), self.assertRaises(ValueError):
+                Recurrence.from_dict({"freq": "weekly", "exceptions": exceptions})
+        rule = Recurrence.from_dict({"freq": "weekly", "exceptions": {
+            "2025-01-20": {"date": "2025-01-21", "end_date": "2025-01-22"}}})
+        self.assertEqual(rule.exceptions["2025-01-20"]["date"], "2025-01-21")
+
+
+
+class TestMultiDayEvents(unittest.TestCase):
+    def setUp(self):
+        self.trip = Event("2025-03-08", "Trip", "Tokyo", end_date="2025-03-12")
+        self.storage = FakeStorage([
+            Event("2025-03-01", "Conference", "Paris", end_date="2025-03-03"),
+            self.trip,
+            Event("2025-03-10", "Dentist"),
+        ])
+        self.app = CalendarEventTracker(self.storage)
+
+    def dates(self, events):
+        return [(ev.date, ev.title) for ev in events]
+
+    def test_overlap_and_stabbing_queries(self):
+        self.assertEqual(self.dates(self.app.events_on_date("2025-03-11")),
+                         [("2025-03-08", "Trip")])
+        self.assertEqual(self.dates(self.app.events_in_range("2025-03-03", "2025-03-10")), [
+            ("2025-03-01", "Conference"), ("2025-03-08", "Trip"), ("2025-03-10", "Dentist"),
+        ])
+        self.assertEqual(self.app.events_on_date("2025-03-13"), [])
+        # Still true after changes, which update the span index
+        self.app.update(self.trip.id, end_date="")
+        self.assertEqual(self.app.events_on_date("2025-03-11"), [])
+        self.app.add_events([Event("2025-02-20", "Leave", end_date="2025-03-20")])
+        self.assertEqual(self.dates(self.app.events_on_date("2025-03-11")),
+                         [("2025-02-20", "Leave")])
+
+    def test_span_index_matches_a_scan(self):
+        import random
+        Span_Index = sys.modules[tracker_module.Keyword_Index.__module__].Span_Index
+        rng = random.Random(7)
+        events = []
+        for i in range(300):
+            start = date(2025, 1, 1).toordinal() + rng.randrange(200)
+            end = date.fromordinal(start + rng.randrange(1, 30)).isoformat()
+            events.append(Event(date.fromordinal(start).isoformat(), f"E{i}", end_date=end))
+        index = Span_Index(events)
+        # Edits that keep the start are patched in; the old index is unchanged
+        olds = rng.sample(events, 20)
+        news = [Event(ev.date, ev.title, end_date=date.fromordinal(
+            ev.ordinal + rng.randrange(1, 60)).isoformat()) for ev in olds]
+        edited = index.with_changes(olds, news)
+        self.assertIs(edited._starts, index._starts)
+        self.assertEqual(len(set(map(id, edited.events)) & set(map(id, news))), 20)
+        for day in range(date(2024, 12, 25).toordinal(), date(2025, 8, 15).toordinal(), 3):
+            for idx in (index, edited):
+                expected = [ev for ev in idx.events if ev.ordinal < day <= ev.end_ordinal]
+                self.assertEqual(list(idx.under_way(day)), expected)
+
+    def test_weekly_view_lists_each_day(self):
+        with patch("builtins.input", return_value="2025-03-09"):
+            with redirect_stdout(io.StringIO()) as buf:
+                self.app.weekly_view()
+        out = buf.getvalue()
+        self.assertEqual(out.count("Trip @ Tokyo (2025-03-08 to 2025-03-12)"), 4)
+        self.assertNotIn("Conference", out)
+
+    def test_updates_keep_or_check_the_end(self):
+        moved = self.app.update(self.trip.id, date="2025-04-01")
+        self.assertEqual(moved.end_date, "2025-04-05")   # same length
+        with self.assertRaises(ValueError):
+            self.app.update(self.trip.id, end_date="2025-03-01")
+        with self.assertRaises(ValueError):
+            self.app.update(self.trip.id, end_date="2025-04-31")
+        bad = run_command(self.app, {"op": "add", "date": "2025-03-01", "title": "X",
+                                     "end_date": "2025-02-01"})
+        self.assertIn("end_date", bad["error"])
+
+    def test_storage_roundtrips(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for storage in (JSON_File_Storage(os.path.join(tmp, "events.json")),
+                            Journal_Storage(os.path.join(tmp, "journal.json")),
+                            SQLite_Storage(os.path.join(tmp, "events.db")),
+                            Binary_Storage(os.path.join(tmp, "events.bin")),
+                            Sharded_Storage(os.path.join(tmp, "shards"))):
+                with self.subTest(storage=type(storage).__name__):
+                    storage.save(self.app.events)
+                    if isinstance(storage, JSON_File_Storage):
+                        storage = JSON_File_Storage(storage.filename)   # through the cache
+                    loaded = {ev.id: ev for ev in storage.load()}
+                    self.assertEqual(loaded[self.trip.id].end_date, "2025-03-12")
+                    if hasattr(storage, "query"):
+                        found = storage.query("2025-03-09", "2025-03-10")
+                        self.assertEqual(self.dates(found), [("2025-03-08", "Trip"),
+                                                             ("2025-03-10", "Dentist")])
+                    if hasattr(storage, "close"):
+                        storage.close()
+
+
+class TestShardedStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = os.path.join(self.tmp.name, "events")
+        self.rent = Event("2024-11-05", "Rent", repeat=Recurrence("monthly"))
+        self.trip = Event("2025-01-30", "Trip", "Tokyo", end_date="2025-02-02")
+        Sharded_Storage(self.dir).save([
+            self.rent, self.trip, Event("2025-02-01", "Lunch"),
+            Event("2025-03-03", "Dentist"), Event("2023-06-01", "Old"),
+        ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def inodes(self):
+        return {name: os.stat(os.path.join(self.dir, name)).st_ino
+                for name in os.listdir(self.dir)}
+
+    def test_queries_read_only_the_shards_they_need(self):
+        app = CalendarEventTracker(Sharded_Storage(self.dir))
+        self.assertEqual([(ev.date, ev.title) for ev in app.events_on_date("2025-02-01")],
+                         [("2025-01-30", "Trip"), ("2025-02-01", "Lunch")])
+        with patch("builtins.input", return_value="2025-02-03"):
+            with redirect_stdout(io.StringIO()) as buf:
+                app.weekly_view()
+        self.assertIn("Rent", buf.getvalue())   # 2025-02-05, from the 2024-11 series
+        # The months asked for, the trip's and the series' -- never 2023-06 or 2025-03
+        self.assertEqual(sorted(app._storage._shards), ["2024-11", "2025-01", "2025-02"])
+        self.assertEqual(len(app.events), 5)
+
+    def test_saves_rewrite_only_changed_shards(self):
+        app = CalendarEventTracker(Sharded_Storage(self.dir))
+        before = self.inodes()
+        app.add_events([Event("2025-03-20", "Review")])     # appended, events not loaded
+        app.update(self.trip.id, note="Window seat")
+        app.delete(app.events_on_date("2023-06-01")[0].id)
+        after = self.inodes()
+        changed = {name for name in before if before[name] != after.get(name)}
+        self.assertEqual(changed, {"2023-06.json", "2025-01.json", "2025-03.json",
+                                   "manifest.json"})
+        self.assertNotIn("2023-06.json", after)
+        reloaded = Sharded_Storage(self.dir).query("2025-03-01", "2025-03-31")
+        self.assertIn("Review", [ev.title for ev in reloaded])
+
+class TestRendering(unittest.TestCase):
+    def setUp(self):
+        self.app = CalendarEventTracker(FakeStorage(
+            [Event(f"2025-0{month}-1{day}", f"E{month}{day}", "Office")
+             for month in (1, 2) for day in range(5)]
+        ))
+
+    def test_one_write_per_page_from_offset(self):
+        out = io.StringIO()
+        with patch.object(out, "write", wraps=out.write) as write:
+            shown = render_module.write_events(self.app.iter_sorted(), out, page_size=3, offset=2)
+        self.assertEqual(shown, 8)
+        self.assertEqual(write.call_count, 3)
+        lines = out.getvalue().splitlines()
+        self.assertIn("Idx | Date", lines[1])
+        # Rows keep their index in the whole view
+        self.assertTrue(lines[3].startswith("  2 | 2025-01-12 | E12 "))
+        self.assertTrue(lines[-1].startswith("  9 | 2025-02-14 | E24 "))
+
+    def test_lazy_and_stoppable(self):
+        out = io.StringIO()
+        asked = []
+        shown = render_module.write_events(
+            self.app.iter_sorted("2025-02-01"), out, page_size=2,
+            more=lambda: asked.append(1) or len(asked) < 2,
+        )
+        self.assertEqual((shown, len(asked)), (4, 2))
+        self.assertEqual(render_module.write_events(iter(()), out), 0)
+        self.assertTrue(out.getvalue().endswith("No events.\n\n"))
+
+        # The generator renders only the pages it is asked for
+        rows = iter(self.app.sorted_events())
+        first = next(render_module.pages(rows, page_size=4))
+        self.assertEqual(first.count("| E"), 4)
+        self.assertEqual(next(rows).title, "E14")
+
+    def test_summary_counts_only(self):
+        buf = io.StringIO()
+        with redirect_stdout(buf):
+            self.app.print_events(self.app.iter_sorted(), summary=True)
+        self.assertEqual(buf.getvalue(), "\n10 events\n  2025-01:       5\n  2025-02:       5\n\n")
+
+    def test_menu_views_page_lazily_and_can_summarize(self):
+        app = CalendarEventTracker(FakeStorage(
+            [Event("2025-03-%02d" % (n % 28 + 1), f"E{n}") for n in range(120)]
+        ))
+        # Stopped after the first page: only its rows were taken and returned
+        with patch("builtins.input", return_value="q"):
+            with redirect_stdout(io.StringIO()) as buf:
+                buf.isatty = lambda: True
+                shown = app.list_all_events()
+        self.assertEqual(len(shown), render_module.PAGE_SIZE)
+        self.assertEqual(shown, app.sorted_events()[:len(shown)])
+
+        with patch("builtins.input", side_effect=["2025-02-01", "2025-02-28"]):
+            with redirect_stdout(io.StringIO()) as buf:
+                self.app.toggle_summary_lists()
+                shown = self.app.list_events_in_range()
+        self.assertEqual(len(shown), 5)
+        self.assertIn("5 events\n  2025-02:       5", buf.getvalue())
+        self.assertNotIn("Idx | Date", buf.getvalue())
+
+
+class TestBulkChanges(unittest.TestCase):
+    def setUp(self):
+        self.storage = FakeStorage([
+            Event("2024-03-01", "Standup", "Office"),
+            Event("2024-07-09", "Gym", "Club"),
+            Event("2024-12-31", "Team standup", "office"),
+            Event("2025-01-02", "Standup", "Office"),
+            Event("2025-02-14", "Dinner", "Paris"),
+        ])
+        self.app = CalendarEventTracker(self.storage)
+        self.app.search("standup")  # bulk changes must keep the keyword index right
+
+    def titles(self, events):
+        return [(ev.date, ev.title) for ev in events]
+
+    def test_delete_where_date_range_saves_once(self):
+        with patch.object(self.app, "_swap_out", wraps=self.app._swap_out) as swap_out:
+            deleted = self.app.delete_where("2024-01-01", "2024-12-31")
+        self.assertEqual(self.titles(deleted), [
+            ("2024-03-01", "Standup"), ("2024-07-09", "Gym"), ("2024-12-31", "Team standup"),
+        ])
+        self.assertEqual(swap_out.call_count, 3)
+        self.assertEqual(self.storage.save_call_count, 1)
+        self.assertEqual(sorted(ev.title for ev in self.storage._events), ["Dinner", "Standup"])
+        self.assertEqual(self.titles(self.app.search("standup")), [("2025-01-02", "Standup")])
+        for ev in self.app.sorted_events():
+            self.assertIs(self.app.get_event(ev.id), ev)
+
+    def test_criteria_combine(self):
+        deleted = self.app.delete_where(end_date="2024-12-31", location="OFFICE",
+                                        keyword="standup")
+        self.assertEqual(self.titles(deleted), [("2024-03-01", "Standup"),
+                                                ("2024-12-31", "Team standup")])
+        self.assertEqual(self.app.delete_where(location="Nowhere"), [])
+        self.assertEqual(self.storage.save_call_count, 1)  # nothing matched, no save
+
+    def test_update_where_sets_fields_in_one_save(self):
+        moved = self.app.update_where({"location": "Online"}, keyword="standup")
+        self.assertEqual(len(moved), 3)
+        self.assertEqual(self.storage.save_call_count, 1)
+        self.assertEqual([ev.location for ev in self.app.search("standup")], ["Online"] * 3)
+        # Already set: nothing changes, nothing is saved
+        self.assertEqual(self.app.update_where({"location": "Online"}, keyword="standup"), [])
+        self.assertEqual(self.storage.save_call_count, 1)
+
+        ids = {ev.id for ev in moved}
+        self.app.update_where({"date": "2026-01-05"}, start_date="2025-01-01", location="online")
+        self.assertEqual(self.titles(self.app.sorted_events())[-1], ("2026-01-05", "Standup"))
+        self.assertEqual({ev.id for ev in self.app.search("standup")}, ids)
+
+    def test_bad_criteria_raise(self):
+        with self.assertRaises(ValueError):
+            self.app.delete_where()
+        with self.assertRaises(ValueError):
+            self.app.delete_where(start_date="2024-02-30")
+        with self.assertRaises(ValueError):
+            self.app.update_where({"title": ""}, location="Paris")
+        self.assertEqual(self.storage.save_call_count, 0)
+
+    def test_snapshot_bulk_changes(self):
+        snapshot_module = sys.modules[tracker_module.Snapshot.__module__]
+        with patch.object(snapshot_module, "CHUNK", 4):
+            events = [Event(f"2025-01-{day:02d}", f"E{day}") for day in range(1, 21)]
+            snap = tracker_module.Snapshot.build(events)
+            thinned = snap.with_removed_all(events[::2])
+            self.assertEqual(thinned.all(), events[1::2])
+            self.assertEqual(len(thinned), 10)
+            swim = Event("2025-01-02", "Swim")
+            later = Event("2025-02-01", "E3 later")
+            changed = snap.with_replaced_all([(events[1], swim), (events[2], later)])
+            self.assertEqual([ev.title for ev in changed.all()][:3], ["E1", "Swim", "E4"])
+            self.assertIs(changed.all()[-1], later)
+            self.assertEqual(len(changed), 20)
+
+
+class TestDeferredSaves(unittest.TestCase):
+    def setUp(self):
+        self.storage = FakeStorage()
+        self.app = CalendarEventTracker(self.storage)
+
+    def add(self, date, title):
+        with patch("builtins.input", side_effect=[date, title, "", ""]):
+            with redirect_stdout(io.StringIO()):
+                return self.app.add_event()
+
+    def test_autosave_passes_keyword_arguments(self):
+        class Thing:
+            saved = 0
+
+            def save(self):
+                self.saved += 1
+
+            @autosave
+            def set(self, value=None):
+                self.value = value
+
+        thing = Thing()
+        thing.set(value=3)
+        self.assertEqual((thing.value, thing.saved), (3, 1))
+
+    def test_batch_saves_once(self):
+        with self.app.batch():
+            with self.app.batch():
+                self.add("2025-11-17", "A")
+            self.add("2025-11-18", "B")
+            self.add("2025-02-30", "Bad date")  # returns False: nothing to save
+            self.assertEqual(self.storage.save_call_count, 0)
+        self.assertEqual(self.storage.save_call_count, 1)
+        self.assertEqual(len(self.storage.load()), 2)
+
+    def test_batch_saves_what_happened_before_an_exception(self):
+        with self.assertRaises(RuntimeError):
+            with self.app.batch():
+                self.add("2025-11-17", "A")
+                raise RuntimeError("boom")
+        self.assertEqual(self.storage.save_call_count, 1)
+        self.assertEqual([ev.title for ev in self.storage.load()], ["A"])
+
+    def test_write_behind_coalesces_a_burst(self):
+        self.app.start_write_behind(delay=0.2)
+        try:
+            for day in range(10, 20):
+                self.add(f"2025-11-{day}", f"Event {day}")
+            self.assertEqual(self.storage.save_call_count, 0)
+            deadline = time.monotonic() + 2
+            while self.storage.save_call_count == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(self.storage.save_call_count, 1)
+            self.add("2025-11-20", "Last")
+        finally:
+            self.app.stop_write_behind()
+        # Stopping flushes the change the writer had not saved yet
+        self.assertEqual(self.storage.save_call_count, 2)
+        self.assertEqual(len(self.storage.load()), 11)
+
+    def test_write_behind_on_sqlite(self):
+        # The writer thread saves through a connection opened on this one
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = SQLite_Storage(os.path.join(tmp, "events.db"))
+            self.app = CalendarEventTracker(storage)
+            self.app.events   # loaded, so edits are saved by save() rather than appended
+            self.app.start_write_behind(delay=0.05)
+            try:
+                self.add("2025-11-10", "A")
+                self.add("2025-11-11", "B")
+                deadline = time.monotonic() + 2
+                while self.app._dirty and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.assertFalse(self.app._dirty)
+            finally:
+                self.app.stop_write_behind()
+            reopened = SQLite_Storage(storage.filename)
+            self.assertEqual(sorted(ev.title for ev in reopened.load()), ["A", "B"])
+            reopened.close()
+            storage.close()
+
+
+class TestBulkImport(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.storage = FakeStorage([Event("2025-01-01", "Existing")])
+        self.app = CalendarEventTracker(self.storage)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        return path
+
+    def test_csv_import_commits_once_and_reports_rejects(self):
+        path = self.write("in.csv", (
+            "Date,Title,Location,note\r\n"
+            "2025-11-18,Gym,Club,\r\n"
+            '2025-11-17,Dinner,Home,"two\nlines"\r\n'
+            "2025-02-30,Bad date,,\r\n"
+            "2025-11-19,,Nowhere,\r\n"
+        ))
+        report = bulk_import(self.app, path, workers=1)
+
+        self.assertEqual(report.imported, 2)
+        self.assertEqual([(line, reason) for line, reason, _ in report.rejected],
+                         [(5, "invalid date"), (6, "empty title")])
+        self.assertEqual(self.storage.save_call_count, 1)
+        self.assertEqual(
+            [(ev.title, ev.note) for ev in self.app.sorted_events()],
+            [("Existing", ""), ("Dinner", "two\nlines"), ("Gym", "")],
+        )
+        with open(report.report_filename, newline="", encoding="utf-8") as f:
+            self.assertEqual(len(list(csv.reader(f))), 3)
+
+    def test_jsonl_import_in_process_pool(self):
+        lines = [json.dumps({"date": f"2025-11-{d:02d}", "title": f"E{d}"}) for d in range(1, 31)]
+        lines.insert(5, "{not json}")
+        path = self.write("in.jsonl", "\n".join(lines) + "\n")
+
+        report = bulk_import(self.app, path, workers=2, chunk_size=4)
+
+        self.assertEqual(report.imported, 30)
+        self.assertEqual([line for line, _, _ in report.rejected], [6])
+        self.assertEqual(len(self.app.events), 31)
+        self.assertEqual(self.storage.save_call_count, 1)
+        self.assertEqual([ev.title for ev in self.app.events_on_date("2025-11-30")], ["E30"])
+
+
+class TestBatchCommands(unittest.TestCase):
+    def setUp(self):
+        self.storage = FakeStorage([Event("2025-11-18", "Gym", "Club", "")])
+        self.app = CalendarEventTracker(self.storage)
+
+    def test_batch_runs_commands_and_saves_once(self):
+        lines = [
+            '{"op": "add", "date": "2025-11-19", "title": "Dentist", "ref": 1}',
+            '{"op": "add", "date": "2025-11-20", "title": "Team meeting"}',
+            '',
+            '{"op": "range", "start": "2025-11-18", "end": "2025-11-19"}',
+            '{"op": "search", "keyword": "meet"}',
+            '{"op": "delete", "date": "2025-11-18", "title": "Gym"}',
+            '{"op": "list", "limit": 1}',
+        ]
+        out = io.StringIO()
+        self.assertEqual(run_batch(self.app, lines, out), 6)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+
+        self.assertTrue(all(r["ok"] for r in results))
+        self.assertEqual(results[0]["ref"], 1)
+        self.assertEqual([e["title"] for e in results[2]["events"]], ["Gym", "Dentist"])
+        self.assertEqual([e["title"] for e in results[3]["events"]], ["Team meeting"])
+        self.assertEqual(results[5]["count"], 2)
+        self.assertEqual(len(results[5]["events"]), 1)
+        self.assertEqual(self.storage.save_call_count, 1)
+        # Deleting moves the last event into the gap, so compare unordered
+        self.assertEqual(sorted(ev.title for ev in self.storage._events), ["Dentist", "Team meeting"])
+
+    def test_update_and_delete_by_id(self):
+        gym_id = self.app.sorted_events()[0].id
+        result = run_command(self.app, {"op": "update", "id": gym_id, "title": "Swim"})
+        self.assertEqual(result["event"], {"date": "2025-11-18", "title": "Swim",
+                                           "location": "Club", "note": "", "id": gym_id})
+        self.assertEqual(run_command(self.app, {"op": "delete", "id": gym_id})["deleted"]["title"],
+                         "Swim")
+        self.assertIn("no event", run_command(self.app, {"op": "delete", "id": gym_id})["error"])
+        self.assertIn("no event", run_command(self.app, {"op": "update", "id": "x", "note": ""})["error"])
+
+    def test_bulk_delete_and_update(self):
+        self.app.add_events([Event("2025-11-19", "Gym", "Club", ""),
+                             Event("2025-11-20", "Lunch", "Cafe", "")])
+        result = run_command(self.app, {"op": "update_where", "location": "club",
+                                        "set": {"note": "Legs"}, "limit": 1})
+        self.assertEqual((result["count"], len(result["events"])), (2, 1))
+        result = run_command(self.app, {"op": "delete_where", "start": "2025-11-19",
+                                        "keyword": "gym"})
+        self.assertEqual([ev["note"] for ev in result["events"]], ["Legs"])
+        self.assertEqual([ev.title for ev in self.app.sorted_events()], ["Gym", "Lunch"])
+        self.assertIn("at least one", run_command(self.app, {"op": "delete_where"})["error"])
+
+    def test_search_limit_keeps_the_total_count(self):
+        self.app.add_events([Event(f"2025-11-{d}", "Gym", "Club", "") for d in (25, 19, 22)])
+        result = run_command(self.app, {"op": "search", "keyword": "gym", "limit": 2})
+        self.assertEqual(result["count"], 4)
+        self.assertEqual([ev["date"] for ev in result["events"]], ["2025-11-18", "2025-11-19"])
+
+    def test_export_to_an_unwritable_path_is_an_error_result(self):
+        out = io.StringIO()
+        lines = ['{"op": "export", "filename": "/nonexistent/dir/x.csv"}', '{"op": "list"}']
+        self.assertEqual(run_batch(self.app, lines, out), 2)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertFalse(results[0]["ok"])
+        self.assertIn("cannot export", results[0]["error"])
+        self.assertTrue(results[1]["ok"])
+        self.assertIn("set must be", run_command(self.app, {"op": "update_where",
+                                                            "keyword": "gym"})["error"])
+
+    def test_bad_commands_report_errors(self):
+        for cmd, error in [
+            ({"op": "add", "date": "2025-02-30", "title": "x"}, "invalid date"),
+            ({"op": "add", "date": "2025-02-03"}, "missing field: title"),
+            ({"op": "delete", "date": "2025-11-18", "title": "Nope"}, "no event"),
+            ({"op": "search", "keyword": "gym", "mode": "fuzzy"}, "unknown search mode"),
+            ({"op": "fly"}, "unknown op"),
+            ([1, 2], "JSON object"),
+        ]:
+            with self.subTest(cmd=cmd):
+                result = run_command(self.app, cmd)
+                self.assertFalse(result["ok"])
+                self.assertIn(error, result["error"])
+        self.assertEqual(self.storage.save_call_count, 0)
+
+
+class TestEventServer(unittest.TestCase):
+    def test_clients_share_one_calendar(self):
+        storage = FakeStorage([Event("2025-11-18", "Gym")])
+        app = CalendarEventTracker(storage)
+
+        async def scenario():
+            server = Event_Server(app, port=0)
+            await server.start()
+            try:
+                report = await run_load(port=server.port, clients=5, requests=40, write_ratio=0.5)
+                reader, writer = await asyncio.open_connection(server.host, server.port)
+                writer.write(b'{"op": "list", "date": "2025-11-18", "ref": "a"}\nnot json\n')
+                replies = [json.loads(await reader.readline()) for _ in range(2)]
+                writer.close()
+                await writer.wait_closed()
+            finally:
+                await server.close()
+            return report, replies
+
+        report, replies = asyncio.run(scenario())
+        self.assertEqual(report["requests"], 200)
+        self.assertEqual(report["errors"], 0)
+        self.assertLessEqual(report["p50_ms"], report["p99_ms"])
+        self.assertEqual(replies[0]["ref"], "a")
+        self.assertIn("Gym", [e["title"] for e in replies[0]["events"]])
+        self.assertFalse(replies[1]["ok"])
+        # Writes were saved in groups, not one save per add
+        added = len(storage._events) - 1
+        self.assertGreater(added, 0)
+        self.assertLessEqual(storage.save_call_count, added)
+
+    def test_failing_reads_get_a_reply_and_export_is_refused(self):
+        app = CalendarEventTracker(FakeStorage([Event("2025-11-18", "Gym")]))
+
+        async def scenario():
+            server = Event_Server(app, port=0)
+            await server.start()
+            try:
+                reader, writer = await asyncio.open_connection(server.host, server.port)
+                with patch.object(app, "sorted_events", side_effect=OSError("disk gone")):
+                    writer.write(b'{"op": "list"}\n')
+                    replies = [json.loads(await reader.readline())]
+                writer.write(b'{"op": "export", "filename": "/nonexistent/x.csv"}\n'
+                             b'{"op": "list"}\n')
+                replies += [json.loads(await reader.readline()) for _ in range(2)]
+                writer.close()
+                await writer.wait_closed()
+            finally:
+                await server.close()
+            return replies
+
+        failed, export, listed = asyncio.run(scenario())
+        self.assertFalse(failed["ok"])
+        self.assertIn("disk gone", failed["error"])
+        self.assertEqual(export, {"ok": False, "error": "unknown op: 'export'"})
+        self.assertEqual(listed["count"], 1)   # the connection is still served
+
+
 class TestExportAndWeeklyView(unittest.TestCase):
     def setUp(self):
         self.storage = FakeStorage()
@@ -282,6 +1668,54 @@ class TestExportAndWeeklyView(unittest.TestCase):
         finally:
             os.remove(path)
 
+    def test_external_sort_export_matches_in_memory_order(self):
+        events = [
+            Event(f"2025-11-{(i * 7) % 5 + 10}", f"Event {i}", "Place, with comma", "")
+            for i in range(20)
+        ]
+        expected = sorted(events, key=lambda ev: ev.date)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "out.csv")
+            # run_size=3 forces several spilled runs to be merged
+            count = export_events_csv(iter(events), path, run_size=3, tmp_dir=tmp)
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = list(csv.reader(f))
+            self.assertEqual(sorted(os.listdir(tmp)), ["out.csv"])
+
+        self.assertEqual(count, 20)
+        self.assertEqual(rows[0], ["Date", "Title", "Location", "note"])
+        self.assertEqual([row[1] for row in rows[1:]], [ev.title for ev in expected])
+
+    def test_streaming_export_reads_from_storage(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = JSON_File_Storage(os.path.join(tmp, "events.json"))
+            storage.save([
+                Event("2025-11-19", "Event 2", "Place 2", "Note 2"),
+                Event("2025-11-18", "Event 1", "Place 1", "Note 1"),
+            ])
+            app = CalendarEventTracker(storage)
+            path = os.path.join(tmp, "out.csv")
+            with redirect_stdout(io.StringIO()):
+                with patch.object(storage, "load", side_effect=AssertionError("loaded")):
+                    app.export_to_csv(path, streaming=True)
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = list(csv.reader(f))
+        self.assertEqual([row[1] for row in rows[1:]], ["Event 1", "Event 2"])
+
+    def test_empty_streaming_export_leaves_an_existing_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = CalendarEventTracker(JSON_File_Storage(os.path.join(tmp, "events.json")))
+            path = os.path.join(tmp, "out.csv")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("mine\n")
+            with redirect_stdout(io.StringIO()) as buf:
+                app.export_to_csv(path, streaming=True)
+            self.assertIn("No events", buf.getvalue())
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), "mine\n")
+            self.assertNotIn("out.csv.tmp", os.listdir(tmp))
+
     def test_weekly_view_does_not_crash(self):
         # Two events inside the week, one outside
         self.app.events = [
@@ -302,5 +1736,70 @@ class TestExportAndWeeklyView(unittest.TestCase):
         self.assertNotIn("Outside", out)
 
 
+class TestBenchmark(unittest.TestCase):
+    def test_generator_is_seeded_and_skewed(self):
+        events = synthetic_events(2000, seed=7)
+        self.assertEqual([ev.to_dict() for ev in events],
+                         [ev.to_dict() for ev in synthetic_events(2000, seed=7)])
+        self.assertTrue(all(ev.ordinal > 0 for ev in events))
+        weekend = sum(date.fromisoformat(ev.date).weekday() >= 5 for ev in events)
+        self.assertLess(weekend, len(events) * 2 / 7)
+
+    def test_report_is_json_with_every_operation(self):
+        report = json.loads(json.dumps(run_benchmarks([200], repeat=1, commands=200)))
+        ops = {r["op"] for r in report["results"]}
+        self.assertEqual(ops, {"storage.save", "storage.load", "storage.load_json",
+                               "list_all_events",
+                               "list_events_in_range", "search_events", "weekly_view",
+                               "export_to_csv", "batch_commands"})
+        for r in report["results"]:
+            self.assertEqual(r["events"], 200)
+            self.assertGreaterEqual(r["seconds"], 0)
+            self.assertGreater(r["peak_bytes"], 0)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        path = os.path.join(self.tmp.name, "events.json")
+        JSON_File_Storage(path).save([Event("2025-01-0%d" % d, f"Event {d}") for d in range(1, 6)])
+        self.app = CalendarEventTracker(JSON_File_Storage(path))
+
+    def test_disabled_by_default(self):
+        self.app.events_in_range("2025-01-01", "2025-01-31")
+        self.assertIsNone(self.app.metrics)
+        self.assertEqual(self.app.stats(), {})
+
+    def test_records_tracker_and_storage_calls(self):
+        self.app.enable_metrics()
+        self.app.events_in_range("2025-01-02", "2025-01-03")
+        self.app.add_events([Event("2025-02-01", "New")])
+        stats = self.app.stats()
+        ops = stats["ops"]
+
+        query = ops["CalendarEventTracker.events_in_range"]
+        self.assertEqual(query["calls"], 1)
+        self.assertEqual(query["events_scanned"], 2)
+        self.assertEqual(sum(query["histogram"].values()), 1)
+        # Storage counters also count towards the operation that saved
+        written = ops["JSON_File_Storage.save"]["bytes_written"]
+        self.assertGreater(written, 0)
+        self.assertEqual(ops["CalendarEventTracker.add_events"]["bytes_written"], written)
+        self.assertEqual(stats["totals"]["bytes_written"], written)
+        json.dumps(stats)
+
+    def test_periodic_dump_and_disable(self):
+        dump = os.path.join(self.tmp.name, "metrics.jsonl")
+        self.app.enable_metrics(dump_to=dump, dump_every=60)
+        self.app.sorted_events()
+        self.app.disable_metrics()  # writes a final line
+        with open(dump, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(lines[-1]["ops"]["CalendarEventTracker.sorted_events"]["calls"], 1)
+        self.assertIsNone(self.app._storage.metrics)
+        self.assertEqual(self.app.stats(), {})
+
+
 if __name__ == "__main__":
     unittest.main()
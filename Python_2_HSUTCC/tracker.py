@@ -1,27 +1,422 @@
 # tracker.py
 # contains validation, menu, add/list/edit/delete, and weekly_view functions.
-from datetime import datetime, timedelta
-from typing import List
-import csv
+# csv, datetime, export and numpy are imported where they are used, so
+# starting the program doesn't wait for modules most sessions never need
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import sys
+import threading
 
-from model import Event
-from storage import Event_Storage
-from decorators import autosave
+from model import (DAYS_BEFORE_MONTH, LAST_DATE, MONTH_DAYS, OCCURRENCE_MARK, Event,
+                   date_ordinal, new_event_id, ordinal_date)
+from storage import Event_Storage, Queryable_Storage
+from decorators import Deferred_Saves, Metrics_Registry, add_count, autosave, instrumented
+from index import Keyword_Index, tokenize
+from snapshot import Snapshot
+from render import PAGE_SIZE, recorded, summarize, write_events
 
 LINE = "_" * 60
 MENU_MIN = 1
-MENU_MAX = 11
+MENU_MAX = 12
+EDITABLE_FIELDS = frozenset({"date", "title", "location", "note", "end_date"})
 
-class CalendarEventTracker:
-    """Main application class for managing events."""
+np = None            # numpy, once _numpy() has imported it (None if missing)
+_np_checked = False
 
-    def __init__(self, storage: Event_Storage):
+
+def _numpy():
+    """numpy if it is installed (optional: validate_dates falls back to
+    plain Python). Imported on first use, since it is slow to import."""
+    global np, _np_checked
+    if not _np_checked:
+        _np_checked = True
+        try:
+            import numpy
+        except ImportError:
+            return None
+        np = numpy
+    return np
+
+
+def _ask_more() -> bool:
+    return input("-- Enter for more, q to stop: ").strip().lower() != "q"
+
+
+class CalendarEventTracker(Deferred_Saves):
+    """Main application class for managing events.
+
+    Mutations save through @autosave; use `with tracker.batch():` or
+    tracker.start_write_behind() to save less often (see Deferred_Saves).
+
+    Queries read an immutable Snapshot of the calendar, so they take no
+    lock and are safe from any number of threads, even while a save
+    runs. Mutations (and saves) run one at a time under _save_lock; each
+    builds the next snapshot and publishes it with one assignment.
+
+    Events are also indexed by Event.id (id -> position in the events
+    list), so get_event/delete/update by id take O(1) and need no sorted
+    view; deleting moves the last event into the gap.
+
+    A recurring event (Event.repeat) is one event in the list. Date
+    queries return its occurrences in their window instead, and
+    delete/update of an occurrence id store an exception in the series.
+
+    enable_metrics() times every operation and storage call; see stats().
+    """
+    metrics = None   # Metrics_Registry, shared with the storage, while enabled
+    summary_lists = False   # list views print counts per month instead (menu 12)
+
+    def __init__(self, storage: Event_Storage, ngram_index: bool = False):
         self._storage = storage
-        self.events: List[Event] = self._storage.load()
+        self._ngram_index = ngram_index
+        self._save_lock = threading.RLock()
+        self._snapshot = Snapshot()
+        self._appends: List[Event] = []   # added in pushdown mode, not yet appended
+        if isinstance(storage, Queryable_Storage):
+            # Leave the events in the backend until something needs them all
+            self._events = None
+        else:
+            self.events = self._storage.load()
+
+    @property
+    def events(self) -> List[Event]:
+        if self._events is None:
+            self._write_appends()
+            self.events = self._storage.load()
+        return self._events
+
+    @events.setter
+    def events(self, events: List[Event]) -> None:
+        # Replacing the whole list (load, tests) means re-indexing it.
+        # The keyword index is built on the first search.
+        with self._save_lock:
+            self._events: List[Event] = list(events)
+            self._index_ids()
+            self._publish(Snapshot.build(self._events, self._snapshot.version + 1))
+
+    def _index_ids(self) -> None:
+        """Map every event id to its position in _events. An id that is
+        already taken (say, an event copied by hand in the file) is
+        replaced with a new one."""
+        positions = {}
+        events = self._events
+        for i, ev in enumerate(events):
+            other = positions.get(ev.id)
+            if other is not None and events[other] is not ev:
+                ev.id = new_event_id()
+            positions[ev.id] = i
+        self._pos = positions
+
+    def _find_id(self, event_id: str) -> Optional[int]:
+        """Position of the event with this id in _events, or None."""
+        events = self._events
+        pos = self._pos.get(event_id)
+        if pos is not None and pos < len(events) and events[pos].id == event_id:
+            return pos
+        if pos is not None or len(self._pos) != len(events):
+            # The list was changed behind the tracker's back: index it again
+            with self._save_lock:
+                self._index_ids()
+                pos = self._pos.get(event_id)
+        return pos
+
+    def snapshot(self) -> Snapshot:
+        """The current version of the calendar, for lock-free reads.
+
+        Queries on one snapshot all see the same calendar, whatever is
+        written meanwhile. If the events list was changed behind the
+        tracker's back the snapshot is rebuilt first, unless a writer is
+        busy (it will publish a fresh one anyway).
+        """
+        snap = self._snapshot
+        if len(snap) != len(self.events) and self._save_lock.acquire(blocking=False):
+            try:
+                snap = self._snapshot
+                if len(snap) != len(self._events):
+                    snap = self._publish(Snapshot.build(self._events, snap.version + 1))
+            finally:
+                self._save_lock.release()
+        return snap
+
+    def _searchable(self) -> Snapshot:
+        """Snapshot with a keyword index (built once, on the first search)."""
+        snap = self.snapshot()
+        if snap.keywords is None:
+            with self._save_lock:
+                snap = self.snapshot()
+                if snap.keywords is None:
+                    keywords = Keyword_Index(self._events, ngrams=self._ngram_index)
+                    snap = self._publish(snap.with_keywords(keywords))
+        return snap
+
+    def _publish(self, snap: Snapshot) -> Snapshot:
+        keywords = snap.keywords
+        if keywords is not None and keywords.dead > max(len(keywords), 1000):
+            # Old snapshots keep the old index; new ones drop its tombstones
+            snap = snap.with_keywords(keywords.compacted())
+        self._snapshot = snap
+        return snap
+
+    def load_all(self) -> List[Event]:
+        """The events, loaded from storage first if queries were still
+        pushed down to it."""
+        return self.events
+
+    @property
+    def _pushdown(self) -> bool:
+        """True while queries still go straight to a Queryable_Storage."""
+        return self._events is None
+
+    def _append(self, events: List[Event]) -> None:
+        """Add events in pushdown mode. They reach storage.append with
+        the save (so a batch or the write-behind thread appends them all
+        at once), or before the storage is next queried."""
+        with self._save_lock:
+            self._appends.extend(events)
+
+    def _write_appends(self) -> None:
+        with self._save_lock:
+            if self._appends:
+                self._storage.append(self._appends)
+                self._appends = []
+
+    def _queryable(self) -> Queryable_Storage:
+        """The storage, once it has every event added so far."""
+        self._write_appends()
+        return self._storage
 
     # internal helper used by decorator
+    @instrumented
     def save(self) -> None:
+        if self._pushdown:
+            # Nothing loaded, so nothing edited; new events go via append()
+            self._write_appends()
+            return
         self._storage.save(self.events)
+        if self._storage.changed():
+            # The storage merged in another process's changes; pick them up
+            self.events = self._storage.load()
+
+    @instrumented
+    def refresh(self) -> bool:
+        """Reload if another process changed the stored calendar (after
+        saving, i.e. merging, anything still pending). Cheap when nothing
+        changed. Returns True if the events were reloaded."""
+        if self._pushdown or not self._storage.changed():
+            return False
+        with self._save_lock:
+            self.flush()
+            if self._storage.changed():
+                self.events = self._storage.load()
+        return True
+
+    # Metrics
+
+    def enable_metrics(self, dump_to: Optional[str] = None,
+                       dump_every: float = 60.0) -> Metrics_Registry:
+        """Start recording calls, latencies and counters for the tracker
+        and its storage. With dump_to, stats() is also appended to that
+        file as a JSON line every dump_every seconds."""
+        if self.metrics is None:
+            self.metrics = Metrics_Registry()
+            self._storage.metrics = self.metrics
+        if dump_to is not None:
+            self.metrics.start_dump(dump_to, dump_every)
+        return self.metrics
+
+    def disable_metrics(self) -> None:
+        """Stop recording (and dumping). What was recorded is dropped."""
+        metrics = self.metrics
+        if metrics is None:
+            return
+        self.metrics = None
+        self._storage.metrics = None
+        metrics.stop_dump()
+
+    def stats(self) -> dict:
+        """Per-operation calls, latency histogram and counters recorded
+        since enable_metrics() (see Metrics_Registry.stats); {} if off."""
+        if self.metrics is None:
+            return {}
+        return self.metrics.stats()
+
+    def _insert(self, ev: Event) -> None:
+        if self._pushdown:
+            self._append([ev])
+            return
+        with self._save_lock:
+            snap = self.snapshot()
+            self._pos[ev.id] = len(self._events)
+            self._events.append(ev)
+            if snap.keywords is not None:
+                snap.keywords.add(ev)
+            self._publish(snap.with_added([ev]))
+
+    def _remove(self, target: Event) -> bool:
+        """Drop this exact event object from the list and the indexes."""
+        with self._save_lock:
+            pos = self._find_id(target.id)
+            if pos is None or self._events[pos] is not target:
+                return False
+            self._delete_at(pos)
+            return True
+
+    def _delete_at(self, pos: int) -> Event:
+        with self._save_lock:
+            snap = self.snapshot()
+            target = self._swap_out(pos, snap)
+            self._publish(snap.with_removed(target))
+            return target
+
+    def _swap_out(self, pos: int, snap: Snapshot) -> Event:
+        # Fill the gap with the last event instead of shifting the rest
+        events = self._events
+        target = events[pos]
+        last = events.pop()
+        del self._pos[target.id]
+        if last is not target:
+            events[pos] = last
+            self._pos[last.id] = pos
+        add_count(self, "events_scanned", 1)
+        if snap.keywords is not None:
+            snap.keywords.remove(target)
+        return target
+
+    def _replace(self, old: Event, new: Event) -> None:
+        """Put new in old's place. Edits go through here rather than
+        changing old, which readers of older snapshots may still hold."""
+        with self._save_lock:
+            snap = self.snapshot()
+            pos = self._find_id(old.id)
+            if pos is None or self._events[pos] is not old:
+                raise ValueError("event is not in the calendar")
+            self._events[pos] = new
+            if new.id != old.id:
+                del self._pos[old.id]
+                self._pos[new.id] = pos
+            if snap.keywords is not None:
+                snap.keywords.replace(old, new)
+            self._publish(snap.with_replaced(old, new))
+
+    @staticmethod
+    def _edited(old: Event, **fields: str) -> Event:
+        """A copy of old (same id) with some fields changed. A multi-day
+        event that moves keeps its length unless end_date is given too
+        ("" makes it a one-day event). Raises ValueError if the end
+        would come before the start."""
+        date = fields.get("date", old.date)
+        ordinal = old.ordinal if date == old.date else date_ordinal(date)
+        if "end_date" in fields:
+            end = fields["end_date"] or None
+            if end is not None and date_ordinal(end) < ordinal:
+                raise ValueError(f"end date {end} is before the start {date}")
+        elif old.end_date is not None and ordinal != old.ordinal:
+            end = ordinal_date(ordinal + old.end_ordinal - old.ordinal)
+        else:
+            end = old.end_date
+        return Event(
+            date,
+            fields.get("title", old.title),
+            fields.get("location", old.location),
+            fields.get("note", old.note),
+            ordinal=ordinal,
+            id=old.id,
+            repeat=old.repeat,
+            end_date=end,
+        )
+
+    @staticmethod
+    def _with_exception(series: Event, date: str, fields: Optional[dict]) -> Event:
+        """A copy of series where the occurrence on date is cancelled
+        (fields None) or has these fields changed."""
+        return Event(series.date, series.title, series.location, series.note,
+                     series.ordinal, series.id, series.repeat.with_exception(date, fields),
+                     series.end_date)
+
+    # Queries (no input/print, used by the menu views)
+
+    @instrumented
+    def sorted_events(self) -> List[Event]:
+        """All events ordered by date."""
+        if self._pushdown:
+            return self._queryable().query()
+        return self._scanned(self.snapshot().all())
+
+    def iter_sorted(self, start_date: Optional[str] = None,
+                    end_date: Optional[str] = None) -> Iterator[Event]:
+        """Events by date (between the dates, if given) one at a time,
+        for print_events to render lazily. Reads one snapshot, so
+        changes made while iterating are not seen."""
+        if self._pushdown:
+            return iter(self._queryable().query(start_date=start_date, end_date=end_date))
+        snap = self.snapshot()
+        if start_date is None and end_date is None:
+            return snap.iter_all()
+        return snap.iter_days(date_ordinal(start_date or "0001-01-01"),
+                              date_ordinal(end_date or LAST_DATE))
+
+    @instrumented
+    def events_on_date(self, date: str) -> List[Event]:
+        if self._pushdown:
+            return self._queryable().query(start_date=date, end_date=date)
+        return self._scanned(self.snapshot().on_date(date))
+
+    @instrumented
+    def events_in_range(self, start_date: str, end_date: str) -> List[Event]:
+        """Events on any day between start_date and end_date (inclusive),
+        multi-day events included, sorted by start date."""
+        if self._pushdown:
+            return self._queryable().query(start_date=start_date, end_date=end_date)
+        return self._scanned(self.snapshot().in_range(start_date, end_date))
+
+    @instrumented
+    def events_in_days(self, first: int, last: int) -> List[Event]:
+        """Like events_in_range, with the dates given as day ordinals."""
+        if self._pushdown:
+            from datetime import date
+            return self._queryable().query(start_date=date.fromordinal(first).isoformat(),
+                                       end_date=date.fromordinal(last).isoformat())
+        return self._scanned(self.snapshot().in_days(first, last))
+
+    @instrumented
+    def search(self, keyword: str, mode: str = "prefix") -> List[Event]:
+        """Events matching keyword in title or note, date-sorted.
+
+        mode is "prefix", "word" or "substring"; see Keyword_Index.search.
+        Substring search uses a trigram index if the tracker was created
+        with ngram_index=True, otherwise it checks every event.
+        """
+        return self.search_page(keyword, mode)[1]
+
+    @instrumented
+    def search_page(self, keyword: str, mode: str = "prefix",
+                    limit: Optional[int] = None) -> Tuple[int, List[Event]]:
+        """(number of matches, the first limit of them) for search(),
+        without sorting the matches past limit."""
+        if self._pushdown:
+            if mode == "substring":
+                found = self._queryable().query(keyword=keyword)
+                return len(found), found if limit is None else found[:limit]
+            # A word/prefix hit always contains its longest term as a
+            # substring, so let the backend narrow it down first
+            terms = tokenize(keyword)
+            if not terms:
+                return 0, []
+            candidates = Keyword_Index(
+                self._queryable().query(keyword=max(terms, key=len)), ngrams=False
+            )
+            return candidates.search_page(keyword, mode, limit=limit)
+        snap = self._searchable()
+        total, found = snap.search_page(keyword, mode, limit)
+        if mode == "substring" and not self._ngram_index:
+            add_count(self, "events_scanned", len(snap))  # checked them all
+        else:
+            add_count(self, "events_scanned", total)
+        return total, found
+
+    def _scanned(self, events: List[Event]) -> List[Event]:
+        # Index lookups only look at the events they return
+        add_count(self, "events_scanned", len(events))
+        return events
 
     # Date Validation
     
@@ -71,10 +466,85 @@ class CalendarEventTracker:
         
         return True
     
+    @classmethod
+    def day_ordinal(cls, year: int, month: int, day: int) -> int:
+        """Day number of a valid date, same as date(year, month, day).toordinal()."""
+        y = year - 1
+        days = y * 365 + y // 4 - y // 100 + y // 400
+        days += DAYS_BEFORE_MONTH[month]
+        if month > 2 and cls.is_leap_year(year):
+            days += 1
+        return days + day
+    
+    @classmethod
+    def validate_dates(cls, dates: Sequence[str]) -> Tuple[Sequence[bool], Sequence[int]]:
+        """Validate many YYYY-MM-DD strings in one pass.
+        
+        Returns (valid, ordinals): valid[i] == is_valid_date(dates[i]) and
+        ordinals[i] is the day_ordinal of dates[i] (0 where invalid).
+        With NumPy installed both are arrays computed column-wise;
+        without it they are lists.
+        """
+        if _numpy() is None:
+            valid, ordinals = [], []
+            for text in dates:
+                ok = cls.is_valid_date(text)
+                valid.append(ok)
+                ordinals.append(
+                    cls.day_ordinal(int(text[:4]), int(text[5:7]), int(text[8:])) if ok else 0
+                )
+            return valid, ordinals
+        return cls._validate_dates_numpy(dates)
+    
+    @classmethod
+    def _validate_dates_numpy(cls, dates):
+        # One row of 10 ASCII codes per date. Anything that is not 10
+        # ASCII characters is blanked, so it fails the checks below.
+        if isinstance(dates, np.ndarray):
+            dates = dates.tolist()
+        count = len(dates)
+        if count == 0:
+            return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64)
+        blank = "          "
+        text = "".join(d if len(d) == 10 and d.isascii() else blank for d in dates)
+        raw = np.frombuffer(text.encode("ascii"), dtype=np.uint8).reshape(count, 10)
+        digits = raw.astype(np.int64) - ord("0")
+        
+        digit_cols = [0, 1, 2, 3, 5, 6, 8, 9]
+        valid = ((digits[:, digit_cols] >= 0) & (digits[:, digit_cols] <= 9)).all(axis=1)
+        valid &= (raw[:, 4] == ord("-")) & (raw[:, 7] == ord("-"))
+        
+        year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+        month = digits[:, 5] * 10 + digits[:, 6]
+        day = digits[:, 8] * 10 + digits[:, 9]
+        valid &= (year >= 1) & (month >= 1) & (month <= 12)
+        
+        # Same rule as is_leap_year
+        leap = (year % 400 == 0) | ((year % 4 == 0) & (year % 100 != 0))
+        month = np.where(valid, month, 1)  # keep table lookups in range
+        max_day = np.asarray(MONTH_DAYS)[month] + ((month == 2) & leap)
+        valid &= (day >= 1) & (day <= max_day)
+        
+        y = year - 1
+        ordinals = (y * 365 + y // 4 - y // 100 + y // 400
+                    + np.asarray(DAYS_BEFORE_MONTH)[month] + ((month > 2) & leap) + day)
+        ordinals = np.where(valid, ordinals, 0)
+        
+        # isdigit() also accepts non-ASCII digits; those rare rows take
+        # the scalar path so the result always matches is_valid_date
+        if "".join(dates).isascii():
+            return valid, ordinals
+        for i, d in enumerate(dates):
+            if len(d) == 10 and not d.isascii() and cls.is_valid_date(d):
+                valid[i] = True
+                ordinals[i] = cls.day_ordinal(int(d[:4]), int(d[5:7]), int(d[8:]))
+        return valid, ordinals
+    
     # UI and Menu
     def run(self) -> None:
         """Main loop"""
         while True:
+            self.refresh()
             self.menu_banner()
             choice = self.read_menu_choice()
             if choice == 0:
@@ -91,6 +561,7 @@ class CalendarEventTracker:
             elif choice == 5:
                 self.delete_event()
             elif choice == 6:
+                from datetime import datetime
                 today = datetime.today().strftime("%Y-%m-%d")
                 print(f"\nToday's date is: {today}\n")
             elif choice == 7:
@@ -102,8 +573,12 @@ class CalendarEventTracker:
             elif choice == 10:
                 self.weekly_view()
             elif choice == 11:
+                self.stop_write_behind()
+                self.flush()
                 print("Goodbye!")
                 break
+            elif choice == 12:
+                self.toggle_summary_lists()
     @staticmethod
     def menu_banner() -> None:
         """Print the main menu."""
@@ -121,6 +596,7 @@ class CalendarEventTracker:
         print("9. Export all events to CSV")
         print("10. Weekly view (7- day range)")
         print("11. Goodbye!")
+        print("12. Lists: switch between table and counts per month")
         print(LINE)
     
     @staticmethod
@@ -139,28 +615,33 @@ class CalendarEventTracker:
     # Presentation to make the program look good.
     
     @staticmethod
-    def print_events(view: List[Event]) -> None:
-        if len(view) == 0:
-            print("\nNo events.\n")
-            return
-        
-        print("\nIdx | Date       | Title                   | Location           | Note")
-        print("-" * 60)
-        
-        for index, ev in enumerate(view):
-            date = ev.date or ""
-            title = (ev.title or "")[:23]
-            location = (ev.location or "")[:18]
-            note = (ev.note or "")[:40]
-
-            print(
-                f"{index:>3} | "
-                f"{date} | "
-                f"{title:<23} | "
-                f"{location:<18} | "
-                f"{note:<40}"
-            )
-    
+    def print_events(view: Iterable[Event], page_size: int = PAGE_SIZE, offset: int = 0,
+                     summary: bool = False) -> int:
+        """Print view as a table (or with summary=True, only its counts
+        per month), a page_size-row page per write, from row offset on.
+        In a terminal, asks before each further page. Returns the number
+        of rows printed."""
+        if summary:
+            sys.stdout.write(summarize(view))
+            return 0
+        return write_events(view, page_size=page_size, offset=offset,
+                            more=_ask_more if sys.stdout.isatty() else None)
+
+    def _print_view(self, view: Iterable[Event]) -> List[Event]:
+        """print_events for a menu view (as a summary if summary_lists
+        is on). Returns the events it printed; rows are only taken
+        from view as their page is printed."""
+        shown: List[Event] = []
+        self.print_events(recorded(view, shown), summary=self.summary_lists)
+        # A backend that answers queries counts what it scanned itself
+        return shown if self._pushdown else self._scanned(shown)
+
+    def toggle_summary_lists(self) -> None:
+        self.summary_lists = not self.summary_lists
+        shown = "counts per month" if self.summary_lists else "every event"
+        print(f"\nLists now show {shown}.\n")
+
+    @instrumented
     @autosave
     def add_event(self) -> None:
         print("\n --- Add Event ---\n")
@@ -178,27 +659,209 @@ class CalendarEventTracker:
         location = input("Location (opt): ").strip()
         note = input("Note (opt): ").strip()
         
-        self.events.append(Event(date, title, location, note))
+        self._insert(Event(date, title, location, note))
         print("Event added.\n")
+    
+    @instrumented
+    @autosave
+    def add_events(self, events: List[Event]) -> None:
+        """Add many (already validated) events with a single save."""
+        if not events:
+            return False
+        if self._pushdown:
+            self._append(events)
+            return
+        with self._save_lock:
+            snap = self.snapshot()
+            start = len(self._events)
+            self._events.extend(events)
+            self._pos.update((ev.id, i) for i, ev in enumerate(events, start))
+            if len(events) > 1000:
+                # Cheaper to re-sort once than to insert one by one
+                self._publish(Snapshot.build(self._events, snap.version + 1))
+                return
+            if snap.keywords is not None:
+                for ev in events:
+                    snap.keywords.add(ev)
+            self._publish(snap.with_added(events))
         
+    @instrumented
+    @autosave
+    def remove_event(self, target: Event) -> bool:
+        """Delete an event without prompting; False if it isn't in the calendar."""
+        self.load_all()
+        return self._remove(target)
+
+    def get_event(self, event_id: str) -> Optional[Event]:
+        """The event with this id, or None. Takes occurrence ids
+        (<series id>@<date>) too."""
+        events = self.events
+        series_id, mark, date = event_id.partition(OCCURRENCE_MARK)
+        pos = self._find_id(series_id)
+        if pos is None:
+            return None
+        if mark:
+            return events[pos].occurrence(date)
+        return events[pos]
+
+    @instrumented
+    @autosave
+    def delete(self, event_id: str) -> bool:
+        """Delete the event with this id; False if there is none. O(1),
+        apart from the snapshot update (see Snapshot.with_removed).
+        Deleting an occurrence cancels just that one in its series."""
+        self.load_all()
+        with self._save_lock:
+            series_id, mark, date = event_id.partition(OCCURRENCE_MARK)
+            pos = self._find_id(series_id)
+            if pos is None:
+                return False
+            if mark:
+                series = self._events[pos]
+                if series.occurrence(date) is None:
+                    return False
+                self._replace(series, self._with_exception(series, date, None))
+                return True
+            self._delete_at(pos)
+            return True
+
+    @instrumented
+    @autosave
+    def update(self, event_id: str, **fields: str) -> Event:
+        """Change some of date/title/location/note/end_date of the event
+        with this id and return the new version (same id). Raises
+        KeyError for an unknown id, ValueError for an unknown field, an
+        invalid date, an end before the start or an empty title."""
+        self._check_fields(fields)
+        self.load_all()
+        with self._save_lock:
+            series_id, mark, date = event_id.partition(OCCURRENCE_MARK)
+            pos = self._find_id(series_id)
+            if pos is None:
+                raise KeyError(event_id)
+            old = self._events[pos]
+            if mark:
+                # One occurrence: stored as an exception of its series
+                if old.occurrence(date) is None:
+                    raise KeyError(event_id)
+                new = self._with_exception(old, date, fields)
+                self._replace(old, new)
+                return new.occurrence(date)
+            new = self._edited(old, **fields)
+            self._replace(old, new)
+        return new
+
+    @classmethod
+    def _check_fields(cls, fields: dict) -> None:
+        unknown = set(fields) - EDITABLE_FIELDS
+        if unknown:
+            raise ValueError(f"unknown field(s): {', '.join(sorted(unknown))}")
+        if "date" in fields and not cls.is_valid_date(fields["date"]):
+            raise ValueError(f"invalid date: {fields['date']!r}")
+        if fields.get("end_date") and not cls.is_valid_date(fields["end_date"]):
+            raise ValueError(f"invalid end date: {fields['end_date']!r}")
+        if fields.get("title") == "":
+            raise ValueError("title cannot be empty")
+
+    # Bulk changes: each finds its events through the indexes and saves once
+
+    def _matching(self, start_date: Optional[str], end_date: Optional[str],
+                  location: Optional[str], keyword: Optional[str], mode: str) -> List[Event]:
+        """Events meeting every given criterion, date-sorted. Dates are
+        inclusive and either may be left open; location is compared
+        ignoring case; keyword is matched as by search(keyword, mode).
+        A recurring event is matched (whole) by its first date."""
+        if start_date is None and end_date is None and location is None and keyword is None:
+            raise ValueError("give at least one of start_date, end_date, location, keyword")
+        for name, value in (("start_date", start_date), ("end_date", end_date)):
+            if value is not None and not self.is_valid_date(value):
+                raise ValueError(f"invalid {name}: {value!r}")
+        self.load_all()
+        first = 1 if start_date is None else date_ordinal(start_date)
+        last = date_ordinal(end_date or LAST_DATE)
+        if keyword is not None:
+            found = self._searchable().search(keyword, mode)
+            if start_date is not None or end_date is not None:
+                found = [ev for ev in found if first <= ev.ordinal <= last]
+        elif start_date is not None or end_date is not None:
+            found = self.snapshot().records_in_days(first, last)
+        else:
+            found = self.snapshot().all()
+        if location is not None:
+            # Calendars reuse a few places, so compare each spelling once
+            place = location.strip().casefold()
+            wanted = {loc for loc in {ev.location for ev in found} if loc.casefold() == place}
+            found = [ev for ev in found if ev.location in wanted]
+        return self._scanned(found)
+
+    @instrumented
+    def delete_where(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     location: Optional[str] = None, keyword: Optional[str] = None,
+                     mode: str = "word") -> List[Event]:
+        """Delete every event that meets all the given criteria (see
+        _matching), with one save. Returns the deleted events, date-sorted.
+        Raises ValueError if no criterion is given or a date is invalid."""
+        with self._save_lock:
+            targets = self._matching(start_date, end_date, location, keyword, mode)
+            self._delete_all(targets)
+        return targets
+
+    @instrumented
+    def update_where(self, fields: Dict[str, str], start_date: Optional[str] = None,
+                     end_date: Optional[str] = None, location: Optional[str] = None,
+                     keyword: Optional[str] = None, mode: str = "word") -> List[Event]:
+        """Set fields (as for update) on every event that meets all the
+        given criteria, with one save, e.g.
+        update_where({"location": "Online"}, keyword="standup").
+        Returns the new versions of the events that changed."""
+        self._check_fields(fields)
+        with self._save_lock:
+            pairs = []
+            for old in self._matching(start_date, end_date, location, keyword, mode):
+                if any((getattr(old, name) or "") != value for name, value in fields.items()):
+                    pairs.append((old, self._edited(old, **fields)))
+            self._replace_all(pairs)
+        return [new for _, new in pairs]
+
+    @autosave
+    def _delete_all(self, targets: List[Event]) -> bool:
+        if not targets:
+            return False
+        with self._save_lock:
+            snap = self.snapshot()
+            # Highest position first, so the event swapped into a gap is never a target
+            for pos in sorted((self._find_id(ev.id) for ev in targets), reverse=True):
+                self._swap_out(pos, snap)
+            self._publish(snap.with_removed_all(targets))
+        return True
+
+    @autosave
+    def _replace_all(self, pairs: List[Tuple[Event, Event]]) -> bool:
+        if not pairs:
+            return False
+        with self._save_lock:
+            snap = self.snapshot()
+            for old, new in pairs:
+                self._events[self._find_id(old.id)] = new   # same id, same position
+                if snap.keywords is not None:
+                    snap.keywords.replace(old, new)
+            self._publish(snap.with_replaced_all(pairs))
+        return True
+
+    @instrumented
     def list_all_events(self) -> List[Event]:
-        sorted_display = sorted(self.events, key=lambda ev: ev.date)
-        self.print_events(sorted_display)
-        return sorted_display
+        return self._print_view(self.iter_sorted())
     
+    @instrumented
     def list_events_on_date(self) -> List[Event]:
         date = input("\nShow events on (YYYY-MM-DD): ").strip()
         if not self.is_valid_date(date):
             print("Invalid date. Please enter a valid date.\n")
             return []
         
-        display = sorted(
-            [ev for ev in self.events if ev.date == date],
-            key=lambda ev: ev.date,
-        )
-        self.print_events(display)
-        return display
+        return self._print_view(self.iter_sorted(date, date))
     
+    @instrumented
     def list_events_in_range(self) -> List[Event]:
         start_date = input("\nStart date (YYYY-MM-DD): ").strip()
         if not self.is_valid_date(start_date):
@@ -210,17 +873,13 @@ class CalendarEventTracker:
             print("Invalid end date.\n")
             return []
         
-        if start_date > end_date:
+        if date_ordinal(start_date) > date_ordinal(end_date):
             print("Start date must be <= end date.\n")
             return []
         
-        display = sorted(
-            [ev for ev in self.events if start_date <= ev.date <= end_date],
-            key=lambda ev: ev.date,
-        )
-        self.print_events(display)
-        return display
+        return self._print_view(self.iter_sorted(start_date, end_date))
     
+    @instrumented
     @autosave
     def delete_event(self) -> None:
         """Delete a single event selected by index from a sorted view."""
@@ -228,7 +887,7 @@ class CalendarEventTracker:
             print("\nNo events available to delete.\n")
             return False
         
-        sorted_display = sorted(self.events, key=lambda ev: ev.date)
+        sorted_display = self.sorted_events()
         self.print_events(sorted_display)
         
         idx_text = input("Enter the index to delete: ").strip()
@@ -241,22 +900,13 @@ class CalendarEventTracker:
             print("Index out of range.\n")
             return False
         
-        target = sorted_display[idx]
-        
-        # Rebuild event list without the chosen target (first match)
-        removed = False
-        new_list: List[Event] = []
-        for ev in self.events:
-            if (not removed) and ev is target:
-                removed = True
-                continue
-            new_list.append(ev)
-            
-        self.events = new_list
+        # The display index only picks the id; deleting by id needs no search
+        self._delete_at(self._find_id(sorted_display[idx].id))
         print("Event deleted.\n")
     
     # Extra features
     
+    @instrumented
     @ autosave
     def edit_event(self) -> None:
         """Edit an existing event's title, location, or note."""
@@ -264,7 +914,7 @@ class CalendarEventTracker:
             print("\nNo events to edit.\n")
             return False
         
-        sorted_display = sorted(self.events, key=lambda ev: ev.date)
+        sorted_display = self.sorted_events()
         self.print_events(sorted_display)
         
         idx_text = input("Enter the index of the event to edit: ").strip()
@@ -283,46 +933,56 @@ class CalendarEventTracker:
         new_location = input(f"New location [{target.location}]: ").strip()
         new_note = input(f"New note [{target.note}]: ").strip()
         
-        if new_title != "":
-            target.title = new_title
-        if new_location != "":
-            target.location = new_location
-        if new_note != "":
-            target.note = new_note
+        changes = {"title": new_title, "location": new_location, "note": new_note}
+        self._replace(target, self._edited(target, **{k: v for k, v in changes.items() if v}))
             
         print("Event updated.\n")
                 
+    @instrumented
     def search_events(self) -> List[Event]:
-        """Search events by keyword in title or note"""
+        """Search events by keyword (word prefixes) in title or note"""
         keyword = input("\nEnter keyword to search in title/note: ").strip()
         if keyword == "":
             print("Keyword cannot be empty.\n")
             return []
         
-        needle = keyword.lower()
-        matches = [
-            ev for ev in self.events
-            if needle in ev.title.lower() or needle in ev.note.lower()
-        ]
-        
-        matches_sorted = sorted(matches, key=lambda ev: ev.date)
-        self.print_events(matches_sorted)
-        return matches_sorted
+        return self._print_view(self.search(keyword))
     
-    def export_to_csv(self, csv_filename: str = "events_export.csv") -> None:
-        """Exports all events to a csv file"""
-        if len(self.events) == 0:
+    @instrumented
+    def export_to_csv(self, csv_filename: str = "events_export.csv",
+                      streaming: bool = False) -> None:
+        """Exports all events to a csv file.
+
+        streaming=True (the default when the backend answers queries
+        itself) reads the events from storage one by one and sorts them
+        with an external merge sort, so the calendar never has to fit in
+        memory. It exports what is saved, so pending saves are flushed first.
+        """
+        import csv
+        from export import CSV_HEADER, export_events_csv
+
+        if streaming or self._pushdown:
+            self.flush()
+            count = export_events_csv(self._storage.iter_events(), csv_filename)
+            if count == 0:
+                print("\nNo events in calendar to export.\n")
+                return
+            print(f"\nEvents exported to '{csv_filename}'.\n")
+            return
+
+        rows = self.sorted_events()
+        if len(rows) == 0:
             print("\nNo events in calendar to export.\n")
             return
         
         with open(csv_filename, "w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
-            writer.writerow(["Date", "Title", "Location", "note"])
-            for ev in sorted(self.events, key=lambda e: e.date):
-                writer.writerow([ev.date, ev.title, ev.location, ev.note])
+            writer.writerow(CSV_HEADER)
+            writer.writerows([ev.date, ev.title, ev.location, ev.note] for ev in rows)
         
         print(f"\nEvents exported to '{csv_filename}'.\n")
         
+    @instrumented
     def weekly_view(self) -> None:
         """Show a weekly view.
            User provides a week start date (YYYY-MM-DD).
@@ -333,39 +993,36 @@ class CalendarEventTracker:
             print("Invalid date.\n")
             return
 
-        try:
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-        except ValueError:
-            print("Invalid date format.\n")
-            return
-        
-        end_date = start_date + timedelta(days=6)
+        from datetime import date
+
+        start_ordinal = date_ordinal(start_date_str)
+        start_date = date.fromordinal(start_ordinal)
+        end_date = date.fromordinal(start_ordinal + 6)
         print(f"\nWeekly view from {start_date} to {end_date}:\n")
         
-        # Build mapping date -> list of events on that day
+        # Build mapping day offset (0-6) -> list of events on that day;
+        # a multi-day event is listed on each of its days in the week
         date_to_events = {}
-        for ev in self.events:
-            try:
-                ev_date = datetime.strptime(ev.date, "%Y-%m-%d").date()
-            except ValueError:
-                # Skip wrong dates
-                continue
-            if start_date <= ev_date <= end_date:
-                date_to_events.setdefault(ev_date, []).append(ev)
+        for ev in self.events_in_days(start_ordinal, start_ordinal + 6):
+            first = max(ev.ordinal, start_ordinal) - start_ordinal
+            last = min(ev.end_ordinal, start_ordinal + 6) - start_ordinal
+            for i in range(first, last + 1):
+                date_to_events.setdefault(i, []).append(ev)
         # Iterate each day in the week and print events
         for i in range(7):
-            current_day = start_date + timedelta(days = i)
+            current_day = date.fromordinal(start_ordinal + i)
             day_name = current_day.strftime("%A")
             print(LINE)
             print(f"{current_day} ({day_name})")
             print(LINE)
             
-            day_events = date_to_events.get(current_day, [])
+            day_events = date_to_events.get(i, [])
             if not day_events:
                 print("No events available.")
             else:
                 for ev in sorted(day_events, key = lambda x: x.title.lower()):
-                    print(f" - {ev.title} @ {ev.location or 'N/A'} ")
+                    span = f" ({ev.date} to {ev.end_date})" if ev.end_ordinal > ev.ordinal else ""
+                    print(f" - {ev.title} @ {ev.location or 'N/A'}{span} ")
                     if ev.note:
                         print(f"    Note: {ev.note}")
             print("")